@@ -19,28 +19,24 @@ Ballistics program for spherical projectiles.
 See help for details.
 """
 
-import hashlib
+import collections
+import importlib
 import math
 import os
-import pprint
-import shutil
 import sys
 import time
 
-from .cod_adjusted import coefficient_of_drag_adjusted  # noqa
-from .cod_collins import coefficient_of_drag_collins  # noqa
-from .cod_henderson import coefficient_of_drag_henderson  # noqa
-from .cod_miller import coefficient_of_drag_miller
-from .cod_morrison import coefficient_of_drag_morrison  # noqa
 from .formattext import line_break
-from .interpolate import interpolate
+# interpolate is re-exported as part of the public API
+from .interpolate import interpolate  # noqa: F401
 from .materials import determine_material, list_materials
+from .solver import brent, expand_bracket, illinois, secant
 from .units import convert_units, list_units, SIGravity
 
 # Modules that will get loaded if needed.  None of these are required.
 csv = None
 matplotlib = None
-psutil = None
+numpy = None
 StringIO = None
 
 # The version auto updates using the version_check() function.  The version is
@@ -48,8 +44,8 @@ StringIO = None
 # signature is the md5sum hash of the entire source code file excepting the 32
 # characters of the signature string.  The following two lines should not be
 # altered by hand unless you know what you are doing.
-__version__ = '2019-04-09v68'
-PROGRAM_SIGNATURE = '8d2f46410bdab734317e206b05127fcb'
+__version__ = '2026-10-18v90'
+PROGRAM_SIGNATURE = '0e3c14afbf3b9f340be2b59a48f958ac'
 
 # The current state is stored in a dictionary with the following values:
 # These values are specified initially:
@@ -113,12 +109,62 @@ PROGRAM_SIGNATURE = '8d2f46410bdab734317e206b05127fcb'
 
 GET_CPU_TIME = True
 
+# The drag methods that can be used.  The module for each, such as cod_miller,
+# is only imported when the method is first used.
+DragMethods = ('adjusted', 'collins', 'henderson', 'miller', 'morrison')
+DragFunctions = {}
+# Coefficients of drag can be cached across trajectories and cases.  When
+# DragCache is not None, it is a least-recently-used cache keyed by drag
+# method, drag table version, and the log10 Reynolds number and Mach number
+# rounded to multiples of the steps in DragCacheSettings.  The drag is
+# computed at the rounded values, so results don't depend on what has been
+# cached.  In strict mode, the exact values are used, so results are the same
+# as without the cache.  See use_drag_cache.
+DragCache = None
+DragCacheSettings = {'size': 50000, 'log_re_step': 1e-4, 'mach_step': 1e-4, 'strict': False}
+# Values in the state other than the Reynolds and Mach numbers that the drag
+# methods use.
+DragCacheStateKeys = {'henderson': ('T', 'material')}
+
+# Counts of the work done by the main parts of the computation.  These
+# accumulate for the life of the process; call reset_counters before a
+# computation to count just that computation.
+Counters = {
+    'trajectories': 0,
+    'steps': 0,
+    'accelerations': 0,
+    'drag_lookups': 0,
+    'drag_cache_hits': 0,
+    'drag_cache_misses': 0,
+    'atmosphere_lookups': 0,
+    'atmosphere_cache_hits': 0,
+}
+
 MinPointInterval = 0.01
 MinTimeSteps = 20
 MinTimeDelta = 0.0001
 TimeDeltaReduction = 10
 PrecisionInDigits = 6
+# The method used to solve for an unknown factor: 'brent', 'illinois',
+# 'legacy' (bisection blended with inverse quadratic interpolation), or
+# 'secant' (the secant method from a guess, otherwise Brent's method).
+Solver = 'brent'
 UseRungeKutta = True
+# When UseAdaptive is True, time_delta is only the initial step and the step
+# size is adjusted to keep the local error of each step within
+# AdaptiveAbsoluteTolerance + AdaptiveRelativeTolerance * value.
+UseAdaptive = False
+AdaptiveAbsoluteTolerance = 1e-5
+AdaptiveRelativeTolerance = 1e-8
+AdaptiveMinTimeDelta = 1e-9
+# Within a trajectory, atmospheric properties are computed exactly at
+# multiples of AtmosphereBand meters and interpolated linearly between them.
+# The relative error in density is less than about (AtmosphereBand/8400)^2/8.
+# If this is 0, the properties are computed exactly at each height.
+AtmosphereBand = 1.0
+# When scanning for an unknown with numpy, this many values are computed
+# together.  The scan stops at the first block that brackets the answer.
+ScanBlockSize = 8
 Verbose = 0
 
 Factors = {
@@ -520,6 +566,192 @@ Settings = {
     },
 }
 
+# Coefficients used in calculating the viscosity of water vapor.  See
+# viscosity_water_vapor.
+WaterVaporViscosityTable = [
+    [0.501938, 0.162888, -0.130356, 0.907919, -0.551119, 0.146543],
+    [0.235622, 0.789383, 0.673665, 1.207552, 0.0670665, -0.0843370],
+    [-0.274637, -0.743539, -0.959456, -0.687343, -0.497089, 0.195286],
+    [0.145831, 0.263129, 0.347247, 0.213486, 0.100754, -0.032932],
+    [-0.0270448, -0.0253093, -0.0267758, -0.0822904, 0.0602253, -0.0202595]]
+
+# The Butcher tableau of the Dormand-Prince 5(4) method used for adaptive
+# steps.  The last row of DormandPrinceA is also the fifth order solution,
+# which is evaluated at the end of the step.  DormandPrinceE is the difference
+# between the fifth and fourth order solutions.  See Dormand, J. R. and P. J.
+# Prince.  "A family of embedded Runge-Kutta formulae."  Journal of
+# Computational and Applied Mathematics.  6, no. 1 (1980): 19-26.
+DormandPrinceA = [
+    [1/5],
+    [3/40, 9/40],
+    [44/45, -56/15, 32/9],
+    [19372/6561, -25360/2187, 64448/6561, -212/729],
+    [9017/3168, -355/33, 46732/5247, 49/176, -5103/18656],
+    [35/384, 0, 500/1113, 125/192, -2187/6784, 11/84]]
+DormandPrinceE = [
+    71/57600, 0, -71/16695, 71/1920, -17253/339200, 22/525, -1/40]
+
+
+class Atmosphere(object):
+    """
+    The atmospheric properties for a single trajectory.  Within a trajectory,
+    only the height changes, so the temperature, humidity, and pressure values
+    are determined once.  The density, viscosity, and speed of sound are
+    cached for heights that are multiples of the band size.
+    """
+
+    def __init__(self, state, band=None):
+        """
+        Determine the values that don't depend on height.
+
+        Enter: state: a dictionary of the initial state.  This uses T, rh,
+                      Twb, Tdp, pressure, and pressure_y0.
+               band: the height interval in meters for cached values.  If
+                     None, use AtmosphereBand.  If 0, compute values exactly.
+        """
+        self.T = state.get('T', 288.15)
+        self.h = relative_humidity(state)
+        self.psv = saturation_vapor_pressure(self.T)
+        self.pressure = state.get('pressure')
+        if self.pressure is not None:
+            self.pressure_y0 = pressure_from_altitude(state.get('pressure_y0', 0))
+        self.band = AtmosphereBand if band is None else band
+        self.cache = {}
+        self.last_y = None
+        self.last = None
+
+    def compute(self, y):
+        """
+        Compute the atmospheric properties at a height.
+
+        Enter: y: height in meters.
+        Exit:  properties: a tuple of (density, pressure, xv, mua, muv,
+                           viscosity, speed of sound).  muv is 0 if the air
+                           is dry.
+        """
+        p = pressure_from_altitude(y)
+        if self.pressure is not None:
+            p = self.pressure*p/self.pressure_y0
+        pa, xv = moist_air_density(self.T, self.h, p, self.psv)
+        data = {'density_data': {
+            'pressure': p, 'xv': xv, 'psv': self.psv, 'T': self.T,
+            'h': self.h, 'density': pa}}
+        mu = atmospheric_viscosity(data)
+        sos = speed_of_sound(data)
+        return (pa, p, xv, data['viscosity_data']['mua'],
+                data['viscosity_data'].get('muv', 0), mu, sos)
+
+    def properties(self, y):
+        """
+        Get the atmospheric properties at a height, either exactly or by
+        interpolating cached values.
+
+        Enter: y: height in meters.
+        Exit:  properties: a tuple of values.  See compute.
+        """
+        Counters['atmosphere_lookups'] += 1
+        if y == self.last_y:
+            Counters['atmosphere_cache_hits'] += 1
+            return self.last
+        if not self.band:
+            props = self.compute(y)
+        else:
+            pos = y/self.band
+            band = math.floor(pos)
+            lo = self.cache.get(band)
+            hi = self.cache.get(band+1)
+            if lo is not None and hi is not None:
+                Counters['atmosphere_cache_hits'] += 1
+            if lo is None:
+                lo = self.cache[band] = self.compute(band*self.band)
+            if hi is None:
+                hi = self.cache[band+1] = self.compute((band+1)*self.band)
+            frac = pos-band
+            props = tuple(vlo+(vhi-vlo)*frac for vlo, vhi in zip(lo, hi))
+        self.last_y = y
+        self.last = props
+        return props
+
+
+class TrajectoryStep(object):
+    """
+    The position, velocity, acceleration, and time of a projectile during
+    integration.  The full state dictionary carries many other values that
+    don't change from step to step, so the integrator keeps those in a single
+    working dictionary and only creates one of these small objects per step.
+    """
+
+    __slots__ = ('x', 'y', 'vx', 'vy', 'ax', 'ay', 'time')
+
+    def __init__(self, x=0, y=0, vx=0, vy=0, ax=0, ay=0, time=0):
+        self.x = x
+        self.y = y
+        self.vx = vx
+        self.vy = vy
+        self.ax = ax
+        self.ay = ay
+        self.time = time
+
+    @classmethod
+    def from_state(cls, state):
+        """
+        Create a step from a state dictionary.
+
+        Enter: state: a dictionary of the current state.  Missing values are
+                      treated as zero.
+        Exit:  step: a new TrajectoryStep.
+        """
+        return cls(*[state.get(key, 0) for key in cls.__slots__])
+
+    def hermite(self, other, theta):
+        """
+        Interpolate between this step and a later step.  The position uses a
+        quintic Hermite polynomial based on the position, velocity, and
+        acceleration at both steps, and the velocity is the derivative of
+        that polynomial.  The acceleration is interpolated linearly.
+
+        Enter: other: the next TrajectoryStep.
+               theta: the fraction of the way from this step to the other
+                      step in the range [0-1].
+        Exit:  step: a new TrajectoryStep.
+        """
+        h = other.time - self.time
+        t2 = theta*theta
+        t3 = t2*theta
+        t4 = t3*theta
+        t5 = t4*theta
+        hp1 = 10*t3-15*t4+6*t5
+        hv0 = h*(theta-6*t3+8*t4-3*t5)
+        hv1 = h*(-4*t3+7*t4-3*t5)
+        ha0 = h*h*(0.5*t2-1.5*t3+1.5*t4-0.5*t5)
+        ha1 = h*h*(0.5*t3-t4+0.5*t5)
+        dp1 = (30*t2-60*t3+30*t4)/h if h else 0
+        dv0 = 1-18*t2+32*t3-15*t4
+        dv1 = -12*t2+28*t3-15*t4
+        da0 = h*(theta-4.5*t2+6*t3-2.5*t4)
+        da1 = h*(1.5*t2-4*t3+2.5*t4)
+        return TrajectoryStep(
+            self.x+(other.x-self.x)*hp1+self.vx*hv0+other.vx*hv1+self.ax*ha0+other.ax*ha1,
+            self.y+(other.y-self.y)*hp1+self.vy*hv0+other.vy*hv1+self.ay*ha0+other.ay*ha1,
+            (other.x-self.x)*dp1+self.vx*dv0+other.vx*dv1+self.ax*da0+other.ax*da1,
+            (other.y-self.y)*dp1+self.vy*dv0+other.vy*dv1+self.ay*da0+other.ay*da1,
+            self.ax+(other.ax-self.ax)*theta,
+            self.ay+(other.ay-self.ay)*theta,
+            self.time+h*theta)
+
+    def to_state(self, state=None):
+        """
+        Create a state dictionary from a step.
+
+        Enter: state: a dictionary with other values to include.  This is not
+                      modified.
+        Exit:  state: a new dictionary with the step's values.
+        """
+        state = state.copy() if state is not None else {}
+        for key in self.__slots__:
+            state[key] = getattr(self, key)
+        return state
+
 
 def acceleration(state, y=None, vx=None, vy=None):
     """
@@ -538,6 +770,7 @@ def acceleration(state, y=None, vx=None, vy=None):
         state['vx'] = vx
     if vy is not None:
         state['vy'] = vy
+    Counters['accelerations'] += 1
     accel, ax, ay = acceleration_from_drag(state)
     ay += acceleration_from_gravity(state)
     return ax, ay
@@ -634,9 +867,18 @@ def atmospheric_density(state):
 
     Enter: state: a dictionary of the current state.  See comment at the
                   top of the program.  This directly uses y, temp, rh,
-                  pressure, and pressure_y0.
+                  pressure, and pressure_y0.  If this has an atmosphere,
+                  that is used instead.
     Exit:  density: atmospheric density in kg/m/m/m.
     """
+    atmosphere = state.get('atmosphere')
+    if atmosphere is not None:
+        y = state.get('y', 0)
+        pa, p, xv = atmosphere.properties(y)[:3]
+        state['density_data'] = {
+            'pressure': p, 'xv': xv, 'psv': atmosphere.psv, 'T': atmosphere.T,
+            'h': atmosphere.h, 'density': pa, 'y': y}
+        return pa
     if 'T' not in state:
         T = 288.15  # standard temperature at sea level
     else:
@@ -653,40 +895,9 @@ def atmospheric_density(state):
         p = p_given_y0*p_y/p_y0
     else:
         p = p_y
-    # calculate the partial pressure of dry air and water vapor
-    # From 'Revised formula for the density of moist air (CIPM-2007)'
-    t = T-273.15  # convert to centigrade
-    R = 8.314472  # J/(mol*K), universal gass constant, from CIPM-2007
-    Ma = 0.02896546  # kg/mol, molar mass of dry air, from CIPM-2007
-    Mv = 0.01801528  # kg/mol, molar mass of water vapor, from CIPM-2007
-    # Calculate xv (from CIPM-2007)
-    # psv is the vapor pressure at saturation
-    A = 1.2378847e-5  # 1/(K^2)
-    B = -1.9121316e-2  # 1/K
-    C = 33.93711047
-    D = -6.3431645e3  # K
-    psv = 1*math.exp(A*T**2+B*T+C+D/T)
-    # f is the enhancement factor
-    alpha = 1.00062
-    beta = 3.14e-8  # 1/Pa
-    gamma = 5.6e-7  # 1/(K^2)
-    f = alpha+beta*p+gamma*t**2
-    # Now we can calculate xv, the mole fraction of water vapor
+    psv = saturation_vapor_pressure(T)
     h = relative_humidity(state)  # relative humidity to the range 0-1
-    xv = h*f*psv/p
-    # Calculate Z, the compressibility factor (from CIPM-2007)
-    a0 = 1.58123e-6  # K/Pa
-    a1 = -2.9331e-8  # 1/Pa
-    a2 = 1.1043e-10  # 1/(K Pa)
-    b0 = 5.707e-6  # K/Pa
-    b1 = -2.051e-8  # 1/Pa
-    c0 = 1.9898e-4  # K/Pa
-    c1 = -2.376e-6  # 1/Pa
-    d = 1.83e-11  # (K/Pa)^2
-    e = -0.765e-8  # (K/Pa)^2
-    Z = (1 - p/T * (a0 + a1*t + a2*t**2 + (b0+b1*t)*xv + (c0+c1*t)*xv**2) +
-         p**2 / T**2 * (d+e*xv**2))
-    pa = p*Ma/(Z*R*T)*(1-xv*(1-Mv/Ma))
+    pa, xv = moist_air_density(T, h, p, psv)
     # pressure Pa, mole fraction of water vapor, vapor pressure at saturation
     # Pa, absolute temperature K, relative humidity (0-1)
     state['density_data'] = {
@@ -709,6 +920,14 @@ def atmospheric_viscosity(state):
                   top of the program.
     Exit:  viscosity: atmospheric viscosity in kg/m/s.
     """
+    atmosphere = state.get('atmosphere')
+    if atmosphere is not None:
+        mua, muv, mu = atmosphere.properties(state.get('y', 0))[3:6]
+        if atmosphere.h:
+            state['viscosity_data'] = {'mua': mua, 'muv': muv, 'viscosity': mu}
+        else:
+            state['viscosity_data'] = {'mua': mua, 'viscosity': mu}
+        return mu
     if 'density_data' not in state:
         # This populates density_data with a variety of values we need,
         # including the pressure and the mole fraction of water vapor
@@ -767,12 +986,16 @@ def coefficient_of_drag(state=None, density=None, reynolds=None, mach=None,
         state['drag_data'] = {'Re': Re, 'Mn': Mn}
     if not Re:
         return 0
+    Counters['drag_lookups'] += 1
     drag_method = state.get('settings', {}).get('drag_method', 'miller')
-    func = globals().get('coefficient_of_drag_' + drag_method)
+    func = drag_function(drag_method)
     if func is None:
-        func = coefficient_of_drag_miller
+        func = drag_function('miller')
         state['settings']['drag_method'] = 'miller'
-    cd = func(state, only_in_range)
+    if DragCache is not None:
+        cd = drag_cache_lookup(func, drag_method, state, only_in_range)
+    else:
+        cd = func(state, only_in_range)
     if (cd is not None and state['drag_data'].get('in_range') is False and
             Verbose >= 3):
         warning(state, 'cod_extrapolated',
@@ -781,6 +1004,137 @@ def coefficient_of_drag(state=None, density=None, reynolds=None, mach=None,
     return cd
 
 
+def coefficient_of_drag_adjusted(state, only_in_range=False):
+    """
+    Calculate the coefficient of drag using the adjusted drag method.  See
+    cod_adjusted.coefficient_of_drag_adjusted.
+    """
+    return drag_function('adjusted')(state, only_in_range)
+
+
+def coefficient_of_drag_adjusted_array(Re, Mn, state=None):
+    """
+    Calculate the coefficient of drag for arrays of Reynolds and Mach numbers
+    using the adjusted drag method.  See
+    cod_adjusted.coefficient_of_drag_adjusted_array.
+    """
+    return drag_function('adjusted', True)(Re, Mn, state)
+
+
+def coefficient_of_drag_array(reynolds, mach, state=None, only_in_range=False):
+    """
+    Calculate the coefficient of drag for arrays of Reynolds and Mach
+    numbers.  This requires numpy.
+
+    Enter: reynolds: an array of Reynolds numbers.
+           mach: an array of Mach numbers.  This is broadcast against the
+                 Reynolds numbers.
+           state: a dictionary with other parameters.  This may contain
+                  settings with a drag_method, and any values the drag method
+                  uses, such as T and material.
+           only_in_range: if True, the coefficient of drag is NaN where the
+                          values are outside of what we can interpolate.
+    Exit:  cd: an array of coefficients of drag.
+           in_range: an array of booleans that are False where the values are
+                     extrapolated.
+    """
+    global numpy
+    if numpy is None:
+        import numpy
+
+    state = state or {}
+    Re, Mn = numpy.broadcast_arrays(
+        numpy.asarray(reynolds, dtype=float), numpy.asarray(mach, dtype=float))
+    drag_method = state.get('settings', {}).get('drag_method', 'miller')
+    func = drag_function(drag_method, True)
+    if func is None:
+        func = drag_function('miller', True)
+    valid = Re != 0
+    cd = numpy.zeros(Re.shape)
+    in_range = numpy.ones(Re.shape, dtype=bool)
+    if numpy.any(valid):
+        Re, Mn = Re[valid], Mn[valid]
+        # Match the values that the drag cache would use
+        if DragCache is not None and not DragCacheSettings['strict']:
+            Re = numpy.power(10, numpy.round(
+                numpy.log10(Re) / DragCacheSettings['log_re_step']) *
+                DragCacheSettings['log_re_step'])
+            Mn = (numpy.round(Mn / DragCacheSettings['mach_step']) *
+                  DragCacheSettings['mach_step'])
+        cd[valid], in_range[valid] = func(Re, Mn, state)
+    if only_in_range:
+        cd[~in_range] = numpy.nan
+    return cd, in_range
+
+
+def coefficient_of_drag_collins(state, only_in_range=False):
+    """
+    Calculate the coefficient of drag using the collins drag method.  See
+    cod_collins.coefficient_of_drag_collins.
+    """
+    return drag_function('collins')(state, only_in_range)
+
+
+def coefficient_of_drag_collins_array(Re, Mn, state=None):
+    """
+    Calculate the coefficient of drag for arrays of Reynolds and Mach numbers
+    using the collins drag method.  See
+    cod_collins.coefficient_of_drag_collins_array.
+    """
+    return drag_function('collins', True)(Re, Mn, state)
+
+
+def coefficient_of_drag_henderson(state, only_in_range=False):
+    """
+    Calculate the coefficient of drag using the henderson drag method.  See
+    cod_henderson.coefficient_of_drag_henderson.
+    """
+    return drag_function('henderson')(state, only_in_range)
+
+
+def coefficient_of_drag_henderson_array(Re, Mn, state=None):
+    """
+    Calculate the coefficient of drag for arrays of Reynolds and Mach numbers
+    using the henderson drag method.  See
+    cod_henderson.coefficient_of_drag_henderson_array.
+    """
+    return drag_function('henderson', True)(Re, Mn, state)
+
+
+def coefficient_of_drag_miller(state, only_in_range=False):
+    """
+    Calculate the coefficient of drag using the miller drag method.  See
+    cod_miller.coefficient_of_drag_miller.
+    """
+    return drag_function('miller')(state, only_in_range)
+
+
+def coefficient_of_drag_miller_array(Re, Mn, state=None):
+    """
+    Calculate the coefficient of drag for arrays of Reynolds and Mach numbers
+    using the miller drag method.  See
+    cod_miller.coefficient_of_drag_miller_array.
+    """
+    return drag_function('miller', True)(Re, Mn, state)
+
+
+def coefficient_of_drag_morrison(state, only_in_range=False):
+    """
+    Calculate the coefficient of drag using the morrison drag method.  See
+    cod_morrison.coefficient_of_drag_morrison.
+    """
+    return drag_function('morrison')(state, only_in_range)
+
+
+def coefficient_of_drag_morrison_array(Re, Mn, state=None):
+    """
+    Calculate the coefficient of drag for arrays of Reynolds and Mach numbers
+    using the morrison drag method.  See
+    cod_morrison.coefficient_of_drag_morrison_array.
+    """
+    return drag_function('morrison', True)(Re, Mn, state)
+
+
 def csv_row(data):
     """
     Convert a list to a single line of CSV.
@@ -840,40 +1194,143 @@ def display_status(state, params=None, last=False):
         drag.get('cd', 0), drag.get('Re', 0), drag.get('Mn', 0)))
 
 
-def find_unknown(initial_state, unknown, unknown_scan=None):
+def drag_cache_lookup(func, drag_method, state, only_in_range=False):
+    """
+    Get a coefficient of drag from the drag cache, computing it and adding it
+    to the cache if it isn't there.  See DragCache.
+
+    Enter: func: the function of the drag method.
+           drag_method: the name of the drag method.
+           state: a dictionary of the current state with drag_data that has
+                  the Reynolds and Mach numbers.  The drag_data is updated
+                  with the values the drag method would have added.
+           only_in_range: if True, return None if the values are outside of
+                          what we can interpolate.
+    Exit:  cd: the coefficient of drag.
+    """
+    drag_data = state['drag_data']
+    Re = drag_data['Re']
+    Mn = drag_data['Mn']
+    settings = DragCacheSettings
+    if settings['strict']:
+        re, mn = Re, Mn
+    else:
+        re = round(math.log10(Re) / settings['log_re_step'])
+        mn = round(Mn / settings['mach_step'])
+    cod_miller = sys.modules.get(__name__ + '.cod_miller')
+    key = (drag_method, cod_miller.TableVersion if cod_miller else 0, re, mn,
+           only_in_range) + tuple(state.get(statekey) for statekey in
+                                  DragCacheStateKeys.get(drag_method, ()))
+    entry = DragCache.get(key)
+    if entry is not None:
+        Counters['drag_cache_hits'] += 1
+        DragCache.move_to_end(key)
+        drag_data.update(entry[1])
+        return entry[0]
+    Counters['drag_cache_misses'] += 1
+    if not settings['strict']:
+        drag_data['Re'] = 10 ** (re * settings['log_re_step'])
+        drag_data['Mn'] = mn * settings['mach_step']
+    cd = func(state, only_in_range)
+    values = {datakey: value for datakey, value in drag_data.items()
+              if datakey not in ('Re', 'Mn', 'sos')}
+    drag_data['Re'] = Re
+    drag_data['Mn'] = Mn
+    DragCache[key] = (cd, values)
+    if len(DragCache) > settings['size']:
+        DragCache.popitem(last=False)
+    return cd
+
+
+def drag_table_checksum():
+    """
+    Return a checksum of the drag tables that are currently in use.  Results
+    that were computed with the same version of this program and the same
+    drag table checksum will be the same.
+
+    Exit:  checksum: a hexadecimal string.
+    """
+    import hashlib
+
+    from . import cod_adjusted, cod_miller
+
+    cod_adjusted.load_adjustments()
+    data = cod_miller.table_checksum() + repr(sorted(
+        cod_adjusted.MnReAdjustments.items()))
+    # A drag cache that rounds values changes the results
+    if DragCache is not None and not DragCacheSettings['strict']:
+        data += repr((DragCacheSettings['log_re_step'], DragCacheSettings['mach_step']))
+    return hashlib.md5(data.encode('utf8')).hexdigest()
+
+
+def drag_function(method, array=False):
+    """
+    Get the function that computes the coefficient of drag for a drag method.
+    The module of the drag method is imported the first time it is used.
+
+    Enter: method: the name of the drag method, such as 'miller'.
+           array: if True, get the function that works on arrays of Reynolds
+                  and Mach numbers.
+    Exit:  func: the function, or None if the drag method is unknown.
+    """
+    func = DragFunctions.get((method, array))
+    if func is None and method in DragMethods:
+        module = importlib.import_module('.cod_' + method, __name__)
+        func = getattr(module, 'coefficient_of_drag_%s%s' % (
+            method, '_array' if array else ''))
+        DragFunctions[(method, array)] = func
+    return func
+
+
+def find_unknown(initial_state, unknown, unknown_scan=None, guess=None, bracket=None):
     """
     Based on an initial state and a specific unknown, try different values for
     the unknown until the computed trajectory matches to an acceptable level.
 
-    If a time-step approach is used and fewer than MinTimeSteps steps are
-    taken, the time_delta is reduced by factors of TimeDeltaReduction until at
-    least MinTimeSteps steps are used.
+    If a fixed time-step approach is used and fewer than MinTimeSteps steps
+    are taken, the time_delta is reduced by factors of TimeDeltaReduction until
+    at least MinTimeSteps steps are used.  Adaptive steps don't need this.
+    Each recalculation starts from the previous answer.
 
     Enter: initial_state: a dictionary of the initial state.  See comment
                           at the top of the program.
            unknown: name of the unknown value which will be varied.
            unknown_scan: if specified, override the factor's normal method and
                          use a scan with this step instead.
+           guess: if not None, a value of the unknown that is expected to be
+                  close to the answer, such as the answer to a similar case.
+           bracket: if not None, a tuple of two values of the unknown that
+                    are expected to bracket the answer.
     Exit:  final_state: the final state of the projectile.  This includes
                         an 'error' item if there is insufficient data for
                         calculation.
            points: a list of points along the trajectory.
     """
+    evaluations = 0
     while True:
-        newstate, points = find_unknown_process(initial_state, unknown, unknown_scan)
+        newstate, points = find_unknown_process(
+            initial_state, unknown, unknown_scan, guess, bracket)
+        evaluations += newstate.get('solve_evaluations', 0)
         delta = initial_state.get('time_delta', Factors['time_delta']['default'])
-        if ((not newstate.get('time') or newstate['time'] > delta * MinTimeSteps) or
+        if (UseAdaptive or (not newstate.get('time') or
+                            newstate['time'] > delta * MinTimeSteps) or
                 delta < MinTimeDelta):
             break
         initial_state = initial_state.copy()
         initial_state['time_delta'] = delta / TimeDeltaReduction
+        if newstate.get(unknown) is not None:
+            guess = newstate[unknown]
+            bracket = None
         if Verbose >= 2:
             print('Recalculating with smaller time_delta: %g -> %g' % (
                 delta, initial_state['time_delta']))
+    if 'solve_evaluations' in newstate:
+        newstate['solve_evaluations'] = evaluations
     return newstate, points
 
 
-def find_unknown_process(initial_state, unknown, unknown_scan=None):  # noqa - mccabe
+def find_unknown_process(initial_state, unknown, unknown_scan=None,  # noqa - mccabe
+                         guess=None, bracket=None):
     """
     Based on an initial state and a specific unknown, try different values for
     the unknown until the computed trajectory matches to an acceptable level.
@@ -883,6 +1340,11 @@ def find_unknown_process(initial_state, unknown, unknown_scan=None):  # noqa - m
            unknown: name of the unknown value which will be varied.
            unknown_scan: if specified, override the factor's normal method and
                          use a scan with this step instead.
+           guess: if not None, a value of the unknown that is expected to be
+                  close to the answer.  This is not used with a scan.
+           bracket: if not None, a tuple of two values of the unknown that
+                    are expected to bracket the answer.  This is not used with
+                    a scan.
     Exit:  final_state: the final state of the projectile.  This includes
                         an 'error' item if there is insufficient data for
                         calculation.
@@ -912,40 +1374,59 @@ def find_unknown_process(initial_state, unknown, unknown_scan=None):  # noqa - m
     minval = convert_units(Factors[unknown]['min'])
     maxval = convert_units(Factors[unknown]['max'])
     lastval = None
+    evaluations = [0]
+
+    def error_at(value):
+        evaluations[0] += 1
+        return trajectory_error(initial_state, unknown, value)
+
     if method == 'scan':
         step = convert_units(Factors[unknown].get('step')
                              if not unknown_scan else unknown_scan)
-        lasterror = None
+        values = []
         val = minval
         while val < maxval + step:
             if val > maxval:
                 val = maxval
-            error = trajectory_error(initial_state, unknown, val)
-            if Verbose >= 3:
-                print('Step %s: %g,%g' % (unknown, val, error))
+            values.append(val)
+            val += step
+        lasterror = None
+        for val, error in zip(values, trajectory_errors(initial_state, unknown, values)):
+            evaluations[0] += 1
             if error is None:
                 return initial_state, []
+            if Verbose >= 3:
+                print('Step %s: %g,%g' % (unknown, val, error))
             if lasterror and error and error*lasterror <= 0:
                 minval = lastval
                 maxval = val
                 break
             lasterror = error
             lastval = val
-            val += step
-    minerror = trajectory_error(initial_state, unknown, minval)
-    if minerror is None:
-        return initial_state, []
-    if Verbose >= 3:
-        print('%s: %g,%g' % (unknown, minval, minerror))
-    maxerror = trajectory_error(initial_state, unknown, maxval)
-    while True:
-        try:
-            maxerror = trajectory_error(initial_state, unknown, maxval)
-        except Exception:
-            maxerror = None
-        if (maxerror is not None and minerror * maxerror <= 0) or maxval / 2 <= minval:
-            break
-        maxval /= 2
+    threshold = 10**(-PrecisionInDigits)
+    if Solver == 'secant' and method != 'scan' and guess is not None:
+        foundval = find_unknown_secant(error_at, minval, maxval, guess, threshold)
+        if foundval is not None:
+            return find_unknown_final(initial_state, unknown, foundval, evaluations[0])
+    bracketed = None
+    if method != 'scan' and (guess is not None or bracket):
+        bracketed = find_unknown_bracket(error_at, minval, maxval, guess, bracket)
+    if bracketed:
+        minval, maxval, minerror, maxerror = bracketed
+    else:
+        minerror = error_at(minval)
+        if minerror is None:
+            return initial_state, []
+        if Verbose >= 3:
+            print('%s: %g,%g' % (unknown, minval, minerror))
+        while True:
+            try:
+                maxerror = error_at(maxval)
+            except Exception:
+                maxerror = None
+            if (maxerror is not None and minerror * maxerror <= 0) or maxval / 2 <= minval:
+                break
+            maxval /= 2
     if Verbose >= 3:
         print('%s: %g,%g %g,%g' % (unknown, minval, minerror, maxval, maxerror))
     if maxerror is None:
@@ -953,61 +1434,159 @@ def find_unknown_process(initial_state, unknown, unknown_scan=None):  # noqa - m
     if minerror*maxerror > 0:
         print('Cannot solve for %s; conditions are too weak.' % unknown)
         return initial_state, []
-    x2 = y2 = None
-    if not minerror:
-        foundval = minval
-    elif not maxerror:
-        foundval = maxval
+    if Solver == 'legacy':
+        foundval = find_unknown_legacy(error_at, minval, maxval, minerror, maxerror, threshold)
     else:
-        threshold = 10**(-PrecisionInDigits)
-        while True:
-            # value halfway between last two tests
-            intval = midval = (minval+maxval)*0.5
-            # If we have three points, use an inverse quadradic interpolation,
-            # but only if it is between the last two points.
-            if x2 is not None:
-                x0, y0, x1, y1 = minval, minerror, maxval, maxerror
-                intval = (x0 * y2*y1 / (y0-y2) / (y0-y1) +
-                          x1 * y0*y2 / (y1-y0) / (y1-y2) +
-                          x2 * y1*y0 / (y2-y1) / (y2-y0))
-                # if it isn't between the last two points we should have picked
-                # the other root.  Rather, just use the mid point.
-                if ((minval > maxval and (
-                        intval > minval or intval < maxval)) or (
-                        minval < maxval and (
-                        intval < minval or intval > maxval))):
-                    intval = midval
-            # weight them; this helps prevent only updating one side
-            # repeatedly
-            intval = (intval*99+midval)/100
-            if maxval-minval < intval*threshold:
-                foundval = intval
-                break
-
-            interror = trajectory_error(initial_state, unknown, intval)
-            if not interror:
-                foundval = intval
-                if Verbose >= 3:
-                    print('%s: %g,%g %g,%g %g,%g %3.1f' % (
-                        unknown, minval, minerror, maxval, maxerror, intval,
-                        interror, math.log10(intval/(maxval-minval))))
-                break
-            if interror*minerror > 0:
-                minerror, y2 = interror, minerror
-                minval, x2 = intval, minval
-            else:
-                maxerror, y2 = interror, maxerror
-                maxval, x2 = intval, maxval
+        def verbose_error_at(value):
+            error = error_at(value)
             if Verbose >= 3:
-                print('%s: %g,%g %g,%g %g,%g %3.1f' % (
-                    unknown, minval, minerror, maxval, maxerror, intval,
-                    interror, math.log10(intval/(maxval-minval))))
+                print('%s: %g,%s' % (unknown, value, error))
+            return error
+
+        foundval = (illinois if Solver == 'illinois' else brent)(
+            verbose_error_at, minval, maxval, minerror, maxerror, rtol=threshold)
+    if foundval is None:
+        return initial_state, []
+    return find_unknown_final(initial_state, unknown, foundval, evaluations[0])
+
+
+def find_unknown_final(initial_state, unknown, value, evaluations):
+    """
+    Compute the trajectory for a solved value of the unknown.
+
+    Enter: initial_state: a dictionary of the initial state.
+           unknown: name of the unknown value.
+           value: the solved value of the unknown.
+           evaluations: the number of trajectories computed while solving.
+    Exit:  final_state: the final state of the projectile.
+           points: a list of points along the trajectory.
+    """
     state = initial_state.copy()
-    state[unknown] = foundval
+    state[unknown] = value
     state, points = trajectory(state)
+    state['solve_evaluations'] = evaluations + 1
     return state, points
 
 
+def find_unknown_legacy(func, minval, maxval, minerror, maxerror, threshold):
+    """
+    Find the root of a function using a bisection blended with an inverse
+    quadratic interpolation.  This was the original solver.
+
+    Enter: func: a function of one value.
+           minval, maxval: the bracket containing the root.
+           minerror, maxerror: the values of the function at minval and
+                               maxval.  These must have opposite signs or be
+                               zero.
+           threshold: the relative precision of the result.
+    Exit:  foundval: the root or None if the function could not be evaluated.
+    """
+    x2 = y2 = None
+    if not minerror:
+        return minval
+    if not maxerror:
+        return maxval
+    while True:
+        # value halfway between last two tests
+        intval = midval = (minval+maxval)*0.5
+        # If we have three points, use an inverse quadradic interpolation,
+        # but only if it is between the last two points.
+        if x2 is not None:
+            x0, y0, x1, y1 = minval, minerror, maxval, maxerror
+            intval = (x0 * y2*y1 / (y0-y2) / (y0-y1) +
+                      x1 * y0*y2 / (y1-y0) / (y1-y2) +
+                      x2 * y1*y0 / (y2-y1) / (y2-y0))
+            # if it isn't between the last two points we should have picked
+            # the other root.  Rather, just use the mid point.
+            if ((minval > maxval and (
+                    intval > minval or intval < maxval)) or (
+                    minval < maxval and (
+                    intval < minval or intval > maxval))):
+                intval = midval
+        # weight them; this helps prevent only updating one side
+        # repeatedly
+        intval = (intval*99+midval)/100
+        if maxval-minval < intval*threshold:
+            return intval
+
+        interror = func(intval)
+        if interror is None:
+            return None
+        if not interror:
+            if Verbose >= 3:
+                print('%g,%g %g,%g %g,%g %3.1f' % (
+                    minval, minerror, maxval, maxerror, intval,
+                    interror, math.log10(intval/(maxval-minval))))
+            return intval
+        if interror*minerror > 0:
+            minerror, y2 = interror, minerror
+            minval, x2 = intval, minval
+        else:
+            maxerror, y2 = interror, maxerror
+            maxval, x2 = intval, maxval
+        if Verbose >= 3:
+            print('%g,%g %g,%g %g,%g %3.1f' % (
+                minval, minerror, maxval, maxerror, intval,
+                interror, math.log10(intval/(maxval-minval))))
+
+
+def find_unknown_bracket(func, minval, maxval, guess=None, bracket=None):
+    """
+    Try to find a bracket for the unknown from a guess or a suggested bracket.
+
+    Enter: func: a function that returns the error for a value of the
+                 unknown.
+           minval, maxval: the range of allowed values of the unknown.
+           guess: if not None, a value that is expected to be close to the
+                  answer.
+           bracket: if not None, a tuple of two values that are expected to
+                    bracket the answer.
+    Exit:  bracket: a tuple of (lo, hi, flo, fhi) where flo and fhi have
+                    opposite signs or one is zero, or None if no bracket was
+                    found.
+    """
+    fguess = None
+    try:
+        if bracket:
+            lo = max(minval, min(bracket))
+            hi = min(maxval, max(bracket))
+            flo = func(lo)
+            fhi = func(hi) if flo is not None else None
+            if flo is None or fhi is None:
+                return None
+            if flo * fhi <= 0:
+                return lo, hi, flo, fhi
+            if guess is None:
+                guess, fguess = (lo, flo) if abs(flo) < abs(fhi) else (hi, fhi)
+        if guess is not None:
+            guess = max(minval, min(maxval, guess))
+            return expand_bracket(func, guess, fguess, lo=minval, hi=maxval, max_iterations=8)
+    except (OverflowError, ValueError, ZeroDivisionError):
+        pass
+    return None
+
+
+def find_unknown_secant(func, minval, maxval, guess, threshold):
+    """
+    Try to find the unknown with the secant method starting from a guess.
+
+    Enter: func: a function that returns the error for a value of the
+                 unknown.
+           minval, maxval: the range of allowed values of the unknown.
+           guess: a value that is expected to be close to the answer.
+           threshold: the relative tolerance of the answer.
+    Exit:  value: the value of the unknown or None if the secant method
+                  failed.
+    """
+    guess = max(minval, min(maxval, guess))
+    delta = abs(guess) * 1e-3 or 1e-3
+    other = guess + delta if guess + delta <= maxval else guess - delta
+    try:
+        return secant(func, guess, other, rtol=threshold, lo=minval, hi=maxval)
+    except (OverflowError, ValueError, ZeroDivisionError):
+        return None
+
+
 def find_unknown_direct(unknown, state):
     """
     Check if the unknown was given or can be solved directly.
@@ -1040,7 +1619,7 @@ def generate_output(state, user_params=None, comment=None):  # noqa - mccabe
     any internal, short, or long name of a factor to include it in the list.
     ':'(unit) may be added to the name of any factor to output the factor in
     the specified units rather than the default units.  'comment', 'comptime',
-    'method', and 'version' are treated as factors for this purpose.
+    'evals', 'method', and 'version' are treated as factors for this purpose.
     Additionally, 'diff:(factor):(value)' lists the difference between the
     specified value and the specified factor.  If no factors are included in
     the parameter list, a default set is used. Additionally, the following are
@@ -1079,7 +1658,7 @@ def generate_output(state, user_params=None, comment=None):  # noqa - mccabe
     for itemunit in items:
         parts = itemunit.split(':', 1)
         item = parts[0]
-        if item in ('comment', 'comptime', 'method', 'version'):
+        if item in ('comment', 'comptime', 'evals', 'method', 'version'):
             factors.append((item, None))
             continue
         diff = False
@@ -1122,8 +1701,13 @@ def generate_output(state, user_params=None, comment=None):  # noqa - mccabe
             data.append(('Computation Time', 's', state.get(
                 'computation_time', None)))
             continue
+        elif key == 'evals':
+            data.append(('Trajectory Evaluations', None, state.get(
+                'solve_evaluations', None)))
+            continue
         elif key == 'method':
             data.append(('Numerical Method', None,
+                         'Dormand-Prince' if UseAdaptive else
                          'Runge-Kutta' if UseRungeKutta else 'Simple'))
             continue
         elif key == 'version':
@@ -1245,15 +1829,11 @@ def get_cpu_time():
     """
     Return a time that should increase with cpu time.
 
-    Exit:  time: the current time or a cpu-relative time.
+    Exit:  time: the current time or the cpu time used by this process.
     """
     if not GET_CPU_TIME:
         return time.time()
-    global psutil
-    if psutil is None:
-        import psutil
-    cpu_times = psutil.cpu_times()
-    return cpu_times.user + cpu_times.system
+    return time.process_time()
 
 
 def graph_coefficient_of_drag(user_params=None):
@@ -1307,19 +1887,17 @@ def graph_coefficient_of_drag(user_params=None):
         if method == 'miller':
             cod_miller.replace_table(params['json'])
     substep = 100
+    global numpy
+    if numpy is None:
+        import numpy
+    re = numpy.arange(int((remax-remin)/(reint/substep))+1)*reint/substep+remin
     for mni in range(int((mnmax-mnmin)/mnint)+1):
         mn = mni*mnint+mnmin
-        datax = []
-        datay = []
-        for rei in range(int((remax-remin)/(reint/substep))+1):
-            re = rei*reint/substep+remin
-            cd = coefficient_of_drag(
-                state={'settings': {'drag_method': method}},
-                reynolds=10**re, mach=mn, only_in_range=True if not params.get('oor') else False)
-            if cd is not None:
-                datax.append(re)
-                datay.append(cd)
-        plt.plot(datax, datay)
+        cd, _ = coefficient_of_drag_array(
+            10**re, mn, state={'settings': {'drag_method': method}},
+            only_in_range=True if not params.get('oor') else False)
+        valid = ~numpy.isnan(cd)
+        plt.plot(re[valid], cd[valid])
     for (mn, data, _crit) in MnReCdDataTable:
         points = [val for val in data if val[0] >= 10**remin and
                   val[0] <= 10**remax]
@@ -1369,6 +1947,50 @@ def html_encode(text):
         '<', '&lt;').replace('>', '&gt;')
 
 
+def moist_air_density(T, h, p, psv):
+    """
+    Calculate the density of moist air and the mole fraction of water vapor
+    using the CIPM-2007 formula.  See atmospheric_density.  This only uses
+    arithmetic operations, so the parameters may be numpy arrays.
+
+    Enter: T: temperature in K.
+           h: relative humidity on a scale of [0-1].
+           p: atmospheric pressure in Pa.
+           psv: vapor pressure at saturation in Pa.  See
+                saturation_vapor_pressure.
+    Exit:  density: atmospheric density in kg/m/m/m.
+           xv: mole fraction of water vapor.
+    """
+    # calculate the partial pressure of dry air and water vapor
+    # From 'Revised formula for the density of moist air (CIPM-2007)'
+    t = T-273.15  # convert to centigrade
+    R = 8.314472  # J/(mol*K), universal gass constant, from CIPM-2007
+    Ma = 0.02896546  # kg/mol, molar mass of dry air, from CIPM-2007
+    Mv = 0.01801528  # kg/mol, molar mass of water vapor, from CIPM-2007
+    # Calculate xv (from CIPM-2007)
+    # f is the enhancement factor
+    alpha = 1.00062
+    beta = 3.14e-8  # 1/Pa
+    gamma = 5.6e-7  # 1/(K^2)
+    f = alpha+beta*p+gamma*t**2
+    # Now we can calculate xv, the mole fraction of water vapor
+    xv = h*f*psv/p
+    # Calculate Z, the compressibility factor (from CIPM-2007)
+    a0 = 1.58123e-6  # K/Pa
+    a1 = -2.9331e-8  # 1/Pa
+    a2 = 1.1043e-10  # 1/(K Pa)
+    b0 = 5.707e-6  # K/Pa
+    b1 = -2.051e-8  # 1/Pa
+    c0 = 1.9898e-4  # K/Pa
+    c1 = -2.376e-6  # 1/Pa
+    d = 1.83e-11  # (K/Pa)^2
+    e = -0.765e-8  # (K/Pa)^2
+    Z = (1 - p/T * (a0 + a1*t + a2*t**2 + (b0+b1*t)*xv + (c0+c1*t)*xv**2) +
+         p**2 / T**2 * (d+e*xv**2))
+    pa = p*Ma/(Z*R*T)*(1-xv*(1-Mv/Ma))
+    return pa, xv
+
+
 def next_point(state, dt):
     """
     Compute the next position of a sphere using a Runge-Kutta interpolation.
@@ -1379,61 +2001,154 @@ def next_point(state, dt):
     Exit:  newstate: the updated state.
     """
     newstate = state.copy()
-    x = state.get('x', 0)
-    y = state.get('y', 0)
-    vx = state.get('vx', 0)
-    vy = state.get('vy', 0)
+    step = TrajectoryStep.from_state(state)
     # we use the acceleration, if it is stored
     if 'ax' not in state or 'ay' not in state:
-        ax, ay = acceleration(state, y, vx, vy)
-    else:
-        ax = state['ax']
-        ay = state['ay']
+        step.ax, step.ay = acceleration(newstate, step.y, step.vx, step.vy)
+    step = next_step(newstate, step, dt)
+    return step.to_state(newstate)
+
+
+def next_step(work, step, dt):
+    """
+    Compute the next position of a sphere using a Runge-Kutta interpolation.
+    This is the inner loop of the trajectory calculation.
+
+    Enter: work: a dictionary of the state of the projectile.  This is used
+                 for computing accelerations and the y, vx, vy, and derived
+                 data values are modified.  The values in the step take
+                 precedence over those in this dictionary.
+           step: the current TrajectoryStep.
+           dt: time delta in seconds.
+    Exit:  newstep: a new TrajectoryStep.  The work dictionary's derived
+                    data values correspond to this step.
+    """
+    x = step.x
+    y = step.y
+    vx = step.vx
+    vy = step.vy
+    ax = step.ax
+    ay = step.ay
     if Verbose >= 2:
-        display_status(state, {'ax': ax, 'ay': ay})
+        display_status(work, {
+            'x': x, 'y': y, 'vx': vx, 'vy': vy, 'ax': ax, 'ay': ay,
+            'time': step.time})
     if UseRungeKutta is True:
         dx1 = dt*vx
         dy1 = dt*vy
         dvx1 = dt*ax
         dvy1 = dt*ay
-        ax1, ay1 = acceleration(state, y+0.5*dy1, vx+0.5*dvx1, vy+0.5*dvy1)
+        ax1, ay1 = acceleration(work, y+0.5*dy1, vx+0.5*dvx1, vy+0.5*dvy1)
 
         dx2 = dt*(vx+0.5*dvx1)
         dy2 = dt*(vy+0.5*dvy1)
         dvx2 = dt*ax1
         dvy2 = dt*ay1
-        ax2, ay2 = acceleration(state, y+0.5*dy2, vx+0.5*dvx2, vy+0.5*dvy2)
+        ax2, ay2 = acceleration(work, y+0.5*dy2, vx+0.5*dvx2, vy+0.5*dvy2)
 
         dx3 = dt*(vx+0.5*dvx2)
         dy3 = dt*(vy+0.5*dvy2)
         dvx3 = dt*ax2
         dvy3 = dt*ay2
-        ax3, ay3 = acceleration(state, y+dy3, vx+dvx3, vy+dvy3)
+        ax3, ay3 = acceleration(work, y+dy3, vx+dvx3, vy+dvy3)
 
         dx4 = dt*(vx+dvx3)
         dy4 = dt*(vy+dvy3)
         dvx4 = dt*ax3
         dvy4 = dt*ay3
 
-        newstate['x'] = x+(dx1+dx2*2+dx3*2+dx4)/6
-        newstate['y'] = y+(dy1+dy2*2+dy3*2+dy4)/6
-        newstate['vx'] = vx+(dvx1+dvx2*2+dvx3*2+dvx4)/6
-        newstate['vy'] = vy+(dvy1+dvy2*2+dvy3*2+dvy4)/6
+        x += (dx1+dx2*2+dx3*2+dx4)/6
+        y += (dy1+dy2*2+dy3*2+dy4)/6
+        vx += (dvx1+dvx2*2+dvx3*2+dvx4)/6
+        vy += (dvy1+dvy2*2+dvy3*2+dvy4)/6
     else:
-        newstate['x'] = vx*dt+x
-        newstate['y'] = vy*dt+y
-        newstate['vx'] = vx+ax*dt
-        newstate['vy'] = vy+ay*dt
-    # All methods advance the same amount of time
-    newstate['time'] = state.get('time', 0)+dt
-    # store the acceleration for the next step
-    ax4, ay4 = acceleration(newstate)
-    newstate['ax'] = ax4
-    newstate['ay'] = ay4
-    return newstate
+        x += vx*dt
+        y += vy*dt
+        vx += ax*dt
+        vy += ay*dt
+    # store the acceleration for the next step.  All methods advance the same
+    # amount of time
+    ax, ay = acceleration(work, y, vx, vy)
+    return TrajectoryStep(x, y, vx, vy, ax, ay, step.time+dt)
+
+
+def next_step_adaptive(work, step, dt):
+    """
+    Compute the next position of a sphere using the Dormand-Prince method.
+    The step size is reduced until the estimated local error is within
+    tolerance, and a step size for the next step is suggested based on the
+    error.
+
+    Enter: work: a dictionary of the state of the projectile.  See next_step.
+           step: the current TrajectoryStep.
+           dt: the time delta to try in seconds.
+    Exit:  newstep: a new TrajectoryStep.  The work dictionary's derived
+                    data values correspond to this step.
+           dt: the suggested time delta for the next step.
+    """
+    y0 = step.y
+    vx0 = step.vx
+    vy0 = step.vy
+    if Verbose >= 2:
+        display_status(work, {
+            'x': step.x, 'y': y0, 'vx': vx0, 'vy': vy0, 'ax': step.ax,
+            'ay': step.ay, 'time': step.time})
+    while True:
+        vxs = [vx0]
+        vys = [vy0]
+        axs = [step.ax]
+        ays = [step.ay]
+        try:
+            for coef in DormandPrinceA:
+                dx = dy = dvx = dvy = 0
+                for c, vx, vy, ax, ay in zip(coef, vxs, vys, axs, ays):
+                    dx += c*vx
+                    dy += c*vy
+                    dvx += c*ax
+                    dvy += c*ay
+                vx = vx0+dt*dvx
+                vy = vy0+dt*dvy
+                ax, ay = acceleration(work, y0+dt*dy, vx, vy)
+                vxs.append(vx)
+                vys.append(vy)
+                axs.append(ax)
+                ays.append(ay)
+            x = step.x+dt*dx
+            y = y0+dt*dy
+            ex = ey = evx = evy = 0
+            for c, vx, vy, ax, ay in zip(DormandPrinceE, vxs, vys, axs, ays):
+                ex += c*vx
+                ey += c*vy
+                evx += c*ax
+                evy += c*ay
+            err = 0
+            for e, v0, v1 in ((ex, step.x, x), (ey, y0, y), (evx, vx0, vx),
+                              (evy, vy0, vy)):
+                err += (dt*e/(AdaptiveAbsoluteTolerance+AdaptiveRelativeTolerance *
+                              max(abs(v0), abs(v1))))**2
+            err = (err/4)**0.5
+        except (OverflowError, ValueError, ZeroDivisionError):
+            err = float('inf')
+        if math.isnan(err) or math.isinf(err):
+            if dt <= AdaptiveMinTimeDelta:
+                work['error'] = 'Failed - adaptive step size too small'
+                return step, dt
+            dt = max(dt*0.2, AdaptiveMinTimeDelta)
+            continue
+        # Standard step size control with a safety factor, limited to
+        # growing or shrinking by a factor of 5
+        factor = max(0.2, min(5, 0.9*err**-0.2 if err > 0 else 5))
+        if err <= 1:
+            return TrajectoryStep(x, y, vx, vy, ax, ay, step.time+dt), dt*factor
+        # A step that is still outside of the tolerance at the smallest step
+        # size would give an answer that only appears to be converged
+        if dt <= AdaptiveMinTimeDelta:
+            work['error'] = 'Failed - adaptive step size too small'
+            return step, dt
+        dt = max(dt*factor, AdaptiveMinTimeDelta)
 
 
-def parse_arguments(argv, allowUnknownParams=False):  # noqa
+def parse_arguments(argv, allowUnknownParams=False, readConfig=True):  # noqa
     """
     Parse command line arguments, read in the config file, and read in
     environment configuration.
@@ -1442,26 +2157,45 @@ def parse_arguments(argv, allowUnknownParams=False):  # noqa
                  is sys.argv[1:]).
            allowUnknownParams: if False, ask for help if an unknown parameter
                                is specified.
+           readConfig: if False, don't read the config file or environment
+                       configuration.
     Exit:  params: program parameters.
            state: initial calculation state.
            help: True if the help must be shown.
     """
-    global PrecisionInDigits, UseRungeKutta, Verbose
+    global AdaptiveAbsoluteTolerance, AdaptiveRelativeTolerance, AtmosphereBand
+    global PrecisionInDigits, Solver, UseAdaptive, UseRungeKutta, Verbose
 
     state = {'final_height': '0'}
     params = {}
     help = False
-    argv[0:0] = read_config()
-    argv[0:0] = read_config_env()
+    if readConfig:
+        argv[0:0] = read_config()
+        argv[0:0] = read_config_env()
     i = 0
     while i < len(argv):
         arg = argv[i]
         i += 1
-        if arg.startswith('--cdgraph='):
+        if arg.startswith('--atol='):
+            AdaptiveAbsoluteTolerance = float(arg.split('=', 1)[1])
+        elif arg.startswith('--atmosband='):
+            AtmosphereBand = float(convert_units(arg.split('=', 1)[1], 'm'))
+        elif arg.startswith('--cdgraph='):
             params['cdgraph'] = (params.get('cdgraph', '') + ',' +
                                  arg.split('=', 1)[1]).strip(',')
         elif arg.startswith('--comment='):
             params['comment'] = arg.split('=', 1)[1]
+        elif arg == '--dragcache':
+            use_drag_cache(strict=False)
+        elif arg.startswith('--dragcache='):
+            value = arg.split('=', 1)[1]
+            if value == 'strict':
+                use_drag_cache(strict=True)
+            elif value == '0':
+                use_drag_cache(False)
+            else:
+                steps = [float(val) for val in value.split(',')]
+                use_drag_cache(True, *steps[:2], strict=False)
         elif arg.startswith('--config='):
             argv[i:i] = read_config(arg.split('=', 1)[1])
         elif arg == '--graph':
@@ -1475,6 +2209,17 @@ def parse_arguments(argv, allowUnknownParams=False):  # noqa
         elif arg.startswith('--method='):
             method = arg.split('=', 1)[1]
             UseRungeKutta = (method != 'simple')
+            UseAdaptive = (method == 'adaptive')
+        elif arg == '--millergrid':
+            from . import cod_miller
+            cod_miller.use_grid()
+        elif arg.startswith('--millergrid='):
+            from . import cod_miller
+            steps = [float(val) for val in arg.split('=', 1)[1].split(',')]
+            if steps == [0]:
+                cod_miller.use_grid(False)
+            else:
+                cod_miller.use_grid(True, *steps[:2])
         elif arg.startswith('--millerjson='):
             from . import cod_miller
             cod_miller.replace_table(arg.split('=', 1)[1])
@@ -1489,8 +2234,15 @@ def parse_arguments(argv, allowUnknownParams=False):  # noqa
                                 arg.split('=', 1)[1]).strip(',')
         elif arg.startswith('--precision='):
             PrecisionInDigits = float(arg.split('=', 1)[1])
+        elif arg.startswith('--rtol='):
+            AdaptiveRelativeTolerance = float(arg.split('=', 1)[1])
         elif arg.startswith('--scan='):
             params['unknown_scan'] = arg.split('=', 1)[1]
+        elif arg.startswith('--solver='):
+            Solver = arg.split('=', 1)[1]
+            if Solver not in ('brent', 'illinois', 'legacy', 'secant'):
+                print('Unknown solver %s' % Solver)
+                help = True
         elif arg == '--units':
             params['units'] = True
         elif arg.startswith('--units='):
@@ -1499,6 +2251,8 @@ def parse_arguments(argv, allowUnknownParams=False):  # noqa
             Verbose += 1  # noqa
         elif arg == '--version':
             params['version'] = True
+        elif arg == '--versioncheck':
+            params['versioncheck'] = True
         else:
             value = None
             for key in Factors:
@@ -1743,6 +2497,48 @@ def relative_humidity(state):
             math.pow(10, (c - c1) + b / Tdp - b1 / T))
 
 
+def reset_counters():
+    """
+    Set all of the counters of computation work to zero.
+    """
+    for key in Counters:
+        Counters[key] = 0
+
+
+def saturation_vapor_pressure(T):
+    """
+    Calculate the vapor pressure of water at saturation from CIPM-2007.
+
+    Enter: T: temperature in K.
+    Exit:  psv: vapor pressure at saturation in Pa.
+    """
+    A = 1.2378847e-5  # 1/(K^2)
+    B = -1.9121316e-2  # 1/K
+    C = 33.93711047
+    D = -6.3431645e3  # K
+    psv = 1*math.exp(A*T**2+B*T+C+D/T)
+    return psv
+
+
+def source_checksum():
+    """
+    Return a checksum of the source code of this package.  Unlike the
+    version, this changes when any module changes, not just this file.
+
+    Exit:  checksum: a hexadecimal string.
+    """
+    import hashlib
+
+    checksum = hashlib.md5()
+    path = os.path.dirname(os.path.abspath(__file__))
+    for name in sorted(os.listdir(path)):
+        if name.endswith('.py'):
+            checksum.update(name.encode('utf8'))
+            with open(os.path.join(path, name), 'rb') as fptr:
+                checksum.update(fptr.read())
+    return checksum.hexdigest()
+
+
 def speed_of_sound(state):
     """
     Calculate the speed of sound in m/s based on the temperature and humidity.
@@ -1754,6 +2550,9 @@ def speed_of_sound(state):
                   top of the program.
     Exit:  speed_of_sound: the speed of sound in m/s.
     """
+    atmosphere = state.get('atmosphere')
+    if atmosphere is not None:
+        return atmosphere.properties(state.get('y', 0))[6]
     if 'density_data' not in state:
         # This populates density_data with a variety of values we need,
         # including the mole fraction of water vapor and the temperature
@@ -1769,7 +2568,7 @@ def speed_of_sound(state):
     return sos
 
 
-def trajectory(state):  # noqa - mccabe
+def trajectory(state):
     """
     Compute the trajectory of the specified sphere.
 
@@ -1780,129 +2579,115 @@ def trajectory(state):  # noqa - mccabe
                         calculation.
            points: a list of points along the trajectory.
     """
-    state = state.copy()
-    # Set up the initial conditions
-    state['time'] = 0
-    state['x'] = 0
-    state['y'] = state.get('initial_height', 0)
-    if state['y'] is None:
-        state['y'] = 0
-    state['max_height'] = state['y']
-    # determine the third of material, diameter, and mass if two are known
-    state = determine_material(state, Verbose)
-    v = state.get('initial_velocity', 0)
-    if not v:
-        try:
-            v = (2*state['charge']*state['power_factor']/state['mass'])**0.5
-            state['initial_velocity'] = v
-        except Exception:
-            state['error'] = ('Failed - no initial velocity or no charge, '
-                              'power factor, or mass.')
-            return state, []
-    if 'charge' not in state and 'power_factor' in state:
-        state['charge'] = state['mass']*v**2/(2*state['power_factor'])
-    if 'power_factor' not in state and 'charge' in state:
-        state['power_factor'] = state['mass']*v**2/(2*state['charge'])
-    angle = math.pi/180*state.get('initial_angle', Factors['initial_angle']['default'])
-    state['vx'] = v*math.cos(angle)
-    state['vy'] = v*math.sin(angle)
-    ax, ay = acceleration(state)
-    state['ax'] = ax
-    state['ay'] = ay
-    delta = state.get('time_delta', Factors['time_delta']['default'])
-    final_y = state.get('final_height', None)
-    if 'rising_height' in state:
-        final_y = None
-    max_range = state.get('range', None)
-    max_time = state.get('final_time', None)
-    min_velocity = state.get('final_velocity', None)
-    final_angle = state.get('final_angle', None)
-    if (final_y is None and max_range is None and max_time is None and
-            min_velocity is None and final_angle is None):
-        state['error'] = (
-            'Failed - at least one of final_height, range, final_time, '
-            'final_velocity, or final_angle must be specified to compute the '
-            'trajectory.  final_velocity could also be computed through '
-            'appropriate pendulum information.')
+    Counters['trajectories'] += 1
+    state, end = trajectory_setup(state)
+    if end is None:
         return state, []
-    cutoff_height = min(state.get('initial_height') or 0,
-                        state.get('final_height') or 0)
-    if cutoff_height is None:
-        cutoff_height = 0
-    cutoff_height -= 5000
+    delta = state.get('time_delta', Factors['time_delta']['default'])
+    # The working dictionary holds the values that don't change each step and
+    # the derived data of the most recent acceleration calculation.
+    work = state
+    if state.get('pressure') != 0:
+        work['atmosphere'] = Atmosphere(state)
+    step = TrajectoryStep.from_state(state)
+    max_height = state['max_height']
+    cutoff_height = end['cutoff_height']
     # Now compute the trajectory in a series of steps until the end condition
     # is reached.
-    laststate = []
+    laststep = None
     points = []
+    lastpoint = None
     while True:
-        proceed = 'check'
-        if final_y is not None:
-            offset = state['y'] - final_y
-            if state['vy'] >= 0:
-                proceed = True
-        elif max_range is not None:
-            offset = max_range-state['x']
-        elif max_time is not None:
-            offset = time-state['time']
-        elif min_velocity is not None:
-            offset = (state['vx']**2+state['vy']**2)**0.5-min_velocity
-        elif final_angle is not None:
-            curangle = -math.atan2(state['vy'], state['vx']) * 180 / math.pi
-            offset = final_angle - curangle
-            if state['vy'] >= 0:
-                proceed = True
-        if offset < 0 and proceed == 'check':
+        offset, check = trajectory_end_offset(end, step)
+        if offset < 0 and check:
             break
-        if state['y'] < cutoff_height:
+        if step.y < cutoff_height:
             break
-        if state['y'] > state['max_height']:
-            state['max_height'] = state['y']
-        if (not len(points) or
-                state['time']-points[-1]['time']+delta*0.5 > MinPointInterval):
-            point = {}
-            for key in ('x', 'y', 'vx', 'vy', 'ax', 'ay', 'time'):
-                point[key] = state[key]
-            if 'drag_data' in state:
-                for key in ('Re', 'Mn'):
-                    point[key] = state['drag_data'][key]
+        if step.y > max_height:
+            max_height = step.y
+        if laststep is not None and laststep.vy > 0 and step.vy <= 0:
+            apex = laststep.hermite(step, trajectory_apex(laststep, step))
+            max_height = max(max_height, apex.y)
+        if (lastpoint is None or
+                step.time-lastpoint+delta*0.5 > MinPointInterval):
+            point = {
+                'x': step.x, 'y': step.y, 'vx': step.vx, 'vy': step.vy,
+                'ax': step.ax, 'ay': step.ay, 'time': step.time}
+            if 'drag_data' in work:
+                point['Re'] = work['drag_data']['Re']
+                point['Mn'] = work['drag_data']['Mn']
             points.append(point)
-        laststate = laststate[-1:] + [(state.copy(), offset)]
-        state = next_point(state, delta)
+            lastpoint = step.time
+        laststep = step
+        if UseAdaptive:
+            step, delta = next_step_adaptive(work, step, delta)
+        else:
+            step = next_step(work, step, delta)
+        Counters['steps'] += 1
         if Verbose >= 4:
-            pprint.pprint(state)
-        if 'error' in state:
+            import pprint
+            pprint.pprint(step.to_state(work))
+        if 'error' in work:
+            state = step.to_state(work)
+            state['max_height'] = max_height
+            state.pop('atmosphere', None)
             return state, []
-    final_state = state.copy()
-    if len(laststate):
-        laststate.append((state, offset))
-        while len(laststate) > 1 and laststate[0][-1] * laststate[-1][-1] > 0:
-            laststate = laststate[1:]
-        for key in ('x', 'y', 'vx', 'vy', 'ax', 'ay', 'time'):
-            final_state[key] = interpolate(
-                0, [(ls[1], ls[0][key]) for ls in laststate], False)[0]
-        if 'drag_data' in state and 'drag_date' in laststate:
-            for key in ('Re', 'Mn'):
-                final_state['drag_data'][key] = interpolate(
-                    0, [(ls[1], ls[0]['drag_data'][key]) for ls in laststate], False)[0]
-        if final_y is not None:
-            final_state['y'] = final_y
-        elif max_range is not None:
-            final_state['x'] = max_range
-        elif max_time is not None:
-            final_state['time'] = max_time
-        point = {}
-        for key in ('x', 'y', 'vx', 'vy', 'ax', 'ay', 'time'):
-            point[key] = final_state[key]
-        if 'drag_data' in final_state:
-            for key in ('Re', 'Mn'):
-                point[key] = final_state['drag_data'][key]
-        points.append(point)
+    work['max_height'] = max_height
+    final_state = trajectory_finish(work, laststep, step, end, points)
+    final_state.pop('atmosphere', None)
     if Verbose >= 2:
         display_status(final_state, last=True)
     return final_state, points
 
 
-def trajectory_error(initial_state, unknown, unknown_value):  # noqa
+def trajectory_apex(laststep, step):
+    """
+    Locate the maximum height of the projectile within a step where the
+    vertical velocity changes from positive to non-positive.
+
+    Enter: laststep: the TrajectoryStep at the start of the step.
+           step: the TrajectoryStep at the end of the step.
+    Exit:  theta: the fraction of the step in the range [0-1] where the
+                  vertical velocity is zero.
+    """
+    return illinois(lambda theta: laststep.hermite(step, theta).vy,
+                    0, 1, laststep.vy, step.vy, xtol=1e-12, rtol=0)
+
+
+def trajectory_end_offset(end, step):
+    """
+    Determine how far a state is from the end of the trajectory.
+
+    Enter: end: the end conditions as returned by trajectory_setup.
+           step: the current TrajectoryStep.
+    Exit:  offset: a value that becomes negative when the end condition has
+                   been passed.
+           check: True if a negative offset ends the trajectory.  False if
+                  the projectile is still rising toward a final height or
+                  angle.
+    """
+    check = True
+    if end['final_y'] is not None:
+        offset = step.y - end['final_y']
+        if step.vy >= 0:
+            check = False
+    elif end['max_range'] is not None:
+        offset = end['max_range'] - step.x
+    elif end['max_time'] is not None:
+        offset = end['max_time'] - step.time
+    elif end['min_velocity'] is not None:
+        offset = (step.vx**2+step.vy**2)**0.5 - end['min_velocity']
+    elif end['final_angle'] is not None:
+        curangle = -math.atan2(step.vy, step.vx) * 180 / math.pi
+        offset = end['final_angle'] - curangle
+        if step.vy >= 0:
+            check = False
+    else:
+        offset = end['rising_y'] - step.y
+    return offset, check
+
+
+def trajectory_error(initial_state, unknown, unknown_value):
     """
     Determine how far off the results of a trajectory calculation are from the
     expected outcome.
@@ -1926,17 +2711,9 @@ def trajectory_error(initial_state, unknown, unknown_value):  # noqa
         state = None
     finally:
         Verbose += 2
-    if Verbose >= 5:
-        pprint.pprint(state)
-    if state is None:
-        print('Cannot calculate trajectory error - trajectory is None')
-        return None
-    if any(key.startswith('delta_') for key in initial_state):
-        delta_state = initial_state.copy()
-        for key in delta_state:
-            if key.startswith('delta_') and key[6:] in delta_state:
-                delta_state[key[6:]] -= delta_state[key]
-        delta_state[unknown] = unknown_value
+    delta_state = None
+    if state is not None and any(key.startswith('delta_') for key in initial_state):
+        delta_state = trajectory_error_delta_state(initial_state, unknown, unknown_value)
         Verbose -= 2
         try:
             delta_state, _points = trajectory(delta_state)
@@ -1944,6 +2721,50 @@ def trajectory_error(initial_state, unknown, unknown_value):  # noqa
             delta_state = None
         finally:
             Verbose += 2
+    return trajectory_error_from_states(initial_state, unknown, state, delta_state)
+
+
+def trajectory_error_delta_state(initial_state, unknown, unknown_value):
+    """
+    When the initial state has delta_ values, such as delta_range, construct
+    the state for the second trajectory that is compared to the first.
+
+    Enter: initial_state: a dictionary of the initial state.
+           unknown: the parameter within the state to set.
+           unknown_value: the value to set the unknown parameter to.
+    Exit:  delta_state: the initial state of the second trajectory.
+    """
+    delta_state = initial_state.copy()
+    for key in delta_state:
+        if key.startswith('delta_') and key[6:] in delta_state:
+            delta_state[key[6:]] -= delta_state[key]
+    delta_state[unknown] = unknown_value
+    return delta_state
+
+
+def trajectory_error_from_states(initial_state, unknown, state, delta_state=None):  # noqa
+    """
+    Determine how far off the results of a computed trajectory are from the
+    expected outcome.
+
+    Enter: initial_state: a dictionary of the initial state.  See comment
+                          at the top of the program.
+           unknown: the parameter within the state that was varied.
+           state: the final state of the computed trajectory or None if it
+                  could not be computed.
+           delta_state: if the initial state has delta_ values, the final
+                        state of the second trajectory.  See
+                        trajectory_error_delta_state.
+    Exit:  error: a metric of how far off the trajectory is from the
+                    expected outcome.
+    """
+    if Verbose >= 5:
+        import pprint
+        pprint.pprint(state)
+    if state is None:
+        print('Cannot calculate trajectory error - trajectory is None')
+        return None
+    if any(key.startswith('delta_') for key in initial_state):
         if delta_state is None:
             print('Cannot calculate trajectory error - trajectory is None')
             return None
@@ -1984,6 +2805,228 @@ def trajectory_error(initial_state, unknown, unknown_value):  # noqa
     return None
 
 
+def trajectory_errors(initial_state, unknown, values):
+    """
+    Determine how far off the results of trajectory calculations are from the
+    expected outcome for a list of values of the unknown.  The errors are
+    computed as they are needed, so a caller that stops early doesn't compute
+    the rest.  If numpy is available, the trajectories are computed together
+    in blocks of ScanBlockSize.
+
+    Enter: initial_state: a dictionary of the initial state.  See comment
+                          at the top of the program.
+           unknown: the parameter within the state to set.
+           values: a list of values to set the unknown parameter to.
+    Exit:  errors: an iterator of the error metric for each value.  See
+                   trajectory_error.
+    """
+    global numpy
+    if numpy is None:
+        try:
+            import numpy
+        except ImportError:
+            numpy = False
+    for start in range(0, len(values), ScanBlockSize):
+        block = values[start:start + ScanBlockSize]
+        errors = None
+        if numpy and len(block) > 1 and not UseAdaptive:
+            from . import batch
+
+            try:
+                errors = batch.trajectory_errors(initial_state, unknown, block)
+            except (TypeError, ValueError, OverflowError):
+                pass
+        if errors is not None:
+            for error in errors:
+                yield error
+        else:
+            for value in block:
+                yield trajectory_error(initial_state, unknown, value)
+
+
+def trajectory_event(laststep, step, end):
+    """
+    Locate where the end condition of the trajectory is met within the last
+    step using the dense output of the step.
+
+    Enter: laststep: the TrajectoryStep before the end condition is met.
+           step: the first TrajectoryStep past the end condition or below the
+                 cutoff height.
+           end: the end conditions as returned by trajectory_setup.
+    Exit:  theta: the fraction of the step in the range [0-1] where the end
+                  condition is met or None if it could not be located.
+           reached: True if the end condition was met, False if the step
+                    went below the cutoff height.
+    """
+    offset, check = trajectory_end_offset(end, step)
+    reached = offset < 0 and check
+    if reached:
+        def func(theta):
+            return trajectory_end_offset(end, laststep.hermite(step, theta))[0]
+    else:
+        def func(theta):
+            return laststep.hermite(step, theta).y - end['cutoff_height']
+        offset = func(1)
+    lo = 0
+    flo = func(lo)
+    # If the end condition is a height or angle that was below the target
+    # while still rising, the end is on the descending side of the apex.
+    if flo <= 0 and laststep.vy > 0 and step.vy <= 0:
+        lo = trajectory_apex(laststep, step)
+        flo = func(lo)
+    if flo <= 0 or offset > 0:
+        return None, reached
+    return illinois(func, lo, 1, flo, offset, xtol=1e-12, rtol=0), reached
+
+
+def trajectory_finish(work, laststep, step, end, points):
+    """
+    Given the first step that is past the end condition of the trajectory,
+    locate the final state within the last step.
+
+    Enter: work: the working dictionary of the trajectory.  This has the
+                 values that don't change each step and max_height.  The
+                 derived data values are modified.
+           laststep: the TrajectoryStep that preceded the final step or None
+                     if the initial step is past the end condition.
+           step: the first TrajectoryStep that is past the end condition.
+           end: the end conditions as returned by trajectory_setup.
+           points: a list of points along the trajectory.  The final point
+                   is appended to this list.
+    Exit:  final_state: the final state of the projectile.
+    """
+    if laststep is None:
+        return step.to_state(work)
+    theta, reached = trajectory_event(laststep, step, end)
+    max_height = work['max_height']
+    if laststep.vy > 0 and step.vy <= 0:
+        apex = trajectory_apex(laststep, step)
+        if theta is None or apex <= theta:
+            max_height = max(max_height, laststep.hermite(step, apex).y)
+    if theta is not None:
+        step = laststep.hermite(step, theta)
+    # Compute the acceleration and derived data at the final point
+    step.ax, step.ay = acceleration(work, step.y, step.vx, step.vy)
+    final_state = step.to_state(work)
+    final_state['max_height'] = max(max_height, final_state['y'])
+    if theta is not None and reached:
+        if end['final_y'] is not None:
+            final_state['y'] = end['final_y']
+        elif end['max_range'] is not None:
+            final_state['x'] = end['max_range']
+        elif end['max_time'] is not None:
+            final_state['time'] = end['max_time']
+        elif end['rising_y'] is not None:
+            final_state['y'] = end['rising_y']
+    point = {}
+    for key in ('x', 'y', 'vx', 'vy', 'ax', 'ay', 'time'):
+        point[key] = final_state[key]
+    if 'drag_data' in final_state:
+        for key in ('Re', 'Mn'):
+            point[key] = final_state['drag_data'][key]
+    points.append(point)
+    return final_state
+
+
+def trajectory_setup(state):
+    """
+    Prepare the initial conditions of a trajectory and determine when the
+    trajectory ends.
+
+    Enter: state: a dictionary of the initial state.  See comment at the
+                  top of the program.
+    Exit:  state: a new dictionary with the initial position, velocity, and
+                  acceleration.  This includes an 'error' item if the
+                  trajectory cannot be computed.
+           end: a dictionary of the end conditions with final_y, max_range,
+                max_time, min_velocity, final_angle, rising_y, and
+                cutoff_height.  rising_y is only used if none of the other
+                end conditions are specified.  None if the trajectory cannot
+                be computed.
+    """
+    state = state.copy()
+    # Set up the initial conditions
+    state['time'] = 0
+    state['x'] = 0
+    state['y'] = state.get('initial_height', 0)
+    if state['y'] is None:
+        state['y'] = 0
+    state['max_height'] = state['y']
+    # determine the third of material, diameter, and mass if two are known
+    state = determine_material(state, Verbose)
+    v = state.get('initial_velocity', 0)
+    if not v:
+        try:
+            v = (2*state['charge']*state['power_factor']/state['mass'])**0.5
+            state['initial_velocity'] = v
+        except Exception:
+            state['error'] = ('Failed - no initial velocity or no charge, '
+                              'power factor, or mass.')
+            return state, None
+    if 'charge' not in state and 'power_factor' in state:
+        state['charge'] = state['mass']*v**2/(2*state['power_factor'])
+    if 'power_factor' not in state and 'charge' in state:
+        state['power_factor'] = state['mass']*v**2/(2*state['charge'])
+    angle = math.pi/180*state.get('initial_angle', Factors['initial_angle']['default'])
+    state['vx'] = v*math.cos(angle)
+    state['vy'] = v*math.sin(angle)
+    ax, ay = acceleration(state)
+    state['ax'] = ax
+    state['ay'] = ay
+    end = {
+        'final_y': state.get('final_height', None),
+        'max_range': state.get('range', None),
+        'max_time': state.get('final_time', None),
+        'min_velocity': state.get('final_velocity', None),
+        'final_angle': state.get('final_angle', None),
+        'rising_y': None,
+    }
+    if 'rising_height' in state:
+        end['final_y'] = None
+        # Only stop at the rising height if nothing else ends the trajectory
+        if all(value is None for value in end.values()):
+            end['rising_y'] = state['rising_height']
+    if all(value is None for value in end.values()):
+        state['error'] = (
+            'Failed - at least one of final_height, rising_height, range, '
+            'final_time, final_velocity, or final_angle must be specified to '
+            'compute the trajectory.  final_velocity could also be computed '
+            'through appropriate pendulum information.')
+        return state, None
+    cutoff_height = min(state.get('initial_height') or 0,
+                        state.get('final_height') or 0)
+    end['cutoff_height'] = cutoff_height - 5000
+    return state, end
+
+
+def use_drag_cache(enable=True, log_re_step=None, mach_step=None, strict=None,
+                   size=None):
+    """
+    Enable or disable the drag cache.  See DragCache.  The cache is only
+    emptied if it is disabled or the settings change.
+
+    Enter: enable: True to use the drag cache.
+           log_re_step: if not None, the log10 Reynolds number interval that
+                        values are rounded to.
+           mach_step: if not None, the Mach number interval that values are
+                      rounded to.
+           strict: if not None, True to use exact values rather than rounding.
+           size: if not None, the maximum number of entries in the cache.
+    """
+    global DragCache
+
+    settings = dict(DragCacheSettings)
+    for key, value in (('log_re_step', log_re_step), ('mach_step', mach_step),
+                       ('strict', strict), ('size', size)):
+        if value is not None:
+            settings[key] = value
+    if not enable or settings != DragCacheSettings:
+        DragCache = None
+    DragCacheSettings.update(settings)
+    if enable and DragCache is None:
+        DragCache = collections.OrderedDict()
+
+
 def velocity_from_pendulum(state):
     """
     If there is sufficent information in the state, compute the velocity based
@@ -2029,6 +3072,9 @@ def version_check():
     value, increment the version number, calculate a new program signature,
     and save the file.
     """
+    import hashlib
+    import shutil
+
     path = os.path.abspath(__file__)
     if Verbose >= 4:
         sys.stderr.write('Program file path: %s\n' % path)
@@ -2129,12 +3175,7 @@ def viscosity_water_vapor(T, density):
     mu0 = 1e-6*scaledT**0.5/(0.0181583+0.0177624/scaledT +
                              0.0105287/(scaledT**2)-0.0036744/(scaledT**3))
     scaledRho = density/317.763
-    bij = [[0.501938, 0.162888, -0.130356, 0.907919, -0.551119, 0.146543],
-           [0.235622, 0.789383, 0.673665, 1.207552, 0.0670665, -0.0843370],
-           [-0.274637, -0.743539, -0.959456, -0.687343, -0.497089, 0.195286],
-           [0.145831, 0.263129, 0.347247, 0.213486, 0.100754, -0.032932],
-           [-0.0270448, -0.0253093, -0.0267758, -0.0822904, 0.0602253,
-            -0.0202595]]
+    bij = WaterVaporViscosityTable
     invScaledT_1 = 1 / scaledT - 1
     scaledRho_1 = scaledRho - 1
     factor = 0
@@ -2162,21 +3203,27 @@ def warning(state, tag, message):
     sys.stderr.write(message)
 
 
-def main(argv):  # noqa - mccabe
+def main(argv, versionCheck=True):  # noqa - mccabe
     """
     Process as a stand-alone program.
 
     Enter: argv: typically sys.argv[1:]
+           versionCheck: if False, only check the program signature and
+                         version if --versioncheck is specified.
     """
     params, state, help = parse_arguments(argv)
-    version_check()
+    if versionCheck or params.get('versioncheck'):
+        version_check()
     if help:
         print("""Ballistics analysis.
 
-Syntax:  ballistics.py --cdgraph=(params) --comment=(comment) --config=(file)
-    --graph[=(params)] --help --materials[=full] --method=(method)
-    --nounknown --output[=(params)] --precision=(digits) --scan=(value)
-    --units[=full] -v --version (factors)
+Syntax:  ballistics.py --atmosband=(height) --atol=(value) --cdgraph=(params)
+    --comment=(comment) --config=(file) --dragcache[=(steps)]
+    --graph[=(params)] --help
+    --materials[=full] --method=(method) --millergrid[=(steps)]
+    --millerjson=(file) --nounknown --output[=(params)] --precision=(digits)
+    --rtol=(value) --scan=(value) --solver=(method) --units[=full] -v
+    --version --versioncheck (factors)
 
 If the environment variable 'BALLISTICS_CONF' is set, the value is treated as
 if it is on the command line prior to everything else.  The value is split on
@@ -2185,6 +3232,13 @@ directory as the program called 'ballistics.conf', it is read and included
 after the environment variable and prior to any command line arguments.  See
 read_config for details on the file format.
 
+--atmosband specifies the height interval (which can include units) at which
+ atmospheric properties are computed exactly during a trajectory.  Between
+ these, the properties are interpolated, with a relative error of less than
+ about (height/8400 m)^2/8.  0 computes them exactly at every point.  The
+ default is 1 m.
+--atol specifies the absolute tolerance of each step when using the adaptive
+ method.  The default is 1e-5.
 --cdgraph generates a graph of the coefficient of drag based on Reynolds number
  and Mach number.  This takes a comma-separated list of parameters: remin,
  remax (minimum and maximum Reynolds numbers to plot), mnmin, mnmax (min and
@@ -2198,14 +3252,29 @@ read_config for details on the file format.
  parameters such as would be included on the command line.  Any line that
  begins with # is a comment.  Otherwise, each line is treated as a single
  command line argument.  See the comments in read_config for more details.
+--dragcache caches coefficients of drag across trajectories, so that similar
+ cases don't compute the same values again.  Values are computed at log10
+ Reynolds numbers and Mach numbers rounded to a multiple of an interval, which
+ changes results very slightly.  This optionally takes the log10 Reynolds
+ number and Mach number intervals; the default is '--dragcache=1e-4,1e-4'.
+ 'strict' caches exact values, so results are unchanged.  0 turns off the
+ cache.
 --graph graphs the trajectory.  This accepts a comma separated list of
  parameters.
 --help lists this help.
 --materials shows a list of known materials.  If 'full' is specified, a more
  verbose list is shown.
 --method specifies the numerical method to use.  The choices are 'runge' to use
- the Runge-Kutta method (the default) or 'simple' to use the simplest possible
- method.
+ the Runge-Kutta method (the default), 'adaptive' to use the Dormand-Prince
+ method with a variable time step, or 'simple' to use the simplest possible
+ method.  For the adaptive method, the time delta is only the initial step.
+--millergrid interpolates the miller drag method from a grid of precomputed
+ values rather than computing each value from the tables.  This is much faster
+ but differs slightly: by less than 0.2% except close to the critical Reynolds
+ number, where it differs by up to 0.01 (4%) at low Mach numbers.  This
+ optionally takes the Mach number interval and the log10 Reynolds number
+ interval of the grid; the default is '--millergrid=0.02,0.01'.  A finer grid
+ is more accurate.  0 turns off the grid.
 --millerjson specifies an adjustment file for the miller drag method.
 --nounknown clears the parameter that has been specified for a solution with ?.
  This allows overriding a conf file or the environmental variable.
@@ -2219,6 +3288,7 @@ read_config for details on the file format.
  factors, you can include:
    comment - the comment specified on the command line
    comptime - total computation time in seconds
+   evals - the number of trajectories computed to solve for the unknown
    method - the numerical method
    version - the program version
    diff:(factor):(value) - the difference between that factor and the specified
@@ -2227,14 +3297,25 @@ read_config for details on the file format.
  '--output=format=csv,header=all,blank=1,units=both,range,p:Cal/oz,comment'.
 --precision specifies the precision of the answer in number of digits.  I.e.,
  the error is expected to be less than 1x10^(-(# of digits))*(value).
+--rtol specifies the relative tolerance of each step when using the adaptive
+ method.  The default is 1e-8.
 --scan requires that a scan of the solution space be performed using the
  specified value (which can include units) as the step.   Otherwise, many
  factors are solved using a simple binary search.
+--solver specifies the method used to solve for an unknown factor once it has
+ been bracketed.  The choices are 'brent' to use Brent's method (the default),
+ 'illinois' to use the Illinois variant of the method of false position,
+ 'legacy' to use a bisection blended with inverse quadratic interpolation, or
+ 'secant' to use the secant method from a guess when there is one, falling
+ back to Brent's method.
 --units shows a list of known units.  If 'full' is specified, a more verbose
  list is shown.  In addition to the listed units, most SI units can be prefixed
  with standand SI prefixes.
 -v increases verbosity.
 --version displays the program version.
+--versioncheck updates the program version if the source has changed.  This is
+ always done when the program is run directly, but is skipped by python -m
+ ballistics unless this is specified, since it slows startup.
 
 Any factor can be specified with units.  See --units.  For example, '-c 2oz',
 '--temperature=62F', or '--mass=20 lb 7 oz'.  Most factors can be solved for by
@@ -2272,11 +3353,13 @@ Factors:""")
             generate_output(None, params['output'], None)
         return
     if Verbose >= 2:
+        import pprint
         pprint.pprint(state)
     starttime = get_cpu_time()
     newstate, points = find_unknown(state, params['unknown'], params.get('unknown_scan'))
     newstate['computation_time'] = get_cpu_time()-starttime
     if Verbose >= 1:
+        import pprint
         pprint.pprint(newstate)
     if 'graph' in params:
         graph_trajectory(points, params['graph'])
@@ -6,4 +6,10 @@ import sys
 import ballistics
 
 if __name__ == '__main__':
-    ballistics.main(sys.argv[1:])
+    if sys.argv[1:2] == ['serve']:
+        from ballistics import serve
+        serve.main(sys.argv[2:])
+    else:
+        # The program signature is only checked with --versioncheck to start
+        # faster
+        ballistics.main(sys.argv[1:], versionCheck=False)
@@ -0,0 +1,575 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright David Manthey
+#
+# Licensed under the Apache License, Version 2.0 ( the "License" ); you may
+# not use this file except in compliance with the License.  You may obtain a
+# copy of the License at
+#   http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.   See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""
+Compute a batch of trajectories together using numpy.
+
+Each shot is advanced with the same numerical method as the scalar
+trajectory function, but all of the shots that have not yet reached their end
+condition are stepped together as arrays.  This requires numpy.
+
+This is only used to compute the values of a scan for an unknown factor
+together (see ballistics.trajectory_errors).  Solving for an unknown after
+it is bracketed, and so each case of process.py, needs one trajectory at a
+time and uses the scalar trajectory function.
+"""
+
+import math
+
+import numpy
+
+import ballistics
+from .units import SIGravity
+
+# Indices for the kind of end condition of each shot.  These are in the order
+# of precedence used by trajectory_end_offset.
+EndHeight = 0
+EndRange = 1
+EndTime = 2
+EndVelocity = 3
+EndAngle = 4
+EndRising = 5
+
+# Keys recorded for each step of each shot.
+StepKeys = ('x', 'y', 'vx', 'vy', 'ax', 'ay', 'time', 'Re', 'Mn')
+
+
+def acceleration(shots, y, vx, vy):
+    """
+    Calculate the total acceleration on each sphere of a batch.
+
+    Enter: shots: a dictionary of per-shot arrays as returned from
+                  prepare_shots.  Only the active shots are included.
+           y: an array of heights in meters.
+           vx: an array of horizontal velocities in m/s.
+           vy: an array of vertical velocities in m/s.
+    Exit:  ax: an array of horizontal accelerations in m/s/s.
+           ay: an array of vertical accelerations in m/s/s.
+           Re: an array of Reynolds numbers.  NaN for shots in a vacuum.
+           Mn: an array of Mach numbers.  NaN for shots in a vacuum.
+           error: an array of booleans that are True if the altitude is too
+                  great.
+    """
+    velocity_sq = vx**2+vy**2
+    velocity = velocity_sq**0.5
+    density, viscosity, sos = atmosphere(shots, y)
+    Re = density*velocity*shots['diam']/viscosity
+    Mn = velocity/sos
+    cd = coefficient_of_drag(shots, Re, Mn)
+    area = 0.25*math.pi*shots['diam']**2
+    Fd = 0.5*cd*density*velocity_sq*area
+    accel = Fd/shots['mass']
+    vacuum = shots['vacuum']
+    accel[vacuum] = 0
+    Re[vacuum] = numpy.nan
+    Mn[vacuum] = numpy.nan
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        ax = numpy.where(accel != 0, -accel*vx/velocity, 0.0)
+        ay = numpy.where(accel != 0, -accel*vy/velocity, 0.0)
+    # Mean radius of the earth from WGS-84
+    re = 6371009
+    ay = ay + -SIGravity*(re/(re+y))**2
+    return ax, ay, Re, Mn, y > re / 10
+
+
+def atmosphere(shots, y):
+    """
+    Get the atmospheric properties at the current height of each shot.  As
+    with ballistics.Atmosphere, if ballistics.AtmosphereBand is not zero, the
+    properties are computed at multiples of the band and interpolated
+    linearly between them.
+
+    Enter: shots: a dictionary of per-shot arrays.
+           y: an array of heights in meters.
+    Exit:  density: an array of atmospheric densities in kg/m/m/m.
+           viscosity: an array of viscosities in kg/m/s.
+           sos: an array of speeds of sound in m/s.
+    """
+    band = ballistics.AtmosphereBand
+    if not band:
+        return atmosphere_exact(shots, y)
+    pos = y/band
+    lo = numpy.floor(pos)
+    frac = pos-lo
+    return tuple(vlo+(vhi-vlo)*frac for vlo, vhi in zip(
+        atmosphere_exact(shots, lo*band), atmosphere_exact(shots, (lo+1)*band)))
+
+
+def atmosphere_exact(shots, y):
+    """
+    Compute the atmospheric properties at a height for each shot.  See
+    atmosphere.
+
+    Enter: shots: a dictionary of per-shot arrays.
+           y: an array of heights in meters.
+    Exit:  density: an array of atmospheric densities in kg/m/m/m.
+           viscosity: an array of viscosities in kg/m/s.
+           sos: an array of speeds of sound in m/s.
+    """
+    density, xv, p = atmospheric_density(shots, y)
+    viscosity = atmospheric_viscosity(shots, density, p)
+    sos = ballistics.speed_of_sound({'density_data': {'T': shots['T'], 'xv': xv}})
+    return density, viscosity, sos
+
+
+def atmospheric_density(shots, y):
+    """
+    Calculate the atmospheric density at a height for each shot.  See
+    ballistics.atmospheric_density.
+
+    Enter: shots: a dictionary of per-shot arrays.
+           y: an array of heights in meters.
+    Exit:  density: an array of atmospheric densities in kg/m/m/m.
+           xv: an array of the mole fraction of water vapor.
+           p: an array of atmospheric pressures in Pa.
+    """
+    p = shots['pressure_given']*pressure_from_altitude(y)/shots['pressure_y0']
+    density, xv = ballistics.moist_air_density(shots['T'], shots['h'], p, shots['psv'])
+    return density, xv, p
+
+
+def atmospheric_viscosity(shots, density, p):
+    """
+    Calculate the atmospheric dynamic viscosity for each shot.  See
+    ballistics.atmospheric_viscosity.
+
+    Enter: shots: a dictionary of per-shot arrays.
+           density: an array of atmospheric densities in kg/m/m/m.
+           p: an array of atmospheric pressures in Pa.
+    Exit:  viscosity: an array of viscosities in kg/m/s.
+    """
+    mu = ballistics.viscosity_dry_air(shots['T'], density)
+    humid = shots['h'] != 0
+    if not humid.any():
+        return mu
+    T = shots['T'][humid]
+    mua = mu[humid]
+    muv = viscosity_water_vapor(T, density[humid])
+    Ma = 0.02896546  # kg/mol, molar mass of dry air, from CIPM-2007
+    Mv = 0.01801528  # kg/mol, molar mass of water vapor, from CIPM-2007
+    p = p[humid]
+    pv = shots['psv'][humid]*shots['h'][humid]
+    mu[humid] = ((mua*(p-pv)*Ma**0.5+muv*pv*Mv**0.5) /
+                 ((p-pv)*Ma**0.5+pv*Mv**0.5))
+    return mu
+
+
+def coefficient_of_drag(shots, Re, Mn):
+    """
+    Calculate the coefficient of drag for each shot.
+
+    Enter: shots: a dictionary of per-shot arrays.
+           Re: an array of Reynolds numbers.
+           Mn: an array of Mach numbers.
+    Exit:  cd: an array of coefficients of drag.
+    """
+    cd = numpy.zeros(len(Re))
+    # Shots that use the same drag method and parameters are computed together
+    groups = {}
+    for idx, drag_state in enumerate(shots['drag_state']):
+        if shots['vacuum'][idx]:
+            continue
+        key = (drag_state.get('settings', {}).get('drag_method'),
+               drag_state.get('T'), drag_state.get('material'))
+        groups.setdefault(key, (drag_state, []))[1].append(idx)
+    for drag_state, group in groups.values():
+        cd[group] = ballistics.coefficient_of_drag_array(Re[group], Mn[group], drag_state)[0]
+    return cd
+
+
+def end_offset(shots, x, y, vx, vy, time):
+    """
+    Determine how far each shot is from the end of its trajectory.  See
+    ballistics.trajectory_end_offset.
+
+    Enter: shots: a dictionary of per-shot arrays.
+           x, y, vx, vy, time: arrays of the current positions, velocities,
+                               and times.
+    Exit:  offset: an array of values that become negative when the end
+                   condition has been passed.
+           check: an array of booleans that are True if a negative offset
+                  ends the trajectory.
+    """
+    kind = shots['end_kind']
+    target = shots['end_target']
+    offset = numpy.where(kind == EndHeight, y - target, 0.0)
+    offset = numpy.where(kind == EndRange, target - x, offset)
+    offset = numpy.where(kind == EndTime, target - time, offset)
+    offset = numpy.where(kind == EndVelocity, (vx**2+vy**2)**0.5 - target, offset)
+    offset = numpy.where(
+        kind == EndAngle, target + numpy.arctan2(vy, vx) * 180 / math.pi, offset)
+    offset = numpy.where(kind == EndRising, target - y, offset)
+    check = ((kind != EndHeight) & (kind != EndAngle)) | (vy < 0)
+    return offset, check
+
+
+def next_point(shots, x, y, vx, vy, ax, ay, dt):
+    """
+    Compute the next position of each sphere of a batch.  See
+    ballistics.next_point.
+
+    Enter: shots: a dictionary of per-shot arrays.
+           x, y, vx, vy, ax, ay: arrays of the current positions,
+                                 velocities, and accelerations.
+           dt: an array of time deltas in seconds.
+    Exit:  x, y, vx, vy, ax, ay: arrays of the new positions, velocities,
+                                 and accelerations.
+           Re, Mn: arrays of the Reynolds and Mach numbers at the new
+                   positions.
+           error: an array of booleans that are True if the computation
+                  failed for that shot.
+    """
+    if ballistics.UseRungeKutta is True:
+        dx1 = dt*vx
+        dy1 = dt*vy
+        dvx1 = dt*ax
+        dvy1 = dt*ay
+        ax1, ay1, _, _, _ = acceleration(
+            shots, y+0.5*dy1, vx+0.5*dvx1, vy+0.5*dvy1)
+
+        dx2 = dt*(vx+0.5*dvx1)
+        dy2 = dt*(vy+0.5*dvy1)
+        dvx2 = dt*ax1
+        dvy2 = dt*ay1
+        ax2, ay2, _, _, _ = acceleration(
+            shots, y+0.5*dy2, vx+0.5*dvx2, vy+0.5*dvy2)
+
+        dx3 = dt*(vx+0.5*dvx2)
+        dy3 = dt*(vy+0.5*dvy2)
+        dvx3 = dt*ax2
+        dvy3 = dt*ay2
+        ax3, ay3, _, _, _ = acceleration(shots, y+dy3, vx+dvx3, vy+dvy3)
+
+        dx4 = dt*(vx+dvx3)
+        dy4 = dt*(vy+dvy3)
+        dvx4 = dt*ax3
+        dvy4 = dt*ay3
+
+        x = x+(dx1+dx2*2+dx3*2+dx4)/6
+        y = y+(dy1+dy2*2+dy3*2+dy4)/6
+        vx = vx+(dvx1+dvx2*2+dvx3*2+dvx4)/6
+        vy = vy+(dvy1+dvy2*2+dvy3*2+dvy4)/6
+    else:
+        x, y, vx, vy = vx*dt+x, vy*dt+y, vx+ax*dt, vy+ay*dt
+    # Like the scalar method, only the acceleration at the new point is
+    # checked for excessive altitude.
+    ax, ay, Re, Mn, error = acceleration(shots, y, vx, vy)
+    error |= ~(numpy.isfinite(x) & numpy.isfinite(y) &
+               numpy.isfinite(vx) & numpy.isfinite(vy))
+    return x, y, vx, vy, ax, ay, Re, Mn, error
+
+
+def prepare_shots(states):
+    """
+    Prepare the initial conditions for a batch of shots.
+
+    Enter: states: a list of initial state dictionaries.  See the comment at
+                   the top of the ballistics module.
+    Exit:  initial: a list of the initial state dictionaries as returned from
+                    trajectory_setup.
+           ends: a list of the end conditions of each shot, or None if the
+                 shot cannot be computed.
+           shots: a dictionary of per-shot arrays for the shots that can be
+                  computed.
+           ids: an array of the indices within states of the shots that
+                can be computed.
+    """
+    initial = []
+    ends = []
+    ids = []
+    columns = {
+        'x': [], 'y': [], 'vx': [], 'vy': [], 'ax': [], 'ay': [],
+        'time_delta': [], 'diam': [], 'mass': [], 'T': [], 'h': [],
+        'psv': [], 'pressure_given': [], 'pressure_y0': [], 'vacuum': [],
+        'Re': [], 'Mn': [], 'end_kind': [],
+        'end_target': [], 'cutoff_height': []}
+    drag_states = []
+    for idx, state in enumerate(states):
+        state, end = ballistics.trajectory_setup(state)
+        initial.append(state)
+        ends.append(end)
+        if end is None:
+            continue
+        ids.append(idx)
+        for key in ('x', 'y', 'vx', 'vy', 'ax', 'ay', 'diam', 'mass'):
+            columns[key].append(state[key])
+        columns['time_delta'].append(state.get(
+            'time_delta', ballistics.Factors['time_delta']['default']))
+        vacuum = state.get('pressure') == 0
+        # A vacuum has no drag, so the atmosphere is never used.
+        density_data = state['density_data'] if not vacuum else {
+            'T': 288.15, 'h': 0, 'psv': 0}
+        columns['T'].append(density_data['T'])
+        columns['h'].append(density_data['h'])
+        columns['psv'].append(density_data['psv'])
+        # If we are given a pressure, it is adjusted for our altitude.
+        if 'pressure' in state and not vacuum:
+            columns['pressure_given'].append(state['pressure'])
+            columns['pressure_y0'].append(ballistics.pressure_from_altitude(
+                state.get('pressure_y0', 0)))
+        else:
+            columns['pressure_given'].append(1)
+            columns['pressure_y0'].append(1)
+        drag_data = state.get('drag_data', {})
+        columns['Re'].append(drag_data.get('Re', numpy.nan))
+        columns['Mn'].append(drag_data.get('Mn', numpy.nan))
+        columns['vacuum'].append(vacuum)
+        kind, key = next((kind, key) for kind, key in enumerate((
+            'final_y', 'max_range', 'max_time', 'min_velocity',
+            'final_angle', 'rising_y')) if end[key] is not None)
+        columns['end_kind'].append(kind)
+        columns['end_target'].append(end[key])
+        columns['cutoff_height'].append(end['cutoff_height'])
+        drag_states.append({key: state[key] for key in (
+            'settings', 'T', 'material') if key in state})
+    shots = {key: numpy.array(value, dtype=float) for key, value in columns.items()}
+    shots['vacuum'] = numpy.array(columns['vacuum'], dtype=bool)
+    shots['end_kind'] = numpy.array(columns['end_kind'], dtype=int)
+    shots['drag_state'] = drag_states
+    return initial, ends, shots, numpy.array(ids, dtype=int)
+
+
+def pressure_from_altitude(y):
+    """
+    Calculate standard atmospheric pressure for an array of altitudes.  See
+    ballistics.pressure_from_altitude.
+
+    Enter: y: an array of altitudes in m.
+    Exit:  p: an array of pressures in N/m/m.
+    """
+    p0 = 101325  # Pa, standard pressure at sea level
+    L = 0.0065   # K/m, temperature lapse rate
+    T0 = 288.15  # K, reference temperature at sea level
+    g = 9.80655  # m/s/s, gravity at sea level
+    M = 0.02896546  # kg/mol, molar mass of dry air, from CIPM-2007
+    R = 8.314472  # J/(mol*K), universal gas constant, from CIPM-2007
+    y = numpy.minimum(y, T0 / L - 1)
+    return p0*(1-L*y/T0)**(g*M/(R*L))
+
+
+def select(shots, mask):
+    """
+    Reduce a dictionary of per-shot arrays to a subset of shots.
+
+    Enter: shots: a dictionary of per-shot arrays.
+           mask: a boolean array of the shots to keep.
+    Exit:  shots: a new dictionary of per-shot arrays.
+    """
+    result = {}
+    for key, value in shots.items():
+        if isinstance(value, list):
+            result[key] = [entry for entry, keep in zip(value, mask) if keep]
+        else:
+            result[key] = value[mask]
+    return result
+
+
+def shot_results(initial, end, steps):
+    """
+    Convert the recorded steps of a single shot into a final state and a list
+    of points.
+
+    Enter: initial: the initial state dictionary of the shot.
+           end: the end conditions of the shot.
+           steps: a dictionary of arrays of the recorded steps of the shot,
+                  one entry per StepKeys plus 'error'.  The last entry is the
+                  first state past the end condition.
+    Exit:  final_state: the final state of the projectile.
+           points: a list of points along the trajectory.
+    """
+    values = {key: steps[key].tolist() for key in StepKeys}
+    count = len(values['x'])
+    laststep = count - 1
+    keys = ('x', 'y', 'vx', 'vy', 'ax', 'ay', 'time')
+    step = ballistics.TrajectoryStep(*[values[key][laststep] for key in keys])
+    state = initial.copy()
+    if steps['error']:
+        state = step.to_state(state)
+        if state['y'] > 6371009 / 10:
+            state['error'] = 'Failed - altitude too great'
+        else:
+            state['error'] = 'Failed - numerical error'
+        return state, []
+    prevstep = None
+    if laststep:
+        prevstep = ballistics.TrajectoryStep(*[values[key][laststep - 1] for key in keys])
+        y, vy = values['y'], values['vy']
+        max_height = max(state['max_height'], max(y[:laststep]))
+        # Locate the apex if it isn't in the final step
+        for idx in range(laststep - 1):
+            if vy[idx] > 0 and vy[idx + 1] <= 0:
+                step0 = ballistics.TrajectoryStep(*[values[key][idx] for key in keys])
+                step1 = ballistics.TrajectoryStep(*[values[key][idx + 1] for key in keys])
+                apex = step0.hermite(step1, ballistics.trajectory_apex(step0, step1))
+                max_height = max(max_height, apex.y)
+        state['max_height'] = max_height
+    delta = state.get('time_delta', ballistics.Factors['time_delta']['default'])
+    points = []
+    lasttime = None
+    hasdrag = not math.isnan(values['Re'][0])
+    for idx in range(laststep):
+        time = values['time'][idx]
+        if (lasttime is None or
+                time-lasttime+delta*0.5 > ballistics.MinPointInterval):
+            point = {key: values[key][idx] for key in (
+                'x', 'y', 'vx', 'vy', 'ax', 'ay', 'time')}
+            if hasdrag:
+                point['Re'] = values['Re'][idx]
+                point['Mn'] = values['Mn'][idx]
+            points.append(point)
+            lasttime = time
+    final_state = ballistics.trajectory_finish(state, prevstep, step, end, points)
+    return final_state, points
+
+
+def trajectories(states):
+    """
+    Compute the trajectories of a list of spheres.  The results are the same
+    as calling ballistics.trajectory on each state with fixed steps,
+    including interpolating the atmosphere within ballistics.AtmosphereBand,
+    but the shots are computed together.  Adaptive steps are not supported.
+
+    Enter: states: a list of initial state dictionaries.  See the comment at
+                   the top of the ballistics module.
+    Exit:  results: a list with one (final_state, points) tuple per state.
+    """
+    initial, ends, shots, ids = prepare_shots(states)
+    results = [(state, []) for state in initial]
+    if not len(ids):
+        return results
+    steps = trajectory_steps(shots, ids)
+    for idx in ids:
+        results[idx] = shot_results(initial[idx], ends[idx], steps[idx])
+    return results
+
+
+def trajectory_errors(initial_state, unknown, values):
+    """
+    Determine how far off the results of trajectory calculations are from the
+    expected outcome for a list of values of the unknown.  See
+    ballistics.trajectory_error.
+
+    Enter: initial_state: a dictionary of the initial state.
+           unknown: the parameter within the state to set.
+           values: a list of values of the unknown parameter.
+    Exit:  errors: a list of the error metric for each value.  Values that
+                   could not be computed are None.
+    """
+    states = []
+    for value in values:
+        state = initial_state.copy()
+        state[unknown] = value
+        states.append(state)
+    usedelta = any(key.startswith('delta_') for key in initial_state)
+    if usedelta:
+        for value in values:
+            states.append(ballistics.trajectory_error_delta_state(
+                initial_state, unknown, value))
+    with numpy.errstate(all='ignore'):
+        results = trajectories(states)
+    errors = []
+    for idx in range(len(values)):
+        delta_state = results[len(values) + idx][0] if usedelta else None
+        errors.append(ballistics.trajectory_error_from_states(
+            initial_state, unknown, results[idx][0], delta_state))
+    return errors
+
+
+def trajectory_steps(shots, ids):
+    """
+    Advance a batch of shots until each reaches its end condition.  Shots are
+    removed from the active set as they finish.
+
+    Enter: shots: a dictionary of per-shot arrays as returned from
+                  prepare_shots.
+           ids: an array of identifiers, one per shot.
+    Exit:  steps: a dictionary keyed by identifier.  Each value is a
+                  dictionary of arrays with one entry per step for each of
+                  StepKeys, ending with the first step that is past the end
+                  condition, plus 'error', which is True if the computation
+                  failed.
+    """
+    x, y, vx, vy = shots['x'], shots['y'], shots['vx'], shots['vy']
+    ax, ay = shots['ax'], shots['ay']
+    time = numpy.zeros(len(ids))
+    Re, Mn = shots['Re'], shots['Mn']
+    history = {key: [] for key in StepKeys}
+    history['ids'] = []
+    errors = {}
+    active = ids
+    while len(active):
+        offset, check = end_offset(shots, x, y, vx, vy, time)
+        for key, value in zip(StepKeys, (x, y, vx, vy, ax, ay, time, Re, Mn)):
+            history[key].append(value)
+        history['ids'].append(active)
+        done = ((offset < 0) & check) | (y < shots['cutoff_height'])
+        if done.any():
+            keep = ~done
+            active = active[keep]
+            shots = select(shots, keep)
+            x, y, vx, vy, ax, ay = x[keep], y[keep], vx[keep], vy[keep], ax[keep], ay[keep]
+            time = time[keep]
+            if not len(active):
+                break
+        x, y, vx, vy, ax, ay, Re, Mn, error = next_point(
+            shots, x, y, vx, vy, ax, ay, shots['time_delta'])
+        time = time + shots['time_delta']
+        if error.any():
+            # Record the failed step and stop computing the shot
+            for key, value in zip(StepKeys, (x, y, vx, vy, ax, ay, time, Re, Mn)):
+                history[key].append(value[error])
+            history['ids'].append(active[error])
+            for idx in active[error]:
+                errors[int(idx)] = True
+            keep = ~error
+            active = active[keep]
+            shots = select(shots, keep)
+            x, y, vx, vy, ax, ay = x[keep], y[keep], vx[keep], vy[keep], ax[keep], ay[keep]
+            time, Re, Mn = time[keep], Re[keep], Mn[keep]
+    allids = numpy.concatenate(history['ids'])
+    order = numpy.argsort(allids, kind='stable')
+    allids = allids[order]
+    columns = {key: numpy.concatenate(history[key])[order] for key in StepKeys}
+    bounds = numpy.searchsorted(allids, ids)
+    ends = numpy.searchsorted(allids, ids, side='right')
+    steps = {}
+    for idx, start, stop in zip(ids, bounds, ends):
+        steps[int(idx)] = {key: columns[key][start:stop] for key in StepKeys}
+        steps[int(idx)]['error'] = errors.get(int(idx), False)
+    return steps
+
+
+def viscosity_water_vapor(T, density):
+    """
+    Calculate the viscosity of water vapor for arrays of temperatures and
+    densities.  See ballistics.viscosity_water_vapor.
+
+    Enter: T: an array of temperatures in K.
+           density: an array of densities in kg/(m^3).
+    Exit:  viscosity_vapor: an array of viscosities in kg/m/s (Pa*s).
+    """
+    scaledT = T/647.27
+    mu0 = 1e-6*scaledT**0.5/(0.0181583+0.0177624/scaledT +
+                             0.0105287/(scaledT**2)-0.0036744/(scaledT**3))
+    scaledRho = density/317.763
+    bij = ballistics.WaterVaporViscosityTable
+    invScaledT_1 = 1 / scaledT - 1
+    scaledRho_1 = scaledRho - 1
+    factor = 0
+    for j in range(len(bij)):
+        for i in range(len(bij[0])):
+            factor += bij[j][i] * invScaledT_1**i * scaledRho_1**j
+    mu = mu0*numpy.exp(scaledRho*factor)
+    return mu
@@ -13,12 +13,22 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import glob
+import hashlib
 import json
 import math
 import os
+import tempfile
+import time
+import zipfile
 
+from . import cod_miller
 # from .cod_collins import coefficient_of_drag_collins as coefficient_of_drag
 from .cod_miller import coefficient_of_drag_miller as coefficient_of_drag
+from .cod_miller import coefficient_of_drag_miller_array as coefficient_of_drag_array
+
+# Modules that will get loaded if needed.
+numpy = None
 
 
 Resolution = 10
@@ -29,6 +39,23 @@ MnReBaseTable = {}
 Adjustments = None
 MnReAdjustments = {}
 
+# The base table and adjustments are compiled into a dense table of the
+# coefficient of drag for ranges of Mach number and log10 Reynolds number
+# indices (the values times Resolution).  Values outside of these ranges are
+# computed as they are needed.  The compiled table is saved in a file named
+# by a key of everything it depends on, so that other processes can load it
+# rather than compute it, and processes with different drag tables don't
+# read each other's files.  Loading a table marks it as used.  Saving a table
+# removes the files of other keys that haven't been used in CompiledMaxAge
+# seconds.
+CompiledMnRange = (0, 50)
+CompiledReRange = (0, 90)
+# If None, the compiled tables are saved in a ballistics directory in the
+# user's cache directory.  If False, the compiled tables are not saved.
+CompiledDirectory = None
+CompiledMaxAge = 30 * 86400
+Compiled = {}
+
 
 def cd_from_mn_re(mn, re):
     if Adjustments is None:
@@ -42,6 +69,41 @@ def cd_from_mn_re(mn, re):
     return MnReBaseTable[mn][re] + MnReAdjustments.get(mn, {}).get(re, 0)
 
 
+def cd_from_mn_re_array(mn, re):
+    """
+    Get the adjusted table values for arrays of table indices.  Values
+    within the compiled table are taken from it.  Any others that have not
+    been computed yet are computed together.  See cd_from_mn_re.  This
+    requires numpy.
+
+    Enter: mn: an array of integer Mach number indices.
+           re: an array of integer log10 Reynolds number indices.
+    Exit:  cd: an array of coefficients of drag.
+    """
+    table = compiled_table(True)
+    inside = ((mn >= CompiledMnRange[0]) & (mn <= CompiledMnRange[1]) &
+              (re >= CompiledReRange[0]) & (re <= CompiledReRange[1]))
+    if numpy.all(inside):
+        return table[mn - CompiledMnRange[0], re - CompiledReRange[0]]
+    if numpy.any(inside):
+        cd = numpy.zeros(mn.shape)
+        cd[inside] = table[mn[inside] - CompiledMnRange[0], re[inside] - CompiledReRange[0]]
+        cd[~inside] = cd_from_mn_re_array(mn[~inside], re[~inside])
+        return cd
+    keys = list(zip(mn.ravel().tolist(), re.ravel().tolist()))
+    missing = sorted({key for key in keys if key[1] not in MnReBaseTable.get(key[0], {})})
+    if missing:
+        missing_mn = numpy.array([key[0] for key in missing], dtype=float)
+        missing_re = numpy.array([key[1] for key in missing], dtype=float)
+        Cd, _ = coefficient_of_drag_array(
+            numpy.power(10, missing_re / Resolution), missing_mn / Resolution)
+        for (mnkey, rekey), value in zip(missing, Cd.tolist()):
+            MnReBaseTable.setdefault(mnkey, {})[rekey] = value
+    return numpy.array([
+        MnReBaseTable[mnkey][rekey] + MnReAdjustments.get(mnkey, {}).get(rekey, 0)
+        for mnkey, rekey in keys]).reshape(mn.shape)
+
+
 def coefficient_of_drag_adjusted(state, only_in_range=False):
     """
     Calculate the coefficient of drag.  The drag is calculated by a bilinear
@@ -65,6 +127,15 @@ def coefficient_of_drag_adjusted(state, only_in_range=False):
     mnl = math.floor(mn)
     mnh = math.ceil(mn)
     mnf = (mn - mnl) / (mnh - mnl) if mnl != mnh else 1
+    if (CompiledMnRange[0] <= mnl and mnh <= CompiledMnRange[1] and
+            CompiledReRange[0] <= rel and reh <= CompiledReRange[1]):
+        table = compiled_table()
+        low = table[mnl - CompiledMnRange[0]]
+        high = table[mnh - CompiledMnRange[0]]
+        rel -= CompiledReRange[0]
+        reh -= CompiledReRange[0]
+        return ((low[rel] * (1 - mnf) + high[rel] * mnf) * (1 - ref) +
+                (low[reh] * (1 - mnf) + high[reh] * mnf) * ref)
     Cd = ((cd_from_mn_re(mnl, rel) * (1 - mnf) +
            cd_from_mn_re(mnh, rel) * mnf) * (1 - ref) +
           (cd_from_mn_re(mnl, reh) * (1 - mnf) +
@@ -72,6 +143,122 @@ def coefficient_of_drag_adjusted(state, only_in_range=False):
     return Cd
 
 
+def coefficient_of_drag_adjusted_array(Re, Mn, state=None):
+    """
+    Calculate the coefficient of drag for arrays of Reynolds and Mach
+    numbers.  See coefficient_of_drag_adjusted.  This requires numpy.
+
+    Enter: Re: an array of Reynolds numbers.
+           Mn: an array of Mach numbers.
+           state: a dictionary of other parameters.  Unused.
+    Exit:  Cd: an array of coefficients of drag.
+           in_range: an array of booleans that are False where the values are
+                     extrapolated.  This is always True.
+    """
+    global numpy
+    if numpy is None:
+        import numpy
+
+    Re, Mn = numpy.broadcast_arrays(
+        numpy.asarray(Re, dtype=float), numpy.asarray(Mn, dtype=float))
+    re = numpy.log10(Re) * Resolution
+    rel = numpy.floor(re).astype(int)
+    reh = numpy.ceil(re).astype(int)
+    ref = numpy.where(rel != reh, (re - rel) / numpy.where(rel != reh, reh - rel, 1), 1)
+    mn = Mn * Resolution
+    mnl = numpy.floor(mn).astype(int)
+    mnh = numpy.ceil(mn).astype(int)
+    mnf = numpy.where(mnl != mnh, (mn - mnl) / numpy.where(mnl != mnh, mnh - mnl, 1), 1)
+    Cd = ((cd_from_mn_re_array(mnl, rel) * (1 - mnf) +
+           cd_from_mn_re_array(mnh, rel) * mnf) * (1 - ref) +
+          (cd_from_mn_re_array(mnl, reh) * (1 - mnf) +
+           cd_from_mn_re_array(mnh, reh) * mnf) * ref)
+    return Cd, numpy.ones(Cd.shape, dtype=bool)
+
+
+def compiled_key():
+    """
+    Get a key for everything that the compiled table depends on.
+
+    Exit:  key: a hexadecimal string.
+    """
+    if Adjustments is None:
+        load_adjustments()
+    data = repr((cod_miller.table_checksum(), sorted(MnReAdjustments.items()),
+                 Resolution, CompiledMnRange, CompiledReRange))
+    return hashlib.md5(data.encode('utf8')).hexdigest()
+
+
+def compiled_path(key):
+    """
+    Get the path of the saved compiled table.
+
+    Enter: key: the key returned by compiled_key.
+    Exit:  path: the path of the file or None if the tables are not saved.
+    """
+    if CompiledDirectory is False:
+        return None
+    directory = CompiledDirectory
+    if directory is None:
+        directory = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.join(
+            os.path.expanduser('~'), '.cache'), 'ballistics')
+    return os.path.join(directory, 'cod_adjusted.%s.npz' % key)
+
+
+def compiled_table(array=False):
+    """
+    Get the compiled table of adjusted coefficients of drag.  If the drag
+    tables have changed, the compiled table is loaded from the saved file if
+    it matches or compiled and saved otherwise.  Loading and saving requires
+    numpy.
+
+    Enter: array: if True, return a numpy array.  This requires numpy.
+    Exit:  table: either a list of rows or a two-dimensional numpy array of
+                  the coefficient of drag.  The first index is the Mach
+                  number index minus CompiledMnRange[0] and the second index
+                  is the Reynolds number index minus CompiledReRange[0].
+    """
+    global numpy
+
+    if Compiled.get('version') != cod_miller.TableVersion:
+        if numpy is None:
+            try:
+                import numpy
+            except ImportError:
+                numpy = False
+        # The base values depend on the drag tables
+        MnReBaseTable.clear()
+        key = compiled_key()
+        path = compiled_path(key)
+        table = None
+        if numpy and path and os.path.exists(path):
+            try:
+                with numpy.load(path) as data:
+                    if str(data['key']) == key:
+                        table = data['table']
+                if table is not None:
+                    os.utime(path)
+            except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile):
+                # A damaged file is replaced
+                pass
+        if table is None:
+            rows = [[cd_from_mn_re(mn, re)
+                     for re in range(CompiledReRange[0], CompiledReRange[1] + 1)]
+                    for mn in range(CompiledMnRange[0], CompiledMnRange[1] + 1)]
+            if numpy:
+                table = numpy.array(rows)
+                if path:
+                    save_compiled_table(table, key, path)
+        else:
+            rows = table.tolist()
+        Compiled.clear()
+        Compiled.update({
+            'version': cod_miller.TableVersion, 'rows': rows, 'array': table})
+    if array:
+        return Compiled['array']
+    return Compiled['rows']
+
+
 def load_adjustments():
     global Adjustments, MnReAdjustments
 
@@ -87,3 +274,37 @@ def load_adjustments():
             for re in Adjustments['table'][mn]:
                 table[int(mn)][int(re)] = Adjustments['table'][mn][re]
         MnReAdjustments = table
+
+
+def save_compiled_table(table, key, path):
+    """
+    Save the compiled table.  The file is written to a temporary file and
+    renamed, so that other processes never read a partial file.  Nothing is
+    saved if the directory can't be written.  Compiled tables saved with
+    other keys that haven't been used in CompiledMaxAge seconds are removed.
+
+    Enter: table: the compiled table as a numpy array.
+           key: the key returned by compiled_key.
+           path: the path returned by compiled_path.
+    """
+    try:
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        fd, temppath = tempfile.mkstemp(suffix='.npz', dir=os.path.dirname(path))
+    except OSError:
+        return
+    try:
+        with os.fdopen(fd, 'wb') as fptr:
+            numpy.savez(fptr, table=table, key=numpy.array(key))
+        os.chmod(temppath, 0o644)
+        os.replace(temppath, path)
+    except OSError:
+        os.unlink(temppath)
+        return
+    for oldpath in glob.glob(os.path.join(os.path.dirname(path), 'cod_adjusted.*.npz')):
+        try:
+            if (os.path.basename(oldpath) != os.path.basename(path) and
+                    os.path.getmtime(oldpath) < time.time() - CompiledMaxAge):
+                os.unlink(oldpath)
+        except OSError:
+            pass
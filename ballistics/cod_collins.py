@@ -12,8 +12,21 @@
 # Free to use. Please give credit to A.R.Collins [www.arc.id.au]
 # last rev: 08Mar16
 
+import bisect
 import math
 
+# Modules that will get loaded if needed.
+numpy = None
+
+# The Bezier curves of the Mach number adjustments to the drag coefficient,
+# each as (x1, y1, x2, y2, x3, y3, x4, y4).  The x values increase along both
+# curves.
+KCurve = (0.1, 0.00, 0.95, 0.0, 0.55, 0.95, 1.5, 1.0)
+TCurve = (0.0, 1.1, 0.85, 1.1, 0.57, 0.05, 1.0, 0.0)
+# Lookup tables for the curves, keyed by curve.  See bezier_table.
+BezierTables = {}
+BezierTableSize = 64
+
 
 def bezier4pt(x, x1, y1, x2, y2, x3, y3, x4, y4, dx=0):
     """
@@ -21,6 +34,9 @@ def bezier4pt(x, x1, y1, x2, y2, x3, y3, x4, y4, dx=0):
     returned (where xerr is optional parm) assumes fn is well behaved (i.e.,
     single valued for all x).  Adapted from
     [http://antigrain.com/research/adaptive_bezier/]
+
+    This is slow, since it subdivides the curve until it is close to x.  See
+    bezier_lookup for a faster and more accurate method.
     """
     # Calculate mid-points of line segments
     x12 = (x1 + x2) / 2
@@ -56,6 +72,87 @@ def bezier4pt(x, x1, y1, x2, y2, x3, y3, x4, y4, dx=0):
             return y1234
 
 
+def bezier_lookup(x, curve):
+    """
+    Find y given x on a cubic Bezier curve where x increases along the curve.
+    This gives the same result as bezier4pt except that it is exact rather
+    than only within an x error of 0.0005.  The curve parameter is found from
+    the curve's lookup table and refined with Newton's method.
+
+    Enter: x: the x value.
+           curve: a tuple of (x1, y1, x2, y2, x3, y3, x4, y4).
+    Exit:  y: the y value.  Outside of the curve, this is y1 or y4.
+    """
+    if x <= curve[0]:
+        return curve[1]
+    if x >= curve[6]:
+        return curve[7]
+    xs, xc, yc = bezier_table(curve)[:3]
+    pos = min(bisect.bisect_right(xs, x), BezierTableSize)
+    s = (pos - 1 + (x - xs[pos-1]) / (xs[pos] - xs[pos-1])) / BezierTableSize
+    a, b, c, d = xc
+    for _ in range(2):
+        s -= (((a*s+b)*s+c)*s+d-x) / ((3*a*s+2*b)*s+c)
+    a, b, c, d = yc
+    return ((a*s+b)*s+c)*s+d
+
+
+def bezier_lookup_array(x, curve):
+    """
+    Find y for an array of x values on a cubic Bezier curve.  See
+    bezier_lookup.  This requires numpy.
+
+    Enter: x: an array of x values.
+           curve: a tuple of (x1, y1, x2, y2, x3, y3, x4, y4).
+    Exit:  y: an array of y values.
+    """
+    xs, xc, yc, xsarray = bezier_table(curve, True)
+    x = numpy.asarray(x, dtype=float)
+    pos = numpy.clip(numpy.searchsorted(xsarray, x, 'right'), 1, BezierTableSize)
+    x0 = xsarray[pos - 1]
+    s = (pos - 1 + (x - x0) / (xsarray[pos] - x0)) / BezierTableSize
+    a, b, c, d = xc
+    for _ in range(2):
+        s = s - (((a*s+b)*s+c)*s+d-x) / ((3*a*s+2*b)*s+c)
+    a, b, c, d = yc
+    y = ((a*s+b)*s+c)*s+d
+    return numpy.where(x <= curve[0], curve[1], numpy.where(x >= curve[6], curve[7], y))
+
+
+def bezier_table(curve, array=False):
+    """
+    Get a lookup table for a cubic Bezier curve.  The table is computed the
+    first time it is needed.
+
+    Enter: curve: a tuple of (x1, y1, x2, y2, x3, y3, x4, y4).
+           array: if True, make sure the table includes a numpy array of the
+                  x values.  This requires numpy.
+    Exit:  xs: a list of x values at evenly spaced values of the curve
+               parameter from 0 to 1.  There are BezierTableSize intervals.
+           xc: a tuple of (a, b, c, d) so that x = a*s^3+b*s^2+c*s+d, where s
+               is the curve parameter.
+           yc: a tuple of coefficients for y in the same form.
+           xsarray: if array is True, xs as a numpy array.
+    """
+    global numpy
+
+    table = BezierTables.get(curve)
+    if table is None:
+        xc, yc = [(-p1+3*p2-3*p3+p4, 3*p1-6*p2+3*p3, -3*p1+3*p2, p1)
+                  for p1, p2, p3, p4 in (curve[0::2], curve[1::2])]
+        a, b, c, d = xc
+        xs = []
+        for idx in range(BezierTableSize + 1):
+            s = float(idx) / BezierTableSize
+            xs.append(((a*s+b)*s+c)*s+d)
+        table = BezierTables[curve] = (xs, xc, yc)
+    if array and len(table) == 3:
+        if numpy is None:
+            import numpy
+        table = BezierTables[curve] = table + (numpy.array(table[0]), )
+    return table
+
+
 def SphereDragVsRe(Re):
     """
     Return the Reynolds number for flow past a sphere from "Data Correlation
@@ -95,10 +192,8 @@ def SphereDrag(v, d):  # speed, diameter
     if Mn > 1.5:
         Mn = 1.5
     Re = v * d * rho / eta  # Reynolds number
-    k = 1.0 if Mn >= 1.5 else bezier4pt(
-        Mn, 0.1, 0.00, 0.95, 0.0, 0.55, 0.95, 1.5, 1.0)
-    t = 0.0 if Mn > 1.0 else bezier4pt(
-        Mn, 0.0, 1.1, 0.85, 1.1, 0.57, 0.05, 1.0, 0.0)
+    k = 1.0 if Mn >= 1.5 else bezier_lookup(Mn, KCurve)
+    t = 0.0 if Mn > 1.0 else bezier_lookup(Mn, TCurve)
     sf = 0.78 + 0.22 * math.atan(-12 * (Mn - 0.23))
     Cd = k + t * SphereDragVsRe(sf * Re)
 
@@ -122,11 +217,51 @@ def coefficient_of_drag_collins(state, only_in_range=False):
         Mn = 0.2
     if Mn > 1.5:
         Mn = 1.5
-    k = 1.0 if Mn >= 1.5 else bezier4pt(
-        Mn, 0.1, 0.00, 0.95, 0.0, 0.55, 0.95, 1.5, 1.0)
-    t = 0.0 if Mn > 1.0 else bezier4pt(
-        Mn, 0.0, 1.1, 0.85, 1.1, 0.57, 0.05, 1.0, 0.0)
+    k = 1.0 if Mn >= 1.5 else bezier_lookup(Mn, KCurve)
+    t = 0.0 if Mn > 1.0 else bezier_lookup(Mn, TCurve)
     sf = 0.78 + 0.22 * math.atan(-12 * (Mn - 0.23))
     Cd = k + t * SphereDragVsRe(sf * Re)
     state['drag_data']['cd'] = Cd
     return Cd
+
+
+def coefficient_of_drag_collins_array(Re, Mn, state=None):
+    """
+    Calculate the coefficient of drag for arrays of Reynolds and Mach
+    numbers.  See coefficient_of_drag_collins.  This requires numpy.
+
+    Enter: Re: an array of Reynolds numbers.
+           Mn: an array of Mach numbers.
+           state: a dictionary of other parameters.  Unused.
+    Exit:  cd: an array of coefficients of drag.
+           in_range: an array of booleans that are False where the values are
+                     extrapolated.  This is always True.
+    """
+    global numpy
+    if numpy is None:
+        import numpy
+
+    Re, Mn = numpy.broadcast_arrays(
+        numpy.asarray(Re, dtype=float), numpy.asarray(Mn, dtype=float))
+    Mn = numpy.clip(Mn, 0.2, 1.5)
+    k = numpy.where(Mn >= 1.5, 1.0, bezier_lookup_array(Mn, KCurve))
+    t = numpy.where(Mn > 1.0, 0.0, bezier_lookup_array(Mn, TCurve))
+    sf = 0.78 + 0.22 * numpy.arctan(-12 * (Mn - 0.23))
+    Cd = k + t * sphere_drag_vs_re_array(sf * Re)
+    return Cd, numpy.ones(Cd.shape, dtype=bool)
+
+
+def sphere_drag_vs_re_array(Re):
+    """
+    Calculate SphereDragVsRe for an array of Reynolds numbers.
+
+    Enter: Re: an array of Reynolds numbers.
+    Exit:  Cd: an array of coefficients of drag.
+    """
+    with numpy.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        return numpy.where(
+            Re > 1.2E6, 0.19 - 8E4 / Re, numpy.where(
+                Re > 4.77E5, -0.485 + 0.1 * numpy.log10(Re),
+                24/Re + (2.6*(Re/5))/(1+numpy.power(Re/5, 1.52)) +
+                (0.411*numpy.power(Re/263000, -7.94)) /
+                (1+numpy.power(Re/263000, -8)) + numpy.power(Re, 0.8) / 461000))
@@ -14,6 +14,9 @@
 
 import math
 
+# Modules that will get loaded if needed.
+numpy = None
+
 
 def coefficient_of_drag_henderson(state, only_in_range=False):
     """
@@ -62,3 +65,52 @@ def coefficient_of_drag_henderson(state, only_in_range=False):
         Cd = (1 - f) * Cdlow + f * Cdhigh
     state['drag_data']['cd'] = Cd
     return Cd
+
+
+def coefficient_of_drag_henderson_array(Re, Mn, state=None):
+    """
+    Calculate the coefficient of drag for arrays of Reynolds and Mach
+    numbers.  See coefficient_of_drag_henderson.  This requires numpy.
+
+    Enter: Re: an array of Reynolds numbers.
+           Mn: an array of Mach numbers.
+           state: a dictionary of other parameters.  This may include T and
+                  material.
+    Exit:  cd: an array of coefficients of drag.
+           in_range: an array of booleans that are False where the values are
+                     extrapolated.  This is always True.
+    """
+    global numpy
+    if numpy is None:
+        import numpy
+
+    state = state or {}
+    Re, Mn = numpy.broadcast_arrays(
+        numpy.asarray(Re, dtype=float), numpy.asarray(Mn, dtype=float))
+
+    Tw = T = state.get('T', 288.15)
+
+    SHair = 1.020
+    SHtable = {'lead': 0.160, 'brass': 0.380}
+    SH = SHtable.get(state.get('material'), 0.444)
+    gamma = SH / SHair
+    Mn = numpy.where(Mn == 0, 1e-6, Mn)
+    S = Mn * (gamma / 2) ** 0.5
+
+    Cdlow = (
+        24 * (Re + S * (4.33 + (
+            (3.65 - 15.3 * Tw / T) / (1 + 0.353 * Tw / T)) *
+            numpy.exp(-0.247 * Re / S))) ** -1 +
+        numpy.exp(-0.5 * Mn / (Re ** 0.5)) *
+        ((4.5 + 0.38 * (0.003 * Re + 0.48 * Re ** 0.5)) /
+            (1 + 0.003 * Re + 0.48 * Re ** 0.5) +
+            0.1 * Mn ** 2 + 0.2 * Mn ** S) +
+        (1 - numpy.exp(-Mn / Re)) * 0.6 * S)
+    Cdhigh = (
+        (0.9 + 0.34 / (Mn ** 2) + 1.86 * ((Mn / Re) ** 0.5) *
+         (2 + 2 / S ** 2 + 1.058 / S * (Tw / T) ** 0.5 - 1 / S ** 4)) /
+        (1 + 1.86 * (Mn / Re) ** 0.5))
+    f = (Mn - 1) / 0.75
+    Cd = numpy.where(
+        Mn <= 1, Cdlow, numpy.where(Mn >= 1.75, Cdhigh, (1 - f) * Cdlow + f * Cdhigh))
+    return Cd, numpy.ones(Cd.shape, dtype=bool)
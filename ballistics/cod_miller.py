@@ -13,9 +13,13 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import hashlib
 import json
 import math
-from .interpolate import interpolate
+from .interpolate import Interpolator, interpolate
+
+# Modules that will get loaded if needed.
+numpy = None
 
 # This table consists of a list of tuples of the form (Mach number, [List of
 # (Reynolds Number, Coefficient of Drag)], critical Reynolds number).  The data
@@ -99,12 +103,75 @@ MnReCdDataTable = [
 MnReCdDataTableLog10Crit = [
     (machnum, math.log10(crit)) for (machnum, reynolds_data, crit) in MnReCdDataTable]
 ExtendedMnLogReCdDataTable = []
+# Prepared interpolators for the extended table.  These are created with the
+# extended table.  critical is the log10 critical Reynolds number by Mach
+# number, and reynolds is a list of the coefficient of drag by adjusted log10
+# Reynolds number for each entry in the extended table.
+Interpolators = {}
+
+# The coefficient of drag can optionally be interpolated from a grid of values
+# spaced evenly in Mach number and log10 Reynolds number relative to the
+# critical Reynolds number.  The grid values are computed from the tables as
+# they are needed and are discarded whenever the tables change.  See use_grid.
+UseGrid = False
+GridSettings = {'mach_step': 0.02, 'log_re_step': 0.01, 'min_log_re': 2, 'max_log_re': 8}
+Grid = {}
+# This is incremented whenever the tables are changed.
+TableVersion = 0
+TableChecksum = {}
 
 
 def coefficient_of_drag_miller(state, only_in_range=False):
     """
     Calculate the coefficient of drag using the graph from Miller that I
-    digitized.
+    digitized.  If the grid is enabled and the Reynolds and Mach numbers are
+    within it, the value is interpolated from the grid.
+
+    Enter: state: a dictionary of the current state.  Includes Reynolds and
+                  mach numbers.
+           only_in_range: if True, return None if the values are outside of
+                          what we can interpolate.
+    Exit:  Cd: the coefficient of drag.
+    """
+    if UseGrid:
+        result = grid_lookup(state['drag_data']['Re'], state['drag_data']['Mn'])
+        if result is not None:
+            Cd, in_range, critical_Re = result
+            state['drag_data']['critical_Re'] = critical_Re
+            state['drag_data']['cd'] = Cd
+            state['drag_data']['in_range'] = in_range
+            if not in_range and only_in_range:
+                return None
+            return Cd
+    return coefficient_of_drag_miller_exact(state, only_in_range)
+
+
+def coefficient_of_drag_miller_array(Re, Mn, state=None):
+    """
+    Calculate the coefficient of drag for arrays of Reynolds and Mach
+    numbers.  See coefficient_of_drag_miller.  This requires numpy.
+
+    Enter: Re: an array of Reynolds numbers.
+           Mn: an array of Mach numbers.
+           state: a dictionary of other parameters.  Unused.
+    Exit:  Cd: an array of coefficients of drag.
+           in_range: an array of booleans that are False where the values are
+                     extrapolated.
+    """
+    if not UseGrid:
+        return coefficient_of_drag_miller_exact_array(Re, Mn)
+    Cd, in_range, _ = grid_lookup_array(Re, Mn)
+    outside = numpy.isnan(Cd)
+    if numpy.any(outside):
+        Cd[outside], in_range[outside] = coefficient_of_drag_miller_exact_array(
+            Re[outside], Mn[outside])
+    return Cd, in_range
+
+
+def coefficient_of_drag_miller_exact(state, only_in_range=False):
+    """
+    Calculate the coefficient of drag directly from the tables.  See
+    coefficient_of_drag_miller.
 
     Enter: state: a dictionary of the current state.  Includes Reynolds and
                   mach numbers.
@@ -116,14 +183,14 @@ def coefficient_of_drag_miller(state, only_in_range=False):
     Re = state['drag_data']['Re']
     Mn = state['drag_data']['Mn']
     # Estimate the critical point based on Mach number
-    (critical_Re, in_range) = interpolate(Mn, MnReCdDataTableLog10Crit, method='linear')
+    (critical_Re, in_range) = Interpolators['critical'](Mn)
     critical_Re = 10**critical_Re
     state['drag_data']['critical_Re'] = critical_Re
     # Interpolate for the Reynolds number for each Mach number where we have
     # data.
     mach_in_range = [None, None]
     mach_data = []
-    for pos, (mach, reynolds_data, crit) in enumerate(ExtendedMnLogReCdDataTable):
+    for pos, (mach, _, crit) in enumerate(ExtendedMnLogReCdDataTable):
         use = False
         if Mn == mach:
             use = True
@@ -140,7 +207,7 @@ def coefficient_of_drag_miller(state, only_in_range=False):
         # critical point looks sane and smooth on a graph
         adjusted_log_re = math.log10(Re) - math.log10(critical_Re) + math.log10(crit)
         adjusted_re = 10**adjusted_log_re
-        (Cd, in_range) = interpolate(adjusted_log_re, reynolds_data, False)
+        (Cd, in_range) = Interpolators['reynolds'][pos](adjusted_log_re)
         mach_data.append((mach, Cd))
         in_range = (in_range and MnReCdDataTable[pos][1][0][0] <=
                     adjusted_re <= MnReCdDataTable[pos][1][-1][0])
@@ -163,13 +230,69 @@ def coefficient_of_drag_miller(state, only_in_range=False):
     return Cd
 
 
+def coefficient_of_drag_miller_exact_array(Re, Mn):
+    """
+    Calculate the coefficient of drag directly from the tables for arrays of
+    Reynolds and Mach numbers.  See coefficient_of_drag_miller_exact.  This
+    requires numpy.
+
+    Enter: Re: an array of Reynolds numbers.
+           Mn: an array of Mach numbers.
+    Exit:  Cd: an array of coefficients of drag.
+           in_range: an array of booleans that are False where the values are
+                     extrapolated.
+    """
+    global numpy
+    if numpy is None:
+        import numpy
+
+    extend_drag_table()
+    Re, Mn = numpy.broadcast_arrays(
+        numpy.asarray(Re, dtype=float), numpy.asarray(Mn, dtype=float))
+    log_critical_re = numpy.log10(10 ** Interpolators['critical'].array(Mn)[0])
+    log_re = numpy.log10(Re)
+    machs = numpy.array([entry[0] for entry in ExtendedMnLogReCdDataTable])
+    # Each value is interpolated between the table entries for the Mach
+    # numbers on either side of it.
+    low = numpy.clip(numpy.searchsorted(machs, Mn, 'right') - 1, 0, len(machs) - 2)
+    values = [numpy.zeros(Re.shape), numpy.zeros(Re.shape)]
+    values_in_range = [numpy.zeros(Re.shape, dtype=bool), numpy.zeros(Re.shape, dtype=bool)]
+    for pos in numpy.unique(numpy.concatenate((low, low + 1))).tolist():
+        mach, _, crit = ExtendedMnLogReCdDataTable[pos]
+        use = (low == pos) | (low + 1 == pos)
+        adjusted_log_re = log_re[use] - log_critical_re[use] + math.log10(crit)
+        adjusted_re = 10 ** adjusted_log_re
+        Cd, in_range = Interpolators['reynolds'][pos].array(adjusted_log_re)
+        in_range &= ((MnReCdDataTable[pos][1][0][0] <= adjusted_re) &
+                     (adjusted_re <= MnReCdDataTable[pos][1][-1][0]))
+        if mach <= 0.3:
+            in_range |= adjusted_re <= MnReCdDataTable[0][1][-1][0]
+        for side in (0, 1):
+            side_use = low[use] + side == pos
+            values[side][(low + side == pos)] = Cd[side_use]
+            values_in_range[side][(low + side == pos)] = in_range[side_use]
+    mach0 = machs[low]
+    mach1 = machs[low + 1]
+    with numpy.errstate(invalid='ignore'):
+        Cd = (values[1] - values[0]) * (Mn - mach0) / (mach1 - mach0) + values[0]
+    in_range = values_in_range[0] & values_in_range[1]
+    Cd = numpy.where(Mn == mach0, values[0], Cd)
+    in_range = numpy.where(Mn == mach0, values_in_range[0], in_range)
+    Cd = numpy.where(Mn >= mach1, values[1], Cd)
+    in_range = numpy.where(Mn >= mach1, values_in_range[1], in_range)
+    in_range &= (Mn >= machs[0]) & (Mn <= machs[-1])
+    Cd = numpy.where(Mn < machs[0], 0.0, Cd)
+    return Cd, in_range
+
+
 def extend_drag_table():
     """
     Make an extended table that covers a longer range of Reynolds numbers for
     each mach value.  For low Reynolds values, this uses lower mach number
     coefficients, and for high Reynolds values it uses higher mach number
     coefficients.  The coefficients are copied with an offset based on critical
-    Reynolds number and closest matching coefficient.
+    Reynolds number and closest matching coefficient.  The interpolators for
+    the extended table are prepared at the same time.
     """
     if len(ExtendedMnLogReCdDataTable):
         return
@@ -196,6 +319,220 @@ def extend_drag_table():
                 else:
                     last_cd = cd
         ExtendedMnLogReCdDataTable.append((mach, ext_re_data, crit))
+    Interpolators['critical'] = Interpolator(MnReCdDataTableLog10Crit, method='linear')
+    Interpolators['reynolds'] = [
+        Interpolator(reynolds_data) for mach, reynolds_data, crit in ExtendedMnLogReCdDataTable]
+
+
+def grid_deviation(samples=20000):
+    """
+    Compare values interpolated from the grid to values computed directly
+    from the tables.  Points are sampled at cell centers, which is generally
+    where the interpolation is worst, spread evenly across the grid.
+
+    Enter: samples: the approximate number of points to compare.
+    Exit:  deviation: a dictionary with max_abs, the maximum absolute
+                      difference in the coefficient of drag, max_rel, the
+                      maximum relative difference, and Mn and Re, the location
+                      of the maximum absolute difference.
+    """
+    grid_lookup(0, 0)
+    mach_count = len(Grid['critical'])
+    re_count = Grid['re_count']
+    stride = max(1, int(math.sqrt(mach_count * re_count / samples)))
+    deviation = {'max_abs': 0, 'max_rel': 0, 'Mn': None, 'Re': None}
+    for i in range(0, mach_count - 1, stride):
+        Mn = (i + 0.5) * Grid['mach_step']
+        log_critical_re = (Grid['critical'][i] + Grid['critical'][i + 1]) * 0.5
+        for j in range(0, re_count - 1, stride):
+            Re = 10 ** (log_critical_re + Grid['min_log_re'] + (j + 0.5) * Grid['log_re_step'])
+            exact = coefficient_of_drag_miller_exact({'drag_data': {'Re': Re, 'Mn': Mn}})
+            diff = abs(grid_lookup(Re, Mn)[0] - exact)
+            if diff > deviation['max_abs']:
+                deviation.update({'max_abs': diff, 'Mn': Mn, 'Re': Re})
+            if exact and diff / abs(exact) > deviation['max_rel']:
+                deviation['max_rel'] = diff / abs(exact)
+    return deviation
+
+
+def grid_lookup(Re, Mn):
+    """
+    Interpolate the coefficient of drag from the grid.  Grid values are
+    computed as needed.
+
+    With the default grid settings and tables, the coefficient of drag from
+    the grid differs from the value computed directly from the tables by less
+    than 0.2%, except for the sharp drop near the critical Reynolds number at
+    Mach numbers below 0.65, where the difference can reach 0.01 (4%).
+    grid_deviation measures this for the current tables and settings.
+
+    Enter: Re: Reynolds number.
+           Mn: Mach number.
+    Exit:  Cd: the coefficient of drag.
+           in_range: True if all of the grid values used were interpolated
+                     from the tables rather than extrapolated.
+           critical_Re: the critical Reynolds number for the Mach number.
+           None is returned instead if the values are outside of the grid.
+    """
+    if Grid.get('version') != TableVersion:
+        make_grid()
+    if Re <= 0:
+        return None
+    critical = Grid['critical']
+    mpos = Mn / Grid['mach_step']
+    if not 0 <= mpos < len(critical) - 1:
+        return None
+    i = int(mpos)
+    mf = mpos - i
+    log_critical_re = critical[i] * (1 - mf) + critical[i + 1] * mf
+    rpos = (math.log10(Re) - log_critical_re - Grid['min_log_re']) / Grid['log_re_step']
+    if not 0 <= rpos < Grid['re_count'] - 1:
+        return None
+    j = int(rpos)
+    rf = rpos - j
+    cd = Grid['cd']
+    row0 = cd.get(i)
+    if row0 is None or row0[j] is None or row0[j + 1] is None:
+        row0 = grid_nodes(i, j)
+    row1 = cd.get(i + 1)
+    if row1 is None or row1[j] is None or row1[j + 1] is None:
+        row1 = grid_nodes(i + 1, j)
+    Cd = ((row0[j] * (1 - rf) + row0[j + 1] * rf) * (1 - mf) +
+          (row1[j] * (1 - rf) + row1[j + 1] * rf) * mf)
+    in_range = Grid['in_range']
+    in_range = (in_range[i][j] and in_range[i][j + 1] and
+                in_range[i + 1][j] and in_range[i + 1][j + 1])
+    return Cd, in_range, 10 ** log_critical_re
+
+
+def grid_lookup_array(Re, Mn):
+    """
+    Interpolate the coefficient of drag from the grid for arrays of Reynolds
+    and Mach numbers.  See grid_lookup.  This requires numpy.
+
+    Enter: Re: an array of Reynolds numbers.
+           Mn: an array of Mach numbers.
+    Exit:  Cd: an array of coefficients of drag.  This is NaN where the
+               values are outside of the grid.
+           in_range: an array of booleans that are True if all of the grid
+                     values used were interpolated from the tables.
+           critical_Re: an array of critical Reynolds numbers.
+    """
+    global numpy
+    if numpy is None:
+        import numpy
+
+    if Grid.get('version') != TableVersion:
+        make_grid()
+    Re, Mn = numpy.broadcast_arrays(
+        numpy.asarray(Re, dtype=float), numpy.asarray(Mn, dtype=float))
+    critical = numpy.array(Grid['critical'])
+    mpos = Mn / Grid['mach_step']
+    inside = (mpos >= 0) & (mpos < len(critical) - 1) & (Re > 0)
+    i = numpy.where(inside, mpos, 0).astype(int)
+    mf = mpos - i
+    log_critical_re = critical[i] * (1 - mf) + critical[i + 1] * mf
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        rpos = (numpy.log10(Re) - log_critical_re - Grid['min_log_re']) / Grid['log_re_step']
+    inside &= (rpos >= 0) & (rpos < Grid['re_count'] - 1)
+    j = numpy.where(inside, rpos, 0).astype(int)
+    rf = rpos - j
+    Cd = numpy.full(Re.shape, numpy.nan)
+    in_range = numpy.zeros(Re.shape, dtype=bool)
+    i = i[inside]
+    j = j[inside]
+    if 'cd_array' not in Grid:
+        grid_arrays()
+    cd = Grid['cd_array']
+    missing = (numpy.isnan(cd[i, j]) | numpy.isnan(cd[i, j + 1]) |
+               numpy.isnan(cd[i + 1, j]) | numpy.isnan(cd[i + 1, j + 1]))
+    if numpy.any(missing):
+        for ii, jj in numpy.unique(numpy.stack((i[missing], j[missing]), axis=-1), axis=0):
+            grid_nodes(int(ii), int(jj))
+            grid_nodes(int(ii) + 1, int(jj))
+    mf = mf[inside]
+    rf = rf[inside]
+    Cd[inside] = ((cd[i, j] * (1 - rf) + cd[i, j + 1] * rf) * (1 - mf) +
+                  (cd[i + 1, j] * (1 - rf) + cd[i + 1, j + 1] * rf) * mf)
+    grid_in_range = Grid['in_range_array']
+    in_range[inside] = (grid_in_range[i, j] & grid_in_range[i, j + 1] &
+                        grid_in_range[i + 1, j] & grid_in_range[i + 1, j + 1])
+    return Cd, in_range, 10 ** log_critical_re
+
+
+def grid_arrays():
+    """
+    Add numpy arrays of the grid values computed so far to the grid.  Values
+    that have not been computed are NaN.  Once these exist, grid_nodes keeps
+    them up to date.  This requires numpy.
+    """
+    shape = (len(Grid['critical']), Grid['re_count'])
+    cd = numpy.full(shape, numpy.nan)
+    in_range = numpy.zeros(shape, dtype=bool)
+    for i, row in Grid['cd'].items():
+        for j, value in enumerate(row):
+            if value is not None:
+                cd[i, j] = value
+                in_range[i, j] = Grid['in_range'][i][j]
+    Grid['cd_array'] = cd
+    Grid['in_range_array'] = in_range
+
+
+def grid_nodes(i, j):
+    """
+    Compute the grid values at a Mach number index for a Reynolds number index
+    and the next Reynolds number index, if they have not already been
+    computed.
+
+    Enter: i: the Mach number index.
+           j: the Reynolds number index.
+    Exit:  row: the list of coefficients of drag for the Mach number index.
+    """
+    if i not in Grid['cd']:
+        Grid['cd'][i] = [None] * Grid['re_count']
+        Grid['in_range'][i] = [None] * Grid['re_count']
+    row = Grid['cd'][i]
+    for jj in (j, j + 1):
+        if row[jj] is None:
+            state = {'drag_data': {
+                'Re': 10 ** (Grid['critical'][i] + Grid['min_log_re'] +
+                             jj * Grid['log_re_step']),
+                'Mn': i * Grid['mach_step']}}
+            row[jj] = coefficient_of_drag_miller_exact(state)
+            Grid['in_range'][i][jj] = bool(state['drag_data']['in_range'])
+            if 'cd_array' in Grid:
+                Grid['cd_array'][i, jj] = row[jj]
+                Grid['in_range_array'][i, jj] = Grid['in_range'][i][jj]
+    return row
+
+
+def make_grid():
+    """
+    Reset the grid based on the current tables and grid settings.  The grid
+    spans Mach 0 to the highest Mach number in the table.  The Reynolds
+    number axis is relative to the critical Reynolds number, and spans enough
+    to include the range of Reynolds numbers in the settings at all Mach
+    numbers.
+    """
+    extend_drag_table()
+    mach_step = float(GridSettings['mach_step'])
+    log_re_step = float(GridSettings['log_re_step'])
+    mach_count = int(math.floor(MnReCdDataTable[-1][0] / mach_step)) + 1
+    critical = [Interpolators['critical'](i * mach_step)[0]
+                for i in range(mach_count)]
+    min_log_re = float(GridSettings['min_log_re']) - max(critical)
+    max_log_re = float(GridSettings['max_log_re']) - min(critical)
+    Grid.clear()
+    Grid.update({
+        'version': TableVersion,
+        'mach_step': mach_step,
+        'log_re_step': log_re_step,
+        'min_log_re': min_log_re,
+        're_count': int(math.floor((max_log_re - min_log_re) / log_re_step)) + 1,
+        'critical': critical,
+        'cd': {},
+        'in_range': {},
+    })
 
 
 def replace_table(tableOrFile):
@@ -206,13 +543,42 @@ def replace_table(tableOrFile):
     :param tableOrFile: if a string, this is a path to a json file.  Otherwise,
         this is an array in the format output by table_as_array.
     """
+    global TableVersion
+
     if isinstance(tableOrFile, str):
         newTable = json.load(open(tableOrFile))
     else:
         newTable = tableOrFile
     MnReCdDataTable[:] = [
         (e1[0], tuple(tuple(e2) for e2 in e1[1]), e1[2]) for e1 in newTable]
+    MnReCdDataTableLog10Crit[:] = [
+        (machnum, math.log10(crit)) for (machnum, reynolds_data, crit) in MnReCdDataTable]
     ExtendedMnLogReCdDataTable[:] = []
+    Interpolators.clear()
+    TableVersion += 1
+
+
+def use_grid(enable=True, mach_step=None, log_re_step=None):
+    """
+    Enable or disable interpolating the coefficient of drag from a grid.
+
+    Enter: enable: True to use the grid.
+           mach_step: if not None, the Mach number interval of the grid.
+           log_re_step: if not None, the log10 Reynolds number interval of the
+                        grid.
+    """
+    global UseGrid, TableVersion
+
+    settings = dict(GridSettings)
+    if mach_step is not None:
+        settings['mach_step'] = float(mach_step)
+    if log_re_step is not None:
+        settings['log_re_step'] = float(log_re_step)
+    # Changing the settings requires a new grid
+    if bool(enable) != UseGrid or settings != GridSettings:
+        UseGrid = bool(enable)
+        GridSettings.update(settings)
+        TableVersion += 1
 
 
 def table_as_array():
@@ -222,3 +588,18 @@ def table_as_array():
     """
     return [[mn, [list(entry) for entry in entries], crit]
             for mn, entries, crit in MnReCdDataTable]
+
+
+def table_checksum():
+    """
+    Return a checksum of the data table and grid settings.  Anything that
+    would change the coefficient of drag changes the checksum.
+
+    Exit:  checksum: a hexadecimal string.
+    """
+    if TableChecksum.get('version') != TableVersion:
+        data = {'table': table_as_array(), 'grid': GridSettings if UseGrid else None}
+        TableChecksum['checksum'] = hashlib.md5(json.dumps(
+            data, sort_keys=True).encode('utf8')).hexdigest()
+        TableChecksum['version'] = TableVersion
+    return TableChecksum['checksum']
@@ -11,6 +11,9 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+# Modules that will get loaded if needed.
+numpy = None
+
 
 def coefficient_of_drag_morrison(state, only_in_range=False):
     """
@@ -33,3 +36,27 @@ def coefficient_of_drag_morrison(state, only_in_range=False):
     if not state['drag_data']['in_range'] and only_in_range:
         return None
     return cd
+
+
+def coefficient_of_drag_morrison_array(Re, Mn, state=None):
+    """
+    Calculate the coefficient of drag for arrays of Reynolds and Mach
+    numbers.  See coefficient_of_drag_morrison.  This requires numpy.
+
+    Enter: Re: an array of Reynolds numbers.
+           Mn: an array of Mach numbers.  Unused.
+           state: a dictionary of other parameters.  Unused.
+    Exit:  cd: an array of coefficients of drag.
+           in_range: an array of booleans that are False where the values are
+                     extrapolated.
+    """
+    global numpy
+    if numpy is None:
+        import numpy
+
+    Re = numpy.asarray(Re, dtype=float)
+    cd = (24.0 / Re +
+          (2.6 * (Re / 5.0)) / (1 + (Re / 5.0) ** 1.52) +
+          (0.411 * (Re / 263000) ** -7.94) / (1 + (Re / 263000) ** -8.00) +
+          (Re ** 0.80) / 461000)
+    return cd, Re < 1.0e6
@@ -1,6 +1,159 @@
+import bisect
 import functools
 import math
 
+# Modules that will get loaded if needed.
+numpy = None
+
+
+class Interpolator(object):
+    """
+    Interpolate values from a set of points that are prepared once.  This
+    gives the same results as interpolate, but the points are only sorted
+    once, the closest points are found with a binary search, and the
+    coefficients for the cubic, parabolic, hermitic, and tension methods are
+    computed once for each interval.  Call the object with a single x value
+    or use the array method for an array of x values.
+    """
+
+    def __init__(self, data, logx=False, method='tension'):
+        """
+        Prepare a set of points for interpolation.
+
+        Enter: data: a list of (x, y) pairs that are used for the
+                     interpolation.
+               logx: if True, perform the interpolations on the log values of
+                     the x data.
+               method: the method used for the interpolation.  See
+                       interpolate.
+        """
+        self.logx = logx
+        self.method = method
+        self.natural = None
+        self.xy = ()
+        self.arrays = None
+        if method == 'natural' and len(data) >= 4:
+            self.natural = (
+                natural_cubic, natural_cubic_array,
+                natural_cubic_prep(data, logx, simple=True))
+        elif method == 'binatural' and len(data) >= 4:
+            self.natural = (
+                natural_bicubic, natural_bicubic_array,
+                natural_bicubic_prep(data, logx))
+        elif len(data):
+            self.xy = tuple(data_to_sorted_xy(tuple(data), logx))
+        self.xs = [x for x, y in self.xy]
+        # The points and coefficients used for each position found by the
+        # binary search.  The quadratic method picks points based on the x
+        # value, so these can't be prepared.
+        self.windows = []
+        if method != 'quadratic':
+            for pos in range(len(self.xy)):
+                minpos, maxpos = interpolate_range(self.xy, pos, None, method)
+                window = self.xy[minpos:maxpos]
+                coefficients = None
+                if len(window) == 4:
+                    coefficients = interpolate_coefficients(window, method)
+                self.windows.append((window, coefficients))
+
+    def __call__(self, xi):
+        """
+        Interpolate a value.
+
+        Enter: xi: x value to interpolate from.
+        Exit:  yi: the interpolated y value.  0 if there are no points.
+               in_range: True if x is interpolated, False if it is
+                         extrapolated.
+        """
+        if self.natural is not None:
+            return self.natural[0](xi, self.natural[2])
+        xs = self.xs
+        if not len(xs):
+            return 0, False
+        if self.logx:
+            xi = math.log10(xi)
+        pos = bisect.bisect_left(xs, xi)
+        if pos == len(xs):
+            pos -= 1
+        if xi == xs[pos]:
+            return self.xy[pos][1], True
+        if self.windows:
+            window, coefficients = self.windows[pos]
+        else:
+            minpos, maxpos = interpolate_range(self.xy, pos, xi, self.method)
+            window, coefficients = self.xy[minpos:maxpos], None
+        yi = interpolate_window(xi, window, self.method, coefficients)
+        return yi, window[0][0] <= xi <= window[-1][0]
+
+    def array(self, xi):
+        """
+        Interpolate an array of values.  The linear, hermitic, tension,
+        natural, and binatural methods are computed with numpy array
+        operations.  Other methods interpolate each value in turn.  This
+        requires numpy.
+
+        Enter: xi: an array of x values to interpolate from.
+        Exit:  yi: an array of the interpolated y values.
+               in_range: an array of booleans that are True if x is
+                         interpolated, False if it is extrapolated.
+        """
+        global numpy
+        if numpy is None:
+            import numpy
+
+        xi = numpy.asarray(xi, dtype=float)
+        if self.natural is not None:
+            return self.natural[1](xi, self.natural[2])
+        if not len(self.xs) or self.method not in ('linear', 'hermitic', 'tension'):
+            results = [self(val) for val in xi.ravel()]
+            yi = numpy.array([val[0] for val in results], dtype=float).reshape(xi.shape)
+            in_range = numpy.array([bool(val[1]) for val in results]).reshape(xi.shape)
+            return yi, in_range
+        if self.logx:
+            xi = numpy.log10(xi)
+        if self.arrays is None:
+            self.prepare_arrays()
+        xs, ys, first, last, coefficients = self.arrays
+        count = len(xs)
+        pos = numpy.minimum(numpy.searchsorted(xs, xi, 'left'), count - 1)
+        first = first[pos]
+        last = last[pos]
+        num_points = last - first + 1
+        x0, x1, x2 = (xs[numpy.minimum(first + idx, count - 1)] for idx in range(3))
+        y0, y1, y2 = (ys[numpy.minimum(first + idx, count - 1)] for idx in range(3))
+        A, B, C, D = (coefficients[pos, idx] for idx in range(4))
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            yi = numpy.where(num_points == 1, y0, 0.0)
+            yi = numpy.where(num_points == 2, (y1 - y0) * (xi - x0) / (x1 - x0) + y0, yi)
+            yi = numpy.where(num_points == 3, (
+                y0 * (xi - x1) * (xi - x2) / ((x0 - x1) * (x0 - x2)) +
+                y1 * (xi - x2) * (xi - x0) / ((x1 - x2) * (x1 - x0)) +
+                y2 * (xi - x0) * (xi - x1) / ((x2 - x0) * (x2 - x1))), yi)
+            yi = numpy.where(num_points == 4, A*xi**3 + B*xi**2 + C*xi + D, yi)
+        in_range = (x0 <= xi) & (xi <= xs[last])
+        exact = xs[pos] == xi
+        yi = numpy.where(exact, ys[pos], yi)
+        in_range |= exact
+        return yi, in_range
+
+    def prepare_arrays(self):
+        """
+        Prepare the arrays used to interpolate arrays of values.  This
+        requires numpy.
+        """
+        first = [bisect.bisect_left(self.xs, window[0][0])
+                 for window, coefficients in self.windows]
+        last = [start + len(window) - 1
+                for start, (window, coefficients) in zip(first, self.windows)]
+        coefficients = [coefficients or (0.0, 0.0, 0.0, 0.0)
+                        for window, coefficients in self.windows]
+        self.arrays = (
+            numpy.array(self.xs, dtype=float),
+            numpy.array([y for x, y in self.xy], dtype=float),
+            numpy.array(first),
+            numpy.array(last),
+            numpy.array(coefficients, dtype=float))
+
 
 def cubic_roots(a, b, c, d):
     """
@@ -51,6 +204,52 @@ def cubic_roots(a, b, c, d):
         return []
 
 
+def cubic_roots_array(a, b, c, d):
+    """
+    Compute the real roots of arrays of cubic equations.  See cubic_roots.
+    This requires numpy.
+
+    Enter: a, b, c, d: arrays of coefficients of the cubic equations.  These
+                       are of the form a*x^3+b*x^2+c*x+d=0.
+    Exit:  roots: an array with an additional first axis of length 3.  Each
+                  equation has the roots that cubic_roots would return in the
+                  same order, followed by NaN if there are fewer than three.
+    """
+    global numpy
+    if numpy is None:
+        import numpy
+
+    a, b, c, d = numpy.broadcast_arrays(*[
+        numpy.asarray(val, dtype=float) for val in (a, b, c, d)])
+    roots = numpy.full((3, ) + a.shape, numpy.nan)
+    with numpy.errstate(all='ignore'):
+        val = abs(c*c-4*b*d)**0.5/(2*b)
+        use = (a == 0) & (b != 0)
+        roots[0] = numpy.where(use, -c+val, roots[0])
+        roots[1] = numpy.where(use, -c-val, roots[1])
+        use = (a == 0) & (b == 0) & (c != 0)
+        roots[0] = numpy.where(use, -d/c, roots[0])
+        b = b/-a
+        c = c/-a
+        d = d/-a
+        n = b*b+3*c
+        o = -(2*b*b*b+9*b*c+27*d)
+        sc = 0.5*o*abs(n)**-1.5
+        t = 2*abs(n)**0.5/3
+        s = numpy.log(abs(sc)+(sc*sc+1)**0.5)*numpy.sign(sc)/3
+        use = (a != 0) & (n < 0)
+        roots[0] = numpy.where(use, b/3-t*0.5*(numpy.exp(s)-numpy.exp(-s)), roots[0])
+        s = numpy.log(abs(sc)+(sc*sc-1)**0.5)/3
+        use = (a != 0) & (n > 0) & ((sc < -1) | (sc > 1))
+        roots[0] = numpy.where(use, t*0.5*(numpy.exp(s)+numpy.exp(-s))+b/3, roots[0])
+        s = numpy.arcsin(sc)/3
+        use = (a != 0) & (n > 0) & (sc >= -1) & (sc <= 1)
+        roots[0] = numpy.where(use, t*numpy.sin(s-2*math.pi/3)+b/3, roots[0])
+        roots[1] = numpy.where(use, t*numpy.sin(s)+b/3, roots[1])
+        roots[2] = numpy.where(use, t*numpy.sin(s+2*math.pi/3)+b/3, roots[2])
+    return roots
+
+
 @functools.lru_cache(maxsize=100)
 def data_to_sorted_xy(data, logx):
     """
@@ -70,7 +269,7 @@ def data_to_sorted_xy(data, logx):
     return sorted({math.log10(x): y for x, y in data}.items())
 
 
-def interpolate(xi, data, logx=False, method='tension'):  # noqa -mccabe
+def interpolate(xi, data, logx=False, method='tension'):
     """Interpolate a value from a set of points.  The points are a list of
      two-tuples of the form (x, y).  If there is only one point in the
      list, the sole y value is returned.  For two points, a linear
@@ -116,6 +315,107 @@ def interpolate(xi, data, logx=False, method='tension'):  # noqa -mccabe
             break
     if xi == x:
         return y, True
+    minpos, maxpos = interpolate_range(xy, pos, xi, method)
+    xy = xy[minpos:maxpos]
+    yi = interpolate_window(xi, xy, method)
+    in_range = xy[0][0] <= xi <= xy[-1][0]
+    return (yi, in_range)
+
+
+def interpolate_array(xi, data, logx=False, method='tension'):
+    """
+    Interpolate an array of values from a set of points.  This produces the
+    same results as calling interpolate for each value.  The prepared
+    Interpolator for the points is cached, so repeated calls with the same
+    points don't sort the points or compute coefficients again.  This
+    requires numpy.
+
+    Enter: xi: an array of x values to interpolate from.
+           data: a list of (x, y) pairs that are used for the interpolation.
+           logx: if True, perform the interpolations on the log values of
+                 the x data.
+           method: the method used for the interpolation.  See interpolate.
+    Exit:  yi: an array of the interpolated y values.
+           in_range: an array of booleans that are True if x is interpolated,
+                     False if it is extrapolated.
+    """
+    return prepared_interpolator(tuple(data), logx, method).array(xi)
+
+
+def interpolate_coefficients(xy, method):
+    """
+    Compute the polynomial coefficients used to interpolate within a window
+    of four points.
+
+    Enter: xy: a list of four (x, y) pairs sorted by x.
+           method: one of 'cubic', 'parabolic', 'hermitic', or 'tension'.
+    Exit:  coefficients: for the parabolic method, a tuple of (A0, B0, C0,
+                         A1, B1, C1) where the result is the average of
+                         A*x^2+B*x+C from each set.  Otherwise, a tuple of
+                         (A, B, C, D) where the result is A*x^3+B*x^2+C*x+D.
+    """
+    (x0, y0), (x1, y1), (x2, y2), (x3, y3) = xy
+    # For the cubic case, I used a symbolic algebra program; it could be
+    # made more efficient
+    if method == 'cubic':  # a cubic interpolation
+        den = (
+            x0*(x1**2*(x3**3-x2**3)-x2**2*x3**3 +
+                x2**3*x3**2+x1**3*(x2**2-x3**2)) +
+            x1*(x2**2*x3**3-x2**3*x3**2)+x0**2*(
+                x2*x3**3+x1*(x2**3-x3**3)+x1**3*(x3-x2) -
+                x2**3*x3)+x1**2*(x2**3*x3-x2*x3**3) +
+            x0**3*(x1*(x3**2-x2**2)-x2*x3**2 + x2**2*x3+x1**2*(x2-x3)) +
+            x1**3*(x2*x3**2-x2**2*x3))
+        A = ((x0*(x1**2*(y3-y2)-x2**2*y3+x3**2*y2+(x2**2-x3**2)*y1)+x1*(x2**2*y3-x3**2*y2)+x0**2*(x2*y3+x1*(y2-y3)-x3*y2+(x3-x2)*y1)+x1**2*(x3*y2-x2*y3)+(x2*x3**2-x2**2*x3)*y1+(x1*(x3**2-x2**2)-x2*x3**2+x2**2*x3+x1**2*(x2-x3))*y0)/den)  # noqa
+        B = -((x0*(x2**3-x1**3)-x1*x2**3+x1**3*x2+x0**3*(x1-x2))*A+x1*y2+x0*(y1-y2)-x2*y1+(x2-x1)*y0)/(x0*(x2**2-x1**2)-x1*x2**2+x1**2*x2+x0**2*(x1-x2))  # noqa
+        C = -((x0**2-x1**2)*B+(x0**3-x1**3)*A+y1-y0)/(x0-x1)
+        D = -x0*C-x0**2*B-x0**3*A+y0
+        return (A, B, C, D)
+    if method == 'parabolic':  # piecewise parabolic interpolation
+        den = x0**2*(x1-x2)+x1**2*(x2-x0)+x2**2*(x0-x1)
+        A0 = (x0*(y2-y1)+x1*(y0-y2)+x2*(y1-y0))/den
+        B0 = (A0*(x0**2-x1**2)+(y1-y0))/(x1-x0)
+        C0 = y0-(A0*x0**2+B0*x0)
+        den = x1**2*(x2-x3)+x2**2*(x3-x1)+x3**2*(x1-x2)
+        A1 = (x1*(y3-y2)+x2*(y1-y3)+x3*(y2-y1))/den
+        B1 = (A1*(x1**2-x2**2)+(y2-y1))/(x2-x1)
+        C1 = y1-(A1*x1**2+B1*x1)
+        return (A0, B0, C0, A1, B1, C1)
+    # Hermite or tensioned-hermitic cubic interpolation
+    if method == 'tension':
+        m1 = 0.5 * (y2 - y0) / (x2 - x0)
+        m2 = 0.5 * (y3 - y1) / (x3 - x1)
+    else:
+        m1 = (y2 - y0) / (x2 - x0)
+        m2 = (y3 - y1) / (x3 - x1)
+    h = x2 - x1
+    d = (y2 - y1) / h
+    c0 = y1
+    c1 = m1
+    c2 = (-2*m1 + 3*d - m2) / h
+    c3 = (m1 - 2*d + m2) / h / h
+    c2 -= x1*c3
+    c1 -= x1*c2
+    c0 -= x1*c1
+    c2 -= x1*c3
+    c1 -= x1*c2
+    c2 -= x1*c3
+    return (c3, c2, c1, c0)
+
+
+def interpolate_range(xy, pos, xi, method):
+    """
+    Determine which points are used to interpolate a value.
+
+    Enter: xy: a list of (x, y) pairs sorted by x.
+           pos: the index of the first point where xi <= x, or the last point
+                if there is no such point.
+           xi: x value to interpolate from.  This is only used by the
+               quadratic method.
+           method: the method used for the interpolation.  See interpolate.
+    Exit:  minpos: the index of the first point to use.
+           maxpos: one more than the index of the last point to use.
+    """
     minpos = max(0, pos-2)
     maxpos = min(pos+2, len(xy))
     if method == 'linear':
@@ -129,72 +429,42 @@ def interpolate(xi, data, logx=False, method='tension'):  # noqa -mccabe
             minpos = max(0, pos-1)
         maxpos = min(minpos + 3, len(xy))
         minpos = max(0, maxpos - 3)
-    xy = xy[minpos:maxpos]
+    return minpos, maxpos
+
+
+def interpolate_window(xi, xy, method, coefficients=None):
+    """
+    Interpolate a value from the points selected by interpolate_range.
+
+    Enter: xi: x value to interpolate from.
+           xy: a list of one to four (x, y) pairs sorted by x.
+           method: the method used for the interpolation.  See interpolate.
+           coefficients: if there are four points, the coefficients from
+                         interpolate_coefficients.  None to compute them.
+    Exit:  yi: the interpolated y value.
+    """
     num_points = len(xy)
     if num_points == 1:
-        yi = xy[0][1]
-    elif num_points == 2:
+        return xy[0][1]
+    if num_points == 2:
         (x0, y0), (x1, y1) = xy
         # linear interpolation
-        yi = (y1 - y0) * (xi - x0) / (x1 - x0) + y0
-    elif num_points == 3:
+        return (y1 - y0) * (xi - x0) / (x1 - x0) + y0
+    if num_points == 3:
         (x0, y0), (x1, y1), (x2, y2) = xy
         # Lagrange interpolation
-        yi = (y0 * (xi - x1) * (xi - x2) / ((x0 - x1) * (x0 - x2)) +
-              y1 * (xi - x2) * (xi - x0) / ((x1 - x2) * (x1 - x0)) +
-              y2 * (xi - x0) * (xi - x1) / ((x2 - x0) * (x2 - x1)))
-    else:
-        (x0, y0), (x1, y1), (x2, y2), (x3, y3) = xy
-        # For the cubic case, I used a symbolic algebra program; it could be
-        # made more efficient
-        if method == 'cubic':  # a cubic interpolation
-            den = (
-                x0*(x1**2*(x3**3-x2**3)-x2**2*x3**3 +
-                    x2**3*x3**2+x1**3*(x2**2-x3**2)) +
-                x1*(x2**2*x3**3-x2**3*x3**2)+x0**2*(
-                    x2*x3**3+x1*(x2**3-x3**3)+x1**3*(x3-x2) -
-                    x2**3*x3)+x1**2*(x2**3*x3-x2*x3**3) +
-                x0**3*(x1*(x3**2-x2**2)-x2*x3**2 + x2**2*x3+x1**2*(x2-x3)) +
-                x1**3*(x2*x3**2-x2**2*x3))
-            A = ((x0*(x1**2*(y3-y2)-x2**2*y3+x3**2*y2+(x2**2-x3**2)*y1)+x1*(x2**2*y3-x3**2*y2)+x0**2*(x2*y3+x1*(y2-y3)-x3*y2+(x3-x2)*y1)+x1**2*(x3*y2-x2*y3)+(x2*x3**2-x2**2*x3)*y1+(x1*(x3**2-x2**2)-x2*x3**2+x2**2*x3+x1**2*(x2-x3))*y0)/den)  # noqa
-            B = -((x0*(x2**3-x1**3)-x1*x2**3+x1**3*x2+x0**3*(x1-x2))*A+x1*y2+x0*(y1-y2)-x2*y1+(x2-x1)*y0)/(x0*(x2**2-x1**2)-x1*x2**2+x1**2*x2+x0**2*(x1-x2))  # noqa
-            C = -((x0**2-x1**2)*B+(x0**3-x1**3)*A+y1-y0)/(x0-x1)
-            D = -x0*C-x0**2*B-x0**3*A+y0
-            yi = A*xi**3+B*xi**2+C*xi+D
-        elif method == 'parabolic':  # piecewise parabolic interpolation
-            den = x0**2*(x1-x2)+x1**2*(x2-x0)+x2**2*(x0-x1)
-            A = (x0*(y2-y1)+x1*(y0-y2)+x2*(y1-y0))/den
-            B = (A*(x0**2-x1**2)+(y1-y0))/(x1-x0)
-            C = y0-(A*x0**2+B*x0)
-            yi0 = A*xi**2+B*xi+C
-            den = x1**2*(x2-x3)+x2**2*(x3-x1)+x3**2*(x1-x2)
-            A = (x1*(y3-y2)+x2*(y1-y3)+x3*(y2-y1))/den
-            B = (A*(x1**2-x2**2)+(y2-y1))/(x2-x1)
-            C = y1-(A*x1**2+B*x1)
-            yi1 = A*xi**2+B*xi+C
-            yi = (yi0+yi1)*0.5
-        else:  # Hermite or tensioned-hermitic cubic interpolation
-            if method == 'tension':
-                m1 = 0.5 * (y2 - y0) / (x2 - x0)
-                m2 = 0.5 * (y3 - y1) / (x3 - x1)
-            else:
-                m1 = (y2 - y0) / (x2 - x0)
-                m2 = (y3 - y1) / (x3 - x1)
-            h = x2 - x1
-            d = (y2 - y1) / h
-            c0 = y1
-            c1 = m1
-            c2 = (-2*m1 + 3*d - m2) / h
-            c3 = (m1 - 2*d + m2) / h / h
-            c2 -= x1*c3
-            c1 -= x1*c2
-            c0 -= x1*c1
-            c2 -= x1*c3
-            c1 -= x1*c2
-            c2 -= x1*c3
-            yi = c3*xi**3 + c2*xi**2 + c1*xi + c0
-    in_range = xy[0][0] <= xi <= xy[-1][0]
-    return (yi, in_range)
+        return (y0 * (xi - x1) * (xi - x2) / ((x0 - x1) * (x0 - x2)) +
+                y1 * (xi - x2) * (xi - x0) / ((x1 - x2) * (x1 - x0)) +
+                y2 * (xi - x0) * (xi - x1) / ((x2 - x0) * (x2 - x1)))
+    if coefficients is None:
+        coefficients = interpolate_coefficients(xy, method)
+    if method == 'parabolic':
+        A0, B0, C0, A1, B1, C1 = coefficients
+        yi0 = A0*xi**2+B0*xi+C0
+        yi1 = A1*xi**2+B1*xi+C1
+        return (yi0+yi1)*0.5
+    A, B, C, D = coefficients
+    return A*xi**3+B*xi**2+C*xi+D
 
 
 def natural_bicubic(xi, data):
@@ -250,6 +520,49 @@ def natural_bicubic(xi, data):
     return (yi, in_range)
 
 
+def natural_bicubic_array(xi, data):
+    """
+    Interpolate an array of values from a set of points.  This produces the
+    same results as calling natural_bicubic for each value, except for
+    rounding.  This requires numpy.
+
+    Enter: xi: an array of x values to interpolate from.
+           data: the tuple of (x, y, Dx, Dy, logx) as returned from
+                 natural_bicubic_prep.
+    Exit:  yi: an array of the interpolated y values.
+           in_range: an array of booleans that are True if x is interpolated,
+                     False if it is extrapolated.
+    """
+    global numpy
+    if numpy is None:
+        import numpy
+
+    (x, y, Dx, Dy, logx) = data
+    xi = numpy.asarray(xi, dtype=float)
+    if len(x) < 2:
+        return natural_cubic_array(xi, (x, y, Dx, logx))
+    if logx:
+        xi = numpy.log10(xi)
+    x, y, Dx, Dy = (numpy.array(val, dtype=float) for val in (x, y, Dx, Dy))
+    in_range = (xi >= x[0]) & (xi <= x[-1])
+    pos = numpy.clip(numpy.searchsorted(x, xi, 'left'), 1, len(x) - 1) - 1
+    x0, x1, Dx0, Dx1 = x[pos], x[pos + 1], Dx[pos], Dx[pos + 1]
+    troots = cubic_roots_array(
+        2*(x0-x1)+Dx0+Dx1, 3*(x1-x0)-2*Dx0-Dx1, Dx0, x0-xi)
+    # When there are several roots, use the one closest to the middle of the
+    # interval or to the end that is being extrapolated.
+    target = numpy.where(in_range, 0.5, numpy.where(pos == 0, 0.0, 1.0))
+    distance = numpy.where(numpy.isnan(troots), numpy.inf, abs(troots - target))
+    t = numpy.take_along_axis(troots, numpy.argmin(distance, axis=0)[None], axis=0)[0]
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        t = numpy.where(numpy.isnan(t), (xi-x0)/(x1-x0), t)
+    y0, y1, Dy0, Dy1 = y[pos], y[pos + 1], Dy[pos], Dy[pos + 1]
+    a = 2*(y0-y1)+Dy0+Dy1
+    b = 3*(y1-y0)-2*Dy0-Dy1
+    yi = a*t**3+b*t**2+Dy0*t+y0
+    return yi, in_range
+
+
 def natural_bicubic_prep(data, logx=False):
     """
     Prepare the derivatives needs to each point so that we can use a
@@ -267,34 +580,15 @@ def natural_bicubic_prep(data, logx=False):
     xy = data_to_sorted_xy(tuple(data), logx)
     x = [float(item[0]) for item in xy]
     y = [float(item[1]) for item in xy]
-    w = len(x)+1
-    h = len(x)
     n = len(x)-1
-    if h < 2:
+    if n < 1:
         return (x, y, [0]*len(x), [0]*len(x), logx)
-    for axis in ('x', 'y'):
-        if axis == 'x':
-            p = x
-        else:
-            p = y
-        a = [0]*w*h
-        a[0  ] = 2  # noqa
-        a[1  ] = 1  # noqa
-        a[n+1] = 3*(p[1]-p[0])
-        for i in range(1, n, 1):
-            a[i*w+i-1] = 1
-            a[i*w+i  ] = 4  # noqa
-            a[i*w+i+1] = 1
-            a[i*w+n+1] = 3*(p[i+1]-p[i-1])
-        a[n*w+n-1] = 1
-        a[n*w+n  ] = 2  # noqa
-        a[n*w+n+1] = 3*(p[n]-p[n-1])
-        result = rowreduce(w, h, a)
-        D = [result[2][j*w+w-1] for j in range(h)]
-        if axis == 'x':
-            Dx = D
-        else:
-            Dy = D
+    lower = [0] + [1]*n
+    diagonal = [2] + [4]*(n-1) + [2]
+    upper = [1]*n + [0]
+    Dx, Dy = [tridiagonal_solve(lower, diagonal, upper, (
+        [3*(p[1]-p[0])] + [3*(p[i+1]-p[i-1]) for i in range(1, n)] +
+        [3*(p[n]-p[n-1])])) for p in (x, y)]
     return (x, y, Dx, Dy, logx)
 
 
@@ -330,6 +624,42 @@ def natural_cubic(xi, data):
     return (yi, in_range)
 
 
+def natural_cubic_array(xi, data):
+    """
+    Interpolate an array of values from a set of points.  This produces the
+    same results as calling natural_cubic for each value.  This requires
+    numpy.
+
+    Enter: xi: an array of x values to interpolate from.
+           data: the tuple of (x, y, D, logx) as returned from
+                 natural_cubic_prep.
+    Exit:  yi: an array of the interpolated y values.
+           in_range: an array of booleans that are True if x is interpolated,
+                     False if it is extrapolated.
+    """
+    global numpy
+    if numpy is None:
+        import numpy
+
+    (x, y, D, logx) = data
+    xi = numpy.asarray(xi, dtype=float)
+    if not len(x):
+        return numpy.zeros(xi.shape), numpy.zeros(xi.shape, dtype=bool)
+    if len(x) == 1:
+        return numpy.full(xi.shape, float(y[0])), xi == x[0]
+    if logx:
+        xi = numpy.log10(xi)
+    x, y, D = (numpy.array(val, dtype=float) for val in (x, y, D))
+    in_range = (xi >= x[0]) & (xi <= x[-1])
+    pos = numpy.clip(numpy.searchsorted(x, xi, 'left'), 1, len(x) - 1)
+    x0, x1, y0, y1 = x[pos-1], x[pos], y[pos-1], y[pos]
+    t = (xi-x0)/(x1-x0)
+    a = D[pos-1]*(x1-x0)-(y1-y0)
+    b = -D[pos]*(x1-x0)+(y1-y0)
+    yi = (1-t)*y0+t*y1+t*(1-t)*(a*(1-t)+b*t)
+    return yi, in_range
+
+
 def natural_cubic_prep(data, logx=False, simple=False):
     """
     Prepare the derivatives needs to each point so that we can use a natural
@@ -348,10 +678,8 @@ def natural_cubic_prep(data, logx=False, simple=False):
     xy = data_to_sorted_xy(tuple(data), logx)
     x = [float(item[0]) for item in xy]
     y = [float(item[1]) for item in xy]
-    w = len(x)+1
-    h = len(x)
     n = len(x)-1
-    if h < 2:
+    if n < 1:
         return (x, y, [0]*len(x), logx)
     if simple:
         D = [0]*(n+1)
@@ -361,24 +689,41 @@ def natural_cubic_prep(data, logx=False, simple=False):
             # D[i] = (y[i+1]-y[i-1])/(x[i+1]-x[i-1])
         D[n] = (y[n]-y[n-1])/(x[n]-x[n-1])
         return (x, y, D, logx)
-    a = [0]*w*h
+    lower = [0.0]*(n+1)
+    diagonal = [0.0]*(n+1)
+    upper = [0.0]*(n+1)
+    rhs = [0.0]*(n+1)
     for i in range(1, n, 1):
-        a[i*w+i-1] = 1/(x[i]-x[i-1])
-        a[i*w+i  ] = 2*(1/(x[i]-x[i-1])+1/(x[i+1]-x[i]))  # noqa
-        a[i*w+i+1] = 1/(x[i+1]-x[i])
-        a[i*w+n+1] = (3*((y[i]-y[i-1])/(x[i]-x[i-1])**2+(y[i+1]-y[i]) /
-                      (x[i+1]-x[i])**2))
-    a[    0  ] = 2*(x[1]-x[0])    # noqa
-    a[    1  ] =   (x[1]-x[0])    # noqa
-    a[    n+1] = 3*(y[1]-y[0])    # noqa
-    a[n*w+n-1] =   (x[n]-x[n-1])  # noqa
-    a[n*w+n  ] = 2*(x[n]-x[n-1])  # noqa
-    a[n*w+n+1] = 3*(y[n]-y[n-1])
-    result = rowreduce(w, h, a)
-    D = [result[2][j*w+w-1] for j in range(h)]
+        lower[i] = 1/(x[i]-x[i-1])
+        diagonal[i] = 2*(1/(x[i]-x[i-1])+1/(x[i+1]-x[i]))
+        upper[i] = 1/(x[i+1]-x[i])
+        rhs[i] = (3*((y[i]-y[i-1])/(x[i]-x[i-1])**2+(y[i+1]-y[i]) /
+                     (x[i+1]-x[i])**2))
+    diagonal[0] = 2*(x[1]-x[0])
+    upper[0] = x[1]-x[0]
+    rhs[0] = 3*(y[1]-y[0])
+    lower[n] = x[n]-x[n-1]
+    diagonal[n] = 2*(x[n]-x[n-1])
+    rhs[n] = 3*(y[n]-y[n-1])
+    D = tridiagonal_solve(lower, diagonal, upper, rhs)
     return (x, y, D, logx)
 
 
+@functools.lru_cache(maxsize=100)
+def prepared_interpolator(data, logx, method):
+    """
+    Get an Interpolator for a set of points.  Interpolators are cached, so
+    this is only slow the first time it is called with a set of points.
+
+    Enter: data: a tuple of (x, y) pairs.
+           logx: if True, perform the interpolations on the log values of
+                 the x data.
+           method: the method used for the interpolation.  See interpolate.
+    Exit:  interpolator: an Interpolator for the points.
+    """
+    return Interpolator(data, logx, method)
+
+
 def rowreduce(w, h, matrix):  # noqa - mccabe
     """Row reduce a matrix.  The matrix must be at least as wide as it is
      high.  The main diagonal is changed to 1, and all other elements in
@@ -422,3 +767,32 @@ def rowreduce(w, h, matrix):  # noqa - mccabe
                     a[i*w+k] -= a[j*w+k]*temp
                 a[i*w+j] = 0.0
     return (w, h, a)
+
+
+def tridiagonal_solve(lower, diagonal, upper, rhs):
+    """
+    Solve a tridiagonal system of equations using the Thomas algorithm.  This
+    takes O(n) time rather than the O(n^3) of rowreduce.  It doesn't pivot,
+    so the system must be diagonally dominant, as spline systems are.
+
+    Enter: lower: a list of the n values below the main diagonal.  The first
+                  value is not used.
+           diagonal: a list of the n values on the main diagonal.
+           upper: a list of the n values above the main diagonal.  The last
+                  value is not used.
+           rhs: a list of the n values on the right side of the equations.
+    Exit:  solution: a list of the n solution values.
+    """
+    n = len(diagonal)
+    c = [0.0]*n
+    d = [0.0]*n
+    c[0] = float(upper[0])/diagonal[0] if n > 1 else 0.0
+    d[0] = float(rhs[0])/diagonal[0]
+    for i in range(1, n):
+        den = diagonal[i]-lower[i]*c[i-1]
+        if i+1 < n:
+            c[i] = upper[i]/den
+        d[i] = (rhs[i]-lower[i]*d[i-1])/den
+    for i in range(n-2, -1, -1):
+        d[i] -= c[i]*d[i+1]
+    return d
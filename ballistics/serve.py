@@ -0,0 +1,301 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright David Manthey
+#
+# Licensed under the Apache License, Version 2.0 ( the "License" ); you may
+# not use this file except in compliance with the License.  You may obtain a
+# copy of the License at
+#   http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.   See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""
+Solve for unknown factors in a long-running process.
+
+This is started with 'python -m ballistics serve'.  Requests are read as JSON
+objects, one per line, from stdin or from each connection to a UNIX socket.
+Each request can contain:
+  id: any value.  This is returned with the response, since responses are
+      sent as they are computed and may not be in the order of the requests.
+  factors: a dictionary of factor and setting values keyed by their internal
+      or long names.  Values can include units, just as on the command line.
+      A value of '?' marks the unknown factor.
+  unknown: the internal or long name of the factor to solve for.  This can
+      be used instead of a '?' value.
+  args: a list of additional command line arguments, such as '--scan=10'.
+  guess: a starting value for the unknown factor.
+  points: if true, include the trajectory in the response.
+Each response is a JSON object on a single line with the id and either the
+final state (and the points, if requested) or an error.  The points are a
+dictionary of lists of values, one list per key.
+
+The requests are solved by a pool of worker processes.  Each worker applies
+the command line arguments given to serve (such as --method=adaptive or
+--millergrid) and computes a trajectory before accepting requests, so that the
+drag tables, grids, and caches are ready.
+"""
+
+import json
+import multiprocessing
+import os
+import signal
+import socketserver
+import sys
+import threading
+
+import ballistics
+
+# Module values that parse_arguments can change.  These are restored after
+# each request so that one request doesn't affect the next.
+GlobalSettings = (
+    'AdaptiveAbsoluteTolerance', 'AdaptiveRelativeTolerance', 'AtmosphereBand',
+    'PrecisionInDigits', 'Solver', 'UseAdaptive', 'UseRungeKutta', 'Verbose')
+# Arguments that change shared tables or read files.  These can only be used
+# when starting the server.
+ServerOnlyArgs = ('--config=', '--dragcache', '--millergrid', '--millerjson=')
+# The arguments from the config file and environment, without the server-only
+# arguments.  These are read once by worker_init and applied to each request.
+# If None, each request reads the configuration.
+ConfigArgs = None
+# A case that is computed to warm up each worker.
+WarmUpRequest = {
+    'factors': {
+        'initial_angle': 45, 'charge': '1 oz', 'mass': '11 kg',
+        'material': 'brass', 'range': '229 m'},
+    'unknown': 'power_factor'}
+
+
+class StreamHandler(socketserver.StreamRequestHandler):
+    """
+    Handle a connection to the UNIX socket.  The server has a pool attribute.
+    """
+    def handle(self):
+        lock = threading.Lock()
+
+        def write(line):
+            # This is called from the pool's result thread, so it must not
+            # raise if the client has disconnected; the response is dropped.
+            with lock:
+                try:
+                    self.wfile.write(line.encode('utf8'))
+                    self.wfile.flush()
+                except OSError:
+                    pass
+
+        serve_stream((line.decode('utf8') for line in self.rfile),
+                     write, self.server.pool)
+
+
+class ThreadingUnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def request_arguments(request):
+    """
+    Convert a request to a list of command line arguments.
+
+    Enter: request: a request dictionary.  See the module comment.
+    Exit:  args: a list of arguments for parse_arguments.
+    """
+    names = set()
+    for table in (ballistics.Factors, ballistics.Settings):
+        for key in table:
+            names |= {key, table[key].get('long', key)}
+    args = []
+    factors = dict(request.get('factors') or {})
+    if request.get('unknown'):
+        factors[request['unknown']] = '?'
+    for key in sorted(factors):
+        if key not in names:
+            raise ValueError('Unknown factor %s' % key)
+        if factors[key] is not None:
+            args.append('--%s=%s' % (key, factors[key]))
+    for arg in request.get('args') or []:
+        if arg.startswith(ServerOnlyArgs):
+            raise ValueError('%s can only be used when starting the server' % arg)
+        args.append(arg)
+    return args
+
+
+def serve_socket(path, pool):
+    """
+    Serve requests from a UNIX socket until interrupted.  Each connection is
+    handled as a separate stream of requests.
+
+    Enter: path: the path of the socket.  An existing file at this path is
+                 removed.
+           pool: a multiprocessing pool or None to solve in this process.
+    """
+    if os.path.exists(path):
+        os.unlink(path)
+    server = ThreadingUnixServer(path, StreamHandler)
+    server.pool = pool
+    # Stop cleanly when terminated
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        server.serve_forever()
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        server.server_close()
+        os.unlink(path)
+
+
+def serve_stream(lines, write, pool=None):
+    """
+    Serve requests from a stream of lines until the stream ends.  Requests are
+    solved in parallel when there is a pool, and each response is written as
+    soon as it is ready.
+
+    Enter: lines: an iterable of request lines.
+           write: a function that is called with each response line.  When
+                  there is a pool, this is called from another thread.
+           pool: a multiprocessing pool or None to solve in this process.
+    """
+    pending = []
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError('A request must be a JSON object')
+        except ValueError as exc:
+            write(json.dumps({'error': 'Invalid request: %s' % exc}) + '\n')
+            continue
+        if pool is None:
+            write(solve_request(request))
+        else:
+            pending = [result for result in pending if not result.ready()]
+            pending.append(pool.apply_async(solve_request, (request, ), callback=write))
+    for result in pending:
+        result.wait()
+
+
+def solve_request(request):
+    """
+    Solve a single request.
+
+    Enter: request: a request dictionary.  See the module comment.
+    Exit:  response: the JSON response, including a trailing newline.
+    """
+    response = {'id': request.get('id')}
+    saved = {key: getattr(ballistics, key) for key in GlobalSettings}
+    try:
+        if ConfigArgs is None:
+            params, state, help = ballistics.parse_arguments(request_arguments(request))
+        else:
+            params, state, help = ballistics.parse_arguments(
+                ConfigArgs + request_arguments(request), readConfig=False)
+        if help or 'unknown' not in params:
+            raise ValueError('A request must have factors and an unknown')
+        invalid = sorted(ballistics.Factors[key].get('long', key) for key in state
+                         if state[key] is None and key in ballistics.Factors)
+        if invalid:
+            raise ValueError('Invalid value for %s' % ', '.join(invalid))
+        starttime = ballistics.get_cpu_time()
+        newstate, points = ballistics.find_unknown(
+            state, params['unknown'], params.get('unknown_scan'),
+            guess=request.get('guess'))
+        newstate['computation_time'] = ballistics.get_cpu_time() - starttime
+        response['state'] = newstate
+        if request.get('points') and points:
+            response['points'] = {key: [point.get(key) for point in points]
+                                  for key in points[0]}
+    except (KeyError, OverflowError, TypeError, ValueError, ZeroDivisionError) as exc:
+        response['error'] = str(exc) or repr(exc)
+    finally:
+        for key in saved:
+            setattr(ballistics, key, saved[key])
+    return json.dumps(response, default=str) + '\n'
+
+
+def worker_init(args, pooled=True):
+    """
+    Prepare a process to solve requests.  Supress the ctrl-c signal in worker
+    processes, send anything the ballistics code prints to stderr so that it
+    can't be mixed with the responses, apply the server's command line
+    arguments and configuration, and solve a sample case so that the drag
+    tables and caches are populated.  The configuration is only read here, so
+    requests don't reapply the server-only arguments.
+
+    Enter: args: the command line arguments given to the server.
+           pooled: True if this is a pool process.
+    """
+    global ConfigArgs
+
+    if pooled:
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+    sys.stdout = sys.stderr
+    ballistics.parse_arguments(list(args), allowUnknownParams=True)
+    ConfigArgs = [arg for arg in ballistics.read_config_env() + ballistics.read_config()
+                  if not arg.startswith(ServerOnlyArgs)]
+    response = json.loads(solve_request(WarmUpRequest))
+    if 'error' in response:
+        sys.stderr.write('Failed to warm up the solver: %s\n' % response['error'])
+
+
+def main(argv):
+    """
+    Run the server.
+
+    Enter: argv: command line arguments after 'serve'.
+    """
+    args = []
+    help = False
+    processes = os.cpu_count() or 1
+    socketPath = None
+    for arg in argv:
+        if arg.startswith('--processes='):
+            processes = int(arg.split('=', 1)[1])
+        elif arg.startswith('--socket='):
+            socketPath = arg.split('=', 1)[1]
+        elif arg in ('--help', '-h'):
+            help = True
+        else:
+            args.append(arg)
+    if help:
+        print("""Solve ballistics requests in a long-running process.
+
+Syntax:  python -m ballistics serve --processes=(count) --socket=(path)
+    (ballistics arguments)
+
+--processes is the number of worker processes.  The default is the number of
+ processors.  0 solves requests in the server process one at a time.
+--socket listens on a UNIX socket at the specified path.  Otherwise, requests
+ are read from stdin and responses are written to stdout until stdin closes.
+Other arguments, such as --method=adaptive or --millergrid, are applied to all
+requests.
+
+Each request is a JSON object on a single line, such as
+  {"id": 1, "factors": {"power": "?", "mass": "6 lb",
+   "initialvelocity": "500 ft/s", "charge": "1 lb", "diameter": "3.5 in"}, "points": false}
+Each response is a JSON object with the id and either a state or an error.""")
+        return
+    # Responses are written to the original stdout; anything else that is
+    # printed goes to stderr.
+    output = sys.stdout
+    pool = None
+    if processes > 0:
+        pool = multiprocessing.Pool(
+            processes=processes, initializer=worker_init, initargs=(args, ))
+    else:
+        worker_init(args, False)
+    try:
+        if socketPath:
+            serve_socket(socketPath, pool)
+        else:
+            def write(line):
+                output.write(line)
+                output.flush()
+
+            serve_stream(sys.stdin, write, pool)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
@@ -0,0 +1,244 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright David Manthey
+#
+# Licensed under the Apache License, Version 2.0 ( the "License" ); you may
+# not use this file except in compliance with the License.  You may obtain a
+# copy of the License at
+#   http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.   See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""
+Find the roots of functions of one value.
+
+Each function evaluation may be a full trajectory calculation, so these try
+to use as few evaluations as possible.  If the function returns None, the
+function cannot be evaluated at that point, and the solvers return None.
+"""
+
+import math
+
+
+def brent(func, lo, hi, flo=None, fhi=None, xtol=0, rtol=1e-12, max_iterations=100):  # noqa - mccabe
+    """
+    Find a root of a function within a bracket using Brent's method.  This
+    combines inverse quadratic interpolation, the secant method, and
+    bisection, and always keeps the root bracketed.
+
+    Enter: func: a function of one value.
+           lo, hi: the bracket containing the root.
+           flo, fhi: the values of the function at lo and hi.  If None, these
+                     are computed.  These must have opposite signs or be zero.
+           xtol: the absolute tolerance of the root.
+           rtol: the relative tolerance of the root.
+           max_iterations: the maximum number of function evaluations.
+    Exit:  root: the location of the root or None if the function could not
+                 be evaluated.
+    """
+    a, b, fa, fb = lo, hi, flo, fhi
+    if fa is None:
+        fa = func(a)
+    if fb is None and fa is not None:
+        fb = func(b)
+    if fa is None or fb is None:
+        return None
+    if not fa:
+        return a
+    if not fb:
+        return b
+    c, fc = a, fa
+    d = e = b - a
+    for _ in range(max_iterations):
+        if fb * fc > 0:
+            c, fc = a, fa
+            d = e = b - a
+        if abs(fc) < abs(fb):
+            a, b, c = b, c, b
+            fa, fb, fc = fb, fc, fb
+        tol = 0.5 * (xtol + rtol * abs(b))
+        m = 0.5 * (c - b)
+        if abs(m) <= tol or not fb:
+            return b
+        if abs(e) >= tol and abs(fa) > abs(fb):
+            s = fb / fa
+            if a == c:
+                # secant
+                p = 2 * m * s
+                q = 1 - s
+            else:
+                # inverse quadratic interpolation
+                q = fa / fc
+                r = fb / fc
+                p = s * (2 * m * q * (q - r) - (b - a) * (r - 1))
+                q = (q - 1) * (r - 1) * (s - 1)
+            if p > 0:
+                q = -q
+            else:
+                p = -p
+            if 2 * p < min(3 * m * q - abs(tol * q), abs(e * q)):
+                e = d
+                d = p / q
+            else:
+                d = e = m
+        else:
+            d = e = m
+        a, fa = b, fb
+        if abs(d) > tol:
+            b += d
+        else:
+            b += tol if m > 0 else -tol
+        fb = func(b)
+        if fb is None:
+            return None
+    return b
+
+
+def expand_bracket(func, guess, fguess=None, step=1e-3, lo=None, hi=None,
+                   max_iterations=12):
+    """
+    Find a bracket around a root starting from a guess.  A secant step from
+    the guess picks the direction to search, and the step grows each time the
+    function doesn't change sign.
+
+    Enter: func: a function of one value.
+           guess: the starting point.
+           fguess: the value of the function at the guess.  If None, this is
+                   computed.
+           step: the initial step as a fraction of the guess.
+           lo, hi: if not None, the limits of the search.
+           max_iterations: the maximum number of function evaluations.
+    Exit:  bracket: a tuple of (lo, hi, flo, fhi) where flo and fhi have
+                    opposite signs or one is zero, or None if no bracket was
+                    found.
+    """
+    x0, f0 = guess, fguess
+    if f0 is None:
+        f0 = func(x0)
+    if f0 is None:
+        return None
+    if not f0:
+        return x0, x0, f0, f0
+    delta = abs(guess) * step or step
+    x1 = x0 + delta
+    if hi is not None and x1 > hi:
+        x1 = x0 - delta
+    for _ in range(max_iterations):
+        f1 = func(x1)
+        if f1 is None:
+            return None
+        if f0 * f1 <= 0:
+            return (x0, x1, f0, f1) if x0 < x1 else (x1, x0, f1, f0)
+        # Step past the secant estimate of the root, growing the step
+        if f1 != f0:
+            estimate = x1 - f1 * (x1 - x0) / (f1 - f0)
+        else:
+            estimate = x1 + (x1 - x0)
+        nextx = x1 + (estimate - x1) * 1.2
+        if abs(nextx - x1) < abs(x1 - x0):
+            nextx = x1 + math.copysign(abs(x1 - x0), estimate - x1)
+        elif abs(nextx - x1) > 4 * abs(x1 - x0):
+            nextx = x1 + math.copysign(4 * abs(x1 - x0), estimate - x1)
+        if lo is not None and nextx < lo:
+            nextx = lo
+        if hi is not None and nextx > hi:
+            nextx = hi
+        if nextx == x1:
+            return None
+        x0, f0, x1 = x1, f1, nextx
+    return None
+
+
+def illinois(func, lo, hi, flo=None, fhi=None, xtol=0, rtol=1e-12, max_iterations=60):
+    """
+    Find a root of a function within a bracket using the Illinois variant of
+    the method of false position.
+
+    Enter: func: a function of one value.
+           lo, hi: the bracket containing the root.
+           flo, fhi: the values of the function at lo and hi.  If None, these
+                     are computed.  These must have opposite signs or be zero.
+           xtol: the absolute tolerance of the root.
+           rtol: the relative tolerance of the root.
+           max_iterations: the maximum number of function evaluations.
+    Exit:  root: the location of the root or None if the function could not
+                 be evaluated.
+    """
+    if flo is None:
+        flo = func(lo)
+    if fhi is None and flo is not None:
+        fhi = func(hi)
+    if flo is None or fhi is None:
+        return None
+    if not flo:
+        return lo
+    if not fhi:
+        return hi
+    side = 0
+    root = hi
+    for _ in range(max_iterations):
+        root = (lo*fhi-hi*flo)/(fhi-flo)
+        froot = func(root)
+        if froot is None:
+            return None
+        if not froot:
+            break
+        if froot*fhi > 0:
+            hi, fhi = root, froot
+            if side == -1:
+                flo *= 0.5
+            side = -1
+        else:
+            lo, flo = root, froot
+            if side == 1:
+                fhi *= 0.5
+            side = 1
+        if abs(hi-lo) <= xtol + rtol * abs(root):
+            break
+    return root
+
+
+def secant(func, x0, x1, f0=None, f1=None, xtol=0, rtol=1e-12, lo=None, hi=None,
+           max_iterations=30):
+    """
+    Find a root of a function using the secant method starting from two
+    points, which need not bracket the root.  Once two points bracket the
+    root, Brent's method is used to finish.
+
+    Enter: func: a function of one value.
+           x0, x1: the starting points.
+           f0, f1: the values of the function at x0 and x1.  If None, these
+                   are computed.
+           xtol: the absolute tolerance of the root.
+           rtol: the relative tolerance of the root.
+           lo, hi: if not None, the limits of the search.  If the secant
+                   method goes outside of these, it fails.
+           max_iterations: the maximum number of function evaluations.
+    Exit:  root: the location of the root or None if the method failed.
+    """
+    if f0 is None:
+        f0 = func(x0)
+    if f1 is None and f0 is not None:
+        f1 = func(x1)
+    for _ in range(max_iterations):
+        if f0 is None or f1 is None:
+            return None
+        if not f1:
+            return x1
+        if f0 * f1 < 0:
+            return brent(func, min(x0, x1), max(x0, x1), f0 if x0 < x1 else f1,
+                         f1 if x0 < x1 else f0, xtol, rtol)
+        if f1 == f0:
+            return None
+        x2 = x1 - f1 * (x1 - x0) / (f1 - f0)
+        if (lo is not None and x2 < lo) or (hi is not None and x2 > hi):
+            return None
+        if abs(x2 - x1) <= xtol + rtol * abs(x2):
+            return x2
+        x0, f0 = x1, f1
+        x1, f1 = x2, func(x2)
+    return None
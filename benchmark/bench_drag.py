@@ -0,0 +1,13 @@
+import pytest
+
+import ballistics
+from scenarios import Flights
+
+
+@pytest.mark.parametrize('method', ballistics.DragMethods)
+def benchAcceleration(benchmark, method):
+    params, state, help = ballistics.parse_arguments(
+        Flights['short'] + ['--dragmethod=' + method])
+    state, end = ballistics.trajectory_setup(state)
+    ax, ay = benchmark(ballistics.acceleration, state)
+    assert ax < 0 and ay < 0
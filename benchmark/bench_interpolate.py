@@ -0,0 +1,19 @@
+import pytest
+
+from ballistics import interpolate
+from ballistics.cod_miller import MnReCdDataTable
+
+Methods = ['binatural', 'cubic', 'hermitic', 'linear', 'natural', 'parabolic',
+           'quadratic', 'tension']
+# The Reynolds number data for Mach 0.3
+Data = [entry for entry in MnReCdDataTable if entry[0] == 0.3][0][1]
+Values = [10 ** (3 + 0.05 * idx) for idx in range(80)]
+
+
+@pytest.mark.parametrize('method', Methods)
+def benchInterpolate(benchmark, method):
+    def run():
+        return [interpolate(xi, Data, True, method) for xi in Values]
+
+    results = benchmark(run)
+    assert len(results) == len(Values)
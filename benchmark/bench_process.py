@@ -0,0 +1,32 @@
+import json
+import os
+import subprocess
+import sys
+
+from scenarios import ProcessFiles, RootPath
+
+
+def benchProcess(benchmark, tmpdir):
+    paths = [os.path.join(RootPath, 'data', name) for name in ProcessFiles]
+    outpaths = []
+
+    def setup():
+        # Each round writes to an empty directory so that no round uses the
+        # results of a previous round as guesses.
+        outpaths.append(str(tmpdir.mkdir('round%d' % len(outpaths))))
+        return (outpaths[-1], ), {}
+
+    def run(outpath):
+        subprocess.check_call(
+            [sys.executable, 'process.py', '--all', '--nocache', '--out=' + outpath] + paths,
+            cwd=RootPath, stdout=subprocess.DEVNULL)
+
+    benchmark.pedantic(run, setup=setup, rounds=2)
+    cases = 0
+    for name in ProcessFiles:
+        with open(os.path.join(outpaths[-1], os.path.splitext(name)[0] + '.json')) as fptr:
+            cases += len(json.load(fptr)['results'])
+    benchmark.extra_info['cases'] = cases
+    # There are no stats when benchmarks are disabled
+    if benchmark.stats:
+        benchmark.extra_info['cases_per_second'] = cases / benchmark.stats.stats.mean
@@ -0,0 +1,15 @@
+import pytest
+
+import ballistics
+from scenarios import Techniques
+
+
+@pytest.mark.parametrize('technique', sorted(Techniques))
+def benchFindUnknown(benchmark, technique):
+    params, state, help = ballistics.parse_arguments(list(Techniques[technique]))
+    newstate, points = benchmark.pedantic(
+        ballistics.find_unknown, (state, params['unknown']), rounds=3)
+    assert newstate.get('power_factor')
+    # The number of trajectories computed to solve the case
+    benchmark.extra_info['evaluations'] = newstate.get('solve_evaluations', 0)
+    benchmark.extra_info['power_factor'] = newstate['power_factor']
@@ -0,0 +1,16 @@
+import subprocess
+import sys
+
+import pytest
+
+from scenarios import RootPath
+from util import startup_time
+
+
+@pytest.mark.parametrize('command', ['fast', 'full'])
+def benchStartup(benchmark, command):
+    # The fast start should take less time than the full start, which imports
+    # every drag method and checks the program signature.
+    benchmark.pedantic(
+        subprocess.check_call, ([sys.executable] + startup_time.Commands[command], ),
+        {'cwd': RootPath, 'stdout': subprocess.DEVNULL}, rounds=5)
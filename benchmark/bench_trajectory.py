@@ -0,0 +1,13 @@
+import pytest
+
+import ballistics
+from scenarios import Flights
+
+
+@pytest.mark.parametrize('flight', sorted(Flights))
+def benchTrajectory(benchmark, flight):
+    params, state, help = ballistics.parse_arguments(list(Flights[flight]))
+    newstate, points = benchmark(ballistics.trajectory, state)
+    assert 'error' not in newstate
+    benchmark.extra_info['points'] = len(points)
+    benchmark.extra_info['range'] = newstate['x']
@@ -0,0 +1,8 @@
+import ballistics
+from util.fixtures import compiledDirectory  # noqa: F401
+
+
+def pytest_benchmark_update_machine_info(config, machine_info):
+    # Record the program version with each saved run so that history can be
+    # compared between versions.
+    machine_info['ballistics_version'] = ballistics.__version__
@@ -0,0 +1,64 @@
+"""
+Fixed scenarios for the benchmarks.  These are taken from cases in the data
+directory and should not be changed, or the benchmark history won't be
+comparable.
+"""
+
+import os
+
+RootPath = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+
+# A case for each technique that process.py assigns, keyed by technique.  The
+# pendulum case uses the pendulum length rather than the period so that it is
+# detected as a pendulum.
+Techniques = {
+    'given': ['--power=?', '--power_factor=744.9 Cal/kg'],
+    'given_velocity': [
+        '--power=?', '--angle=0 deg', '--charge=2 lb', '--diameter=4.42 in',
+        '--initial_velocity=1268 ft/s', '--mass=12.30 lb', '--material=iron'],
+    'pendulum': [
+        '--power=?', '--angle=0 deg', '--charge=12 dwt', '--diameter=0.75 in',
+        '--mass=0.08333 lb', '--pendulum_impact_length=66 in',
+        '--pendulum_index_chord=18.7 in', '--pendulum_index_length=71.125 in',
+        '--pendulum_length=0.3975 m', '--pendulum_mass=56 lb 3 oz',
+        '--pendulum_mass_length=52 in', '--range=21.5 ft'],
+    'pressure': [
+        '--power=?', '--chamber_diameter=0.25 in',
+        '--chamber_volume=0.08974 in*in*in', '--charge=13 gr', '--mass=2422 lb',
+        '--pressure=28.3 inHg', '--temperature=32 F'],
+    'chronograph': [
+        '--power=?', '--angle=0 deg', '--charge=120 gr', '--diameter=0.64 in',
+        '--final_velocity=1642 ft/s', '--mass=397.5 gr', '--material=lead',
+        '--pressure=29.967 inHg', '--range=6 ft', '--temperature=78 F',
+        '--wetbulb=71 F'],
+    'trajectory': [
+        '--power=?', '--angle=0.02797 tangent', '--charge=1.333 kg',
+        '--mass=16 lbfr', '--material=iron', '--range=200 m',
+        '--rising_height=3.94 m'],
+    'range': [
+        '--power=?', '--angle=1 deg', '--charge=10 oz', '--mass=12 lb',
+        '--material=iron', '--range=199 yds'],
+    'time': [
+        '--power=?', '--angle=1 deg', '--charge=4 oz', '--diameter=5.5 in',
+        '--final_time=1 s', '--mass=16 lb'],
+    'height': [
+        '--power=?', '--angle=1 deg 5 arcmin', '--charge=5.333 lbfr',
+        '--mass=16 lbfr', '--material=iron', '--max_height=6 ftfr 9 infr'],
+    'final_angle': [
+        '--power=?', '--angle=35 deg', '--charge=24 oz', '--diameter=7.69 in',
+        '--final_angle=53 deg', '--mass=64.25 lb'],
+}
+
+# Trajectories with a known power factor.
+Flights = {
+    'short': [
+        '--angle=0 deg', '--charge=4 lb 2 oz', '--initial_height=5 ft',
+        '--mass=16.333 lbit', '--material=iron', '--range=198 yds',
+        '--power_factor=188935'],
+    'long': [
+        '--angle=35 deg', '--charge=24 oz', '--diameter=7.69 in',
+        '--mass=64.25 lb', '--power_factor=3323638'],
+}
+
+# Data files for the end-to-end benchmark of process.py.
+ProcessFiles = ['dupin1820.yml', 'hutton1778.yml', 'lyman1975.yml', 'rumford1797.yml']
@@ -1,6 +1,81 @@
 import * as utils from './utils.js';
 import axios from 'axios';
 
+/**
+ * Parse a one-dimensional little-endian float32 or float64 .npy file.
+ *
+ * @param {ArrayBuffer} buffer The contents of the file.
+ * @returns {Float32Array|Float64Array} The values.
+ */
+function parseNpy(buffer) {
+  let headerlen = new DataView(buffer).getUint16(8, true);
+  let header = String.fromCharCode.apply(null, new Uint8Array(buffer, 10, headerlen));
+  if (header.indexOf("'<f4'") >= 0) {
+    return new Float32Array(buffer, 10 + headerlen);
+  }
+  if (header.indexOf("'<f8'") >= 0) {
+    return new Float64Array(buffer, 10 + headerlen);
+  }
+  throw new Error('Unsupported npy file');
+}
+
+/**
+ * Get trajectories from the binary point store written by combine.py with
+ * the --pointstore option.
+ *
+ * @param {string[]} keys The series to get.
+ * @returns {Promise} A promise that resolves to an object of trajectories
+ *    keyed by source key and index.
+ */
+function getPointStore(keys) {
+  return axios.get('trajectories/index.json').then(resp => {
+    let index = resp.data;
+    return Promise.all(keys.map(key => axios.get('trajectories/' + key + '.npy', {responseType: 'arraybuffer'}))).then(series => {
+      let values = series.map(resp => parseNpy(resp.data));
+      let trajectories = {};
+      index.cases.forEach(entry => {
+        if (keys.some(key => (entry.missing || []).indexOf(key) >= 0)) {
+          return;
+        }
+        let traj = {};
+        keys.forEach((key, idx) => {
+          traj[key] = values[idx].subarray(entry.offset, entry.offset + entry.count);
+        });
+        trajectories[entry.key + '-' + entry.idx] = traj;
+      });
+      return trajectories;
+    });
+  });
+}
+
+/**
+ * Get trajectories from trajectories.json.
+ *
+ * @param {string[]} keys The series to get.
+ * @returns {Promise} A promise that resolves to an object of trajectories
+ *    keyed by source key and index.
+ */
+function getTrajectoriesJSON(keys) {
+  return axios.get('trajectories.json').then(resp => {
+    let trajectories = {};
+    resp.data.forEach(entry => {
+      let pointkey = entry.key + '-' + entry.idx, traj = {}, skip = false;
+      keys.forEach(key => {
+        if (entry['trajectory_' + key] === undefined) {
+          skip = true;
+          return;
+        }
+        let value = entry['trajectory_' + key];
+        traj[key] = typeof value === 'string' ? JSON.parse(value) : value;
+      });
+      if (!skip) {
+        trajectories[pointkey] = traj;
+      }
+    });
+    return trajectories;
+  });
+}
+
 onmessage = function (evt) {  /* This could take an event */
   switch (evt.data.action) {
     case 'getplotdata':
@@ -19,28 +94,10 @@ onmessage = function (evt) {  /* This could take an event */
       });
       break;
     case 'gettrajectories':
-      axios.get('trajectories.json').then(resp => {
-        try {
-          let keys = ['Re', 'Mn', 'time'];
-          let trajectories = {};
-          resp.data.forEach(entry => {
-            let pointkey = entry.key + '-' + entry.idx, traj = {}, skip = false;
-            keys.forEach(key => {
-              if (entry['trajectory_' + key] === undefined) {
-                skip = true;
-                return;
-              }
-              traj[key] = JSON.parse(entry['trajectory_' + key]);
-            });
-            if (!skip) {
-              trajectories[pointkey] = traj;
-            }
-          });
-          let result = {trajectories: trajectories};
-          postMessage(result);
-        } catch (err) {
-          console.error('Worker error', err);
-        }
+      getPointStore(['Re', 'Mn', 'time']).catch(() => {
+        return getTrajectoriesJSON(['Re', 'Mn', 'time']);
+      }).then(trajectories => {
+        postMessage({trajectories: trajectories});
         return null;
       }).catch(err => {
         console.log(err);
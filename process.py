@@ -21,20 +21,43 @@ See help for details.
 
 import copy
 import functools
+import hashlib
 import json
 import multiprocessing
 import os
 import pprint
 import psutil
 import signal
+import sqlite3
 import sys
 import time
-import yaml
 
 import ballistics
+from util.yamlcache import load_yaml
 
 
 Pool = None
+PoolSize = 1
+
+# When calculating cases in a process pool, each pool task is a chunk of up to
+# this many cases
+ChunkSize = 16
+# and up to this many seconds of expected computation time.
+ChunkCost = 0.25
+
+# Keys in the case information that aren't used in the calculations.
+IgnoredKeys = ('date', 'ref', 'ref2', 'ref3', 'desc', 'desc2', 'desc3',
+               'technique', 'group')
+# Only use an answer from another case as a starting guess if the cases are
+# this close.  See case_distance.
+GuessDistance = 1
+# Calculated cases are stored in this file in the output directory
+ResultCacheFile = '.resultcache.sqlite'
+# Global ballistics settings that change the calculated cases.  These can be
+# set by the ballistics config file or environment.
+ResultSettings = (
+    'AdaptiveAbsoluteTolerance', 'AdaptiveRelativeTolerance', 'AtmosphereBand',
+    'PrecisionInDigits', 'Solver', 'UseAdaptive', 'UseRungeKutta')
 
 
 class FloatList:
@@ -72,15 +95,158 @@ class FloatEncoder(json.JSONEncoder):
             raise
 
 
-class SafeLineLoader(yaml.loader.SafeLoader):
+class ResultCache(object):
+    """
+    A persistent store of calculated cases, keyed by the case's hash value,
+    the source of the ballistics code, and the drag tables and global
+    settings in use.  Cases are only recalculated if something that affects
+    them has changed.
+    """
+    def __init__(self, path):
+        """
+        Open or create a result cache.  Entries from other versions of the
+        ballistics code are discarded.
+
+        Enter: path: the path of the sqlite database file.
+        """
+        self.version = '%s %s' % (ballistics.__version__, ballistics.source_checksum())
+        # Apply the config file and environment the same way the cases will,
+        # since they can change the drag tables and global settings.
+        ballistics.parse_arguments([], allowUnknownParams=True)
+        settings = [(key, getattr(ballistics, key)) for key in ResultSettings]
+        self.checksum = hashlib.md5(json.dumps(
+            [ballistics.drag_table_checksum(), settings]).encode('utf8')).hexdigest()
+        self.db = sqlite3.connect(path, timeout=60)
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS results (hash TEXT, version TEXT, '
+            'checksum TEXT, state TEXT, points TEXT, '
+            'PRIMARY KEY (hash, version, checksum))')
+        self.db.execute('DELETE FROM results WHERE version != ?', (self.version, ))
+        self.db.commit()
+
+    def close(self):
+        """
+        Close the cache.
+        """
+        self.db.close()
+
+    def get(self, hashval):
+        """
+        Get a case from the cache.
+
+        Enter: hashval: the hash value of the case.
+        Exit:  state: final state of the case or None if not in the cache.
+               points: trajectory points of the case.
+        """
+        row = self.db.execute(
+            'SELECT state, points FROM results WHERE hash = ? AND version = ? '
+            'AND checksum = ?', (hashval, self.version, self.checksum)).fetchone()
+        if row is None:
+            return None, None
+        return json.loads(row[0]), json.loads(row[1])
+
+    def put(self, hashval, state, points):
+        """
+        Add a case to the cache.
+
+        Enter: hashval: the hash value of the case.
+               state: final state of the case.
+               points: trajectory points of the case.
+        """
+        self.db.execute(
+            'INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)', (
+                hashval, self.version, self.checksum,
+                json.dumps(state, sort_keys=True, cls=FloatEncoder),
+                json.dumps(points, cls=FloatEncoder)))
+        self.db.commit()
+
+
+class ResultsWriter(object):
     """
-    Record the line number of any dictionary parsed from yaml.  See
-    https://stackoverflow.com/questions/13319067
+    Write a results file incrementally.  Each case's record is written as soon
+    as it and all of the records before it are complete, and is then dropped
+    from memory.  Each record is written on a single line, with the trajectory
+    points as numeric arrays.  The file is written to a temporary path and
+    only replaces the results file when it is complete.
     """
-    def construct_mapping(self, node, deep=False):
-        mapping = super(SafeLineLoader, self).construct_mapping(node, deep=deep)
-        mapping['__line__'] = node.start_mark.line + 1
-        return mapping
+    def __init__(self, path, results):
+        """
+        Start writing a results file.
+
+        Enter: path: the path of the json file to write.
+               results: the results to write.  The results key is the list of
+                        case records.  A record is complete when it no longer
+                        has a hash key.  All other keys are written
+                        immediately.
+        """
+        self.path = path
+        self.temppath = path + '.tmp'
+        self.records = results['results']
+        self.next = 0
+        keys = sorted(results)
+        self.after = [(key, results[key]) for key in keys if key > 'results']
+        self.fptr = open(self.temppath, 'wt')
+        self.fptr.write('{\n')
+        for key in keys:
+            if key < 'results':
+                self.fptr.write(' %s: %s,\n' % (json.dumps(key), json.dumps(
+                    results[key], sort_keys=True, separators=(',', ':'))))
+        self.fptr.write(' "results": [')
+        self.update()
+
+    def abort(self):
+        """
+        Stop writing the results file without replacing any existing file.
+        """
+        if self.fptr is not None:
+            self.fptr.close()
+            self.fptr = None
+            os.unlink(self.temppath)
+
+    def close(self):
+        """
+        Finish writing the results file and replace any existing file.
+        """
+        self.update()
+        self.fptr.write('\n ]')
+        for key, value in self.after:
+            self.fptr.write(',\n %s: %s' % (json.dumps(key), json.dumps(
+                value, sort_keys=True, separators=(',', ':'))))
+        self.fptr.write('\n}\n')
+        self.fptr.close()
+        self.fptr = None
+        os.replace(self.temppath, self.path)
+
+    def record_text(self, record):
+        """
+        Format a case record as JSON.  Trajectory points that are already
+        formatted as JSON arrays are written without reformatting.
+
+        Enter: record: the case record.
+        Exit:  text: the JSON text.
+        """
+        parts = []
+        for key in sorted(record):
+            value = record[key]
+            if key == 'points' and value is not None:
+                value = '{%s}' % ','.join(
+                    '%s:%s' % (json.dumps(subkey), subvalue if isinstance(
+                        subvalue, str) else json.dumps(subvalue))
+                    for subkey, subvalue in sorted(value.items()))
+            else:
+                value = json.dumps(value, sort_keys=True, separators=(',', ':'))
+            parts.append('%s:%s' % (json.dumps(key), value))
+        return '{%s}' % ','.join(parts)
+
+    def update(self):
+        """
+        Write any records that are now complete.
+        """
+        while self.next < len(self.records) and 'hash' not in self.records[self.next]:
+            self.fptr.write('%s\n  %s' % (',' if self.next else '', self.record_text(
+                self.records[self.next])))
+            self.records[self.next] = {}
+            self.next += 1
 
 
 def add_path_to_files(path, files):
@@ -104,7 +270,8 @@ def add_path_to_files(path, files):
         files.append(path)
 
 
-def calculate_case(hashval, args, info, verbose):
+def calculate_case(hashval, args, info, verbose, guess=None, parsed=None,
+                   compact=False):
     """
     Process an individual case.
 
@@ -112,23 +279,36 @@ def calculate_case(hashval, args, info, verbose):
            args: arguments formulated for the ballistics routines.
            info: info that was used to construct the arguments.
            verbose: verbosity for the ballistics program
+           guess: if not None, a starting guess for the unknown.
+           parsed: if not None, the (params, state) from parse_case.  The
+                   args are not parsed again.
+           compact: if True and parsed is not None, return the final state as
+                    a compact record.  See compact_result.
     Exit:  hashval: the input hash value.
-           state: final state from the ballistics routines.
-           points: time series of trajectory.
+           state: final state from the ballistics routines or a compact
+                  record of it.
+           points: time series of trajectory.  Each series is formatted as a
+                   JSON string.
     """
     if verbose >= 3:
         pprint.pprint(info)
     if verbose >= 3:
         print(hashval)
     ballistics.Verbose = max(0, verbose - 2)
-    params, state, help = ballistics.parse_arguments(
-        args, allowUnknownParams=True)
+    if parsed is None:
+        params, state, help = ballistics.parse_arguments(
+            args, allowUnknownParams=True)
+    else:
+        params, state = parsed
     ballistics.Verbose = max(0, verbose - 2)
     if verbose >= 4:
         pprint.pprint(state)
+    ballistics.reset_counters()
     starttime = ballistics.get_cpu_time()
-    newstate, points = ballistics.find_unknown(state, params['unknown'], params.get('unknown_scan'))
+    newstate, points = ballistics.find_unknown(
+        state, params['unknown'], params.get('unknown_scan'), guess=guess)
     newstate['computation_time'] = ballistics.get_cpu_time()-starttime
+    newstate['counters'] = dict(ballistics.Counters)
     for key, technique in [
         ('power_factor', 'given'),
         ('initial_velocity', 'given_velocity'),
@@ -149,8 +329,8 @@ def calculate_case(hashval, args, info, verbose):
         subset = 1 if len(points) < 50 else (
             2 if len(points) < 100 else (5 if len(points) < 250 else 10))
         points = points[:-1:subset] + points[-1:]
-        points = {key: FloatList([
-            point.get(key) for point in points], '%.6g')
+        points = {key: repr(FloatList([
+            point.get(key) for point in points], '%.6g'))
             for key in points[0]}
     else:
         points = None
@@ -159,10 +339,25 @@ def calculate_case(hashval, args, info, verbose):
             print('%s --> FAILED' % (hashval, ))
         else:
             print('%s --> %3.1f' % (hashval, newstate.get('power_factor')))
+    if compact and parsed is not None:
+        newstate = compact_result(parsed[1], newstate)
     return hashval, newstate, points
 
 
-def calculate_cases(results, cases, verbose, pool=None):
+def calculate_case_chunk(chunk):
+    """
+    Process a list of cases.  This is used as a single process pool task to
+    reduce the overhead of each task.
+
+    Enter: chunk: a list of tuples of the arguments to calculate_case.
+    Exit:  results: a list of (hashval, state, points) tuples as returned by
+                    calculate_case.
+    """
+    return [calculate_case(*args) for args in chunk]
+
+
+def calculate_cases(results, cases, verbose, pool=None, solved=None, cache=None,
+                    writer=None):
     """
     Given a set of cases, generate results for each, possibly using
     multiprocessing.
@@ -171,6 +366,14 @@ def calculate_cases(results, cases, verbose, pool=None):
            cases: cases to process:
            verbose: verbosity for the ballistics program.
            pool: if not None, use this multiprocessing pool.
+           solved: if not None, a list of (info, state) tuples of cases that
+                   have already been solved, such as from a previous results
+                   file.  The closest of these is used as the starting guess
+                   for each case.  When not using a pool, cases are added to
+                   this list as they are solved.
+           cache: if not None, a ResultCache to store the results in.
+           writer: if not None, a ResultsWriter to write the results with as
+                   they are calculated.
     Exit:  success: False for cancelled
     """
     hashes = [item[-1] for item in sorted([(cases[hashval]['position'], hashval)
@@ -178,37 +381,31 @@ def calculate_cases(results, cases, verbose, pool=None):
     if pool is None:
         left = len(hashes)
         for hashval in hashes:
+            info = cases[hashval]['info']
             hashval, state, points = calculate_case(
-                hashval, cases[hashval]['args'], cases[hashval]['info'], verbose)
-            calculate_cases_results(hashval, state, points, results)
+                hashval, cases[hashval]['args'], info, verbose,
+                case_guess(info, solved))
+            if solved is not None:
+                solved.append((info, state))
+            calculate_cases_results(hashval, state, points, results, cache, writer)
             left -= 1
             if verbose >= 1:
                 sys.stdout.write(' %d/%d left  %s' % (
                     left, len(hashes), '\n' if verbose >= 2 else '\r'))
                 sys.stdout.flush()
     else:
-        tasks = []
-        for hashval in hashes:
-            tasks.append(pool.apply_async(calculate_case, (
-                hashval, cases[hashval]['args'], cases[hashval]['info'], verbose)))
-        while len(tasks):
-            lentasks = len(tasks)
-            for pos in range(len(tasks) - 1, -1, -1):
-                task = tasks[pos]
-                if task.ready():
-                    hashval, state, points = task.get()
-                    calculate_cases_results(hashval, state, points, results)
-                    del tasks[pos]
-            if verbose >= 1 and len(tasks) < lentasks:
-                sys.stdout.write(' %d/%d left  %s' % (
-                    len(tasks), len(hashes), '\n' if verbose >= 2 else '\r'))
-                sys.stdout.flush()
-            if len(tasks):
-                tasks[0].wait(0.1)
+        tasks = [pool_task(cases[hashval], verbose, case_guess(cases[hashval]['info'], solved))
+                 for hashval in hashes]
+        costs = [case_cost(cases[hashval]['info'], solved or []) for hashval in hashes]
+
+        def store(hashval, state, points):
+            calculate_cases_results(hashval, state, points, results, cache, writer)
+
+        calculate_in_pool(pool, tasks, costs, store, verbose)
     return True
 
 
-def calculate_cases_results(hashval, state, points, results):
+def calculate_cases_results(hashval, state, points, results, cache=None, writer=None):
     """
     Store results from a processed case.
 
@@ -216,12 +413,248 @@ def calculate_cases_results(hashval, state, points, results):
            state: final state of the case.
            points: trajectory points of the case.
            results: array to store results.
+           cache: if not None, a ResultCache to also store the case in.
+           writer: if not None, a ResultsWriter to write completed results
+                   with.
     """
+    if cache is not None:
+        cache.put(hashval, state, points)
     for res in results['results']:
         if res.get('hash') == hashval:
             res['results'] = state
             res['points'] = points
             del res['hash']
+    if writer is not None:
+        writer.update()
+
+
+def calculate_files(files, outputPath, pool, all=False, verbose=0,
+                    extraArgs=None, guess=True, cache=True, timeLimit=None,
+                    starttime=None):
+    """
+    Process a set of yml files with a single queue of cases.  The cases from
+    all files are calculated in parallel, starting with the cases that are
+    expected to take the longest based on the previous results.  Each file's
+    results are written as soon as the last of its cases is calculated.
+
+    Enter: files: a list of paths of yml files to load.
+           outputPath: directory where the results will be stored.
+           pool: the multiprocessing pool to use.
+           all: True to process regardless of results time.
+           verbose: verbosity for the ballistics program.
+           extraArgs: extra arguments to use in all calculations.
+           guess: if True, start each case from the answer of the closest case
+                  in the previous results.
+           cache: if True, use the result cache in the output directory so
+                  that only cases that have changed are calculated.
+           timeLimit: if not None, stop when this many seconds have elapsed
+                      since starttime.
+           starttime: the start time of processing.
+    Exit:  success: False if the time limit was reached.
+    """
+    cache = ResultCache(os.path.join(outputPath, ResultCacheFile)) if cache else None
+    tasks = {}
+    try:
+        tasks = read_files(files, outputPath, all, verbose, extraArgs, guess, cache, pool)
+
+        def store(hashval, state, points):
+            for idx, job in enumerate(tasks[hashval]['jobs']):
+                calculate_cases_results(hashval, state, points, job['results'],
+                                        cache if not idx else None, job['writer'])
+                job['left'] -= 1
+                if not job['left']:
+                    job['writer'].close()
+
+        return calculate_in_pool(
+            pool, [pool_task(task['case'], verbose, task['guess']) for task in tasks.values()],
+            [task['cost'] for task in tasks.values()], store, verbose, timeLimit, starttime)
+    finally:
+        for task in tasks.values():
+            for job in task['jobs']:
+                job['writer'].abort()
+        if cache is not None:
+            cache.close()
+
+
+def compact_result(state, newstate):
+    """
+    Reduce the final state of a case to what differs from its initial state,
+    so that less is sent back from the pool processes.  The counters are
+    reduced to their values.  See expand_result.
+
+    Enter: state: the initial state of the case.
+           newstate: the final state of the case.
+    Exit:  record: a tuple of (changed, removed, counters), where changed is a
+                   dictionary of the values that are new or different,
+                   removed is a list of keys that are no longer present, and
+                   counters is a tuple of the counter values in the order of
+                   ballistics.Counters.
+    """
+    changed = {key: value for key, value in newstate.items()
+               if key != 'counters' and (key not in state or state[key] != value)}
+    removed = [key for key in state if key not in newstate]
+    counters = newstate.get('counters')
+    if counters is not None:
+        counters = tuple(counters[key] for key in ballistics.Counters)
+    return changed, removed, counters
+
+
+def expand_result(state, record):
+    """
+    Reconstruct the final state of a case from a compact record.  See
+    compact_result.
+
+    Enter: state: the initial state of the case.
+           record: the compact record.
+    Exit:  newstate: the final state of the case.
+    """
+    changed, removed, counters = record
+    newstate = {key: value for key, value in state.items() if key not in removed}
+    newstate.update(changed)
+    if counters is not None:
+        newstate['counters'] = dict(zip(ballistics.Counters, counters))
+    return newstate
+
+
+def calculate_in_pool(pool, tasks, costs, callback, verbose=0, timeLimit=None,
+                      starttime=None):
+    """
+    Calculate cases in a process pool.  The cases that are expected to take
+    the longest are started first, and the cases are sent to the pool in
+    chunks.  Each chunk is handled as soon as any process finishes it.
+
+    Enter: pool: the multiprocessing pool to use.
+           tasks: a list of the arguments to calculate_case as returned by
+                  pool_task.
+           costs: a list of the expected computation time of each task in
+                  seconds.  Unknown costs are None and are treated as the
+                  median of the known costs.
+           callback: a function that is called with (hashval, state, points)
+                     for each calculated case.
+           verbose: verbosity for the ballistics program.
+           timeLimit: if not None, stop when this many seconds have elapsed
+                      since starttime.
+           starttime: the start time of processing.
+    Exit:  success: False if the time limit was reached.
+    """
+    known = sorted(cost for cost in costs if cost is not None)
+    defaultCost = known[len(known) // 2] if len(known) else 0
+    costs = [cost if cost is not None else defaultCost for cost in costs]
+    order = sorted(range(len(tasks)), key=lambda idx: -costs[idx])
+    chunks = make_chunks([tasks[idx] for idx in order], [costs[idx] for idx in order])
+    # The initial states of cases that return compact records
+    initial = {task[0]: task[5][1] for task in tasks if task[5] is not None}
+    results = pool.imap_unordered(calculate_case_chunk, chunks)
+    left = len(tasks)
+    while left:
+        if timeLimit and time.time() - starttime > timeLimit:
+            return False
+        try:
+            chunkResults = results.next(1)
+        except multiprocessing.TimeoutError:
+            continue
+        for hashval, state, points in chunkResults:
+            left -= 1
+            if hashval in initial:
+                state = expand_result(initial[hashval], state)
+            callback(hashval, state, points)
+        if verbose >= 1:
+            sys.stdout.write(' %d/%d left  %s' % (
+                left, len(tasks), '\n' if verbose >= 2 else '\r'))
+            sys.stdout.flush()
+    return True
+
+
+def case_cost(info, previous):
+    """
+    Estimate how long a case will take to calculate from the closest case in
+    previous results.
+
+    Enter: info: the information of the case.
+           previous: a list of (info, state) tuples of previously calculated
+                     cases.
+    Exit:  cost: the computation time of the closest previous case in
+                 seconds or None if there are no previous cases.
+    """
+    best = None
+    for other, state in previous:
+        if not state or state.get('computation_time') is None:
+            continue
+        distance = case_distance(info, other)
+        if best is None or distance < best[0]:
+            best = (distance, state['computation_time'])
+            if not distance:
+                break
+    return best[1] if best else None
+
+
+def case_distance(info, other):
+    """
+    Compute how different two cases are.  Each parameter that is only in one
+    case or that differs and isn't numeric adds 1.  Each numeric parameter
+    adds the relative difference of the values.
+
+    Enter: info: the information of one case.
+           other: the information of another case.
+    Exit:  distance: a non-negative number.  0 if the cases are the same.
+    """
+    distance = 0
+    for key in set(info) | set(other):
+        if key in IgnoredKeys or key.endswith('_note') or key.startswith('__'):
+            continue
+        if key not in info or key not in other:
+            distance += 1
+            continue
+        if info[key] == other[key]:
+            continue
+        try:
+            value = ballistics.convert_units(info[key])
+            othervalue = ballistics.convert_units(other[key])
+        except (TypeError, ValueError):
+            value = othervalue = None
+        if value is None or othervalue is None:
+            distance += 1
+        elif value != othervalue:
+            distance += abs(value - othervalue) / max(abs(value), abs(othervalue))
+    return distance
+
+
+def case_guess(info, solved):
+    """
+    Get a starting guess for the unknown of a case from the closest case that
+    has already been solved for the same unknown.
+
+    Enter: info: the information of the case.
+           solved: a list of (info, state) tuples of solved cases or None.
+    Exit:  guess: the value of the unknown in the closest case or None.
+    """
+    unknown = case_unknown(info)
+    best = None
+    for other, state in solved or []:
+        if (not state or state.get(unknown) is None or
+                case_unknown(other) != unknown):
+            continue
+        distance = case_distance(info, other)
+        if distance <= GuessDistance and (best is None or distance < best[0]):
+            best = (distance, state[unknown])
+    return best[1] if best else None
+
+
+def case_unknown(info):
+    """
+    Determine the factor that is solved for in a case.
+
+    Enter: info: the information of the case.
+    Exit:  unknown: the internal name of the factor.
+    """
+    for key, value in info.items():
+        if value == '?':
+            for factor in ballistics.Factors:
+                if key in (factor, ballistics.Factors[factor].get('long'),
+                           ballistics.Factors[factor].get('short')):
+                    return factor
+            return key
+    return 'power_factor'
 
 
 def get_multiprocess_pool(multi, verbose=0):
@@ -234,7 +667,10 @@ def get_multiprocess_pool(multi, verbose=0):
            verbose: verbosity for the ballistics program
     Exit:  pool: a multiprocess pool.
     """
+    global PoolSize
+
     poolsize = psutil.cpu_count(True) if multi is True else multi
+    PoolSize = poolsize
     pool = multiprocessing.Pool(processes=poolsize, initializer=worker_init)
     priorityLevel = (psutil.BELOW_NORMAL_PRIORITY_CLASS
                      if sys.platform == 'win32' else 10)
@@ -247,6 +683,69 @@ def get_multiprocess_pool(multi, verbose=0):
     return pool
 
 
+def make_chunks(tasks, costs=None):
+    """
+    Group tasks for a process pool into chunks.  Each chunk has up to
+    ChunkSize tasks and up to ChunkCost seconds of expected computation, and
+    there are enough chunks to keep the pool busy.
+
+    Enter: tasks: a list of tasks.
+           costs: if not None, a list of the expected computation time of each
+                  task in seconds.
+    Exit:  chunks: a list of lists of tasks.
+    """
+    maxSize = max(1, min(ChunkSize, len(tasks) // (PoolSize * 4)))
+    chunks = []
+    chunkCost = 0
+    for idx, task in enumerate(tasks):
+        cost = costs[idx] if costs else 0
+        if not len(chunks) or len(chunks[-1]) >= maxSize or chunkCost + cost > ChunkCost:
+            chunks.append([])
+            chunkCost = 0
+        chunks[-1].append(task)
+        chunkCost += cost
+    return chunks
+
+
+def parse_case(args):
+    """
+    Parse the arguments of a case so that this doesn't need to be done in the
+    process that calculates it.  Cases with arguments that could change the
+    global settings of the ballistics code are not parsed, since those
+    settings must be changed in the process that calculates the case.
+
+    Enter: args: arguments formulated for the ballistics routines.
+    Exit:  parsed: a tuple of (params, state) or None if the case can't be
+                   parsed in advance.
+    """
+    keys = set()
+    for table in (ballistics.Factors, ballistics.Settings):
+        for key in table:
+            keys |= {key, table[key].get('long', key)}
+    for arg in args:
+        if not arg.startswith('--') or arg[2:].split('=', 1)[0] not in keys:
+            return None
+    params, state, help = ballistics.parse_arguments(list(args), allowUnknownParams=True)
+    return params, state
+
+
+def pool_task(case, verbose, guess=None):
+    """
+    Get the arguments to calculate a case in a process pool, including only
+    what the pool process needs.  Cases that are parsed in advance return a
+    compact record of their final state.
+
+    Enter: case: the case record with hash, args, and info.
+           verbose: verbosity for the ballistics program.
+           guess: if not None, a starting guess for the unknown.
+    Exit:  args: a tuple of the arguments to calculate_case.
+    """
+    parsed = parse_case(case['args'])
+    return (case['hash'], case['args'] if parsed is None else None,
+            case['info'] if verbose >= 3 else None, verbose, guess, parsed,
+            parsed is not None)
+
+
 def process_cases(info, results, cases, verbose=0, nextcaseindex=0, extraArgs=None):
     """
     Check if there are any data entries in the current level of the info.
@@ -281,9 +780,7 @@ def process_cases(info, results, cases, verbose=0, nextcaseindex=0, extraArgs=No
     if not max([info[key] == '?' for key in info]):
         args.append('--power=?')
     args.extend(sorted([
-        '--%s=%s' % (key, info[key]) for key in info if key not in (
-            'date', 'ref', 'ref2', 'ref3', 'desc', 'desc2', 'desc3',
-            'technique', 'group') and
+        '--%s=%s' % (key, info[key]) for key in info if key not in IgnoredKeys and
         not key.endswith('_note')]))
     if extraArgs:
         args.extend(extraArgs)
@@ -299,8 +796,67 @@ def process_cases(info, results, cases, verbose=0, nextcaseindex=0, extraArgs=No
     return nextcaseindex
 
 
+def profile_report(files, outputPath, count=10):
+    """
+    Print the most expensive files and cases based on the computation time
+    and work counters recorded in the results of each case.  Cases that were
+    read from the result cache report the values from when they were
+    calculated.
+
+    Enter: files: a list of paths of yml files.
+           outputPath: directory where the results are stored.
+           count: the number of files and cases to list.
+    """
+    counterKeys = ['trajectories', 'steps', 'accelerations', 'drag_lookups']
+    fileStats = []
+    caseStats = []
+    for srcfile in files:
+        path = os.path.join(outputPath, os.path.splitext(os.path.basename(srcfile))[0] + '.json')
+        try:
+            data = json.load(open(path))
+        except (OSError, ValueError):
+            continue
+        stats = {'key': data.get('key'), 'cases': 0, 'time': 0,
+                 'counters': dict.fromkeys(counterKeys, 0)}
+        for entry in data['results']:
+            state = entry.get('results') or {}
+            counters = state.get('counters') or {}
+            stats['cases'] += 1
+            stats['time'] += state.get('computation_time') or 0
+            for key in counterKeys:
+                stats['counters'][key] += counters.get(key, 0)
+            caseStats.append({
+                'key': entry['key'], 'idx': entry['idx'],
+                'time': state.get('computation_time') or 0,
+                'technique': state.get('technique'),
+                'evaluations': state.get('solve_evaluations') or 0,
+                'counters': counters})
+        fileStats.append(stats)
+    print('Most expensive files:')
+    print('%-20s %6s %9s %12s %12s %12s %12s' % (
+        'file', 'cases', 'cpu (s)', 'trajectories', 'steps', 'accel', 'drag'))
+    for stats in sorted(fileStats, key=lambda stats: -stats['time'])[:count]:
+        print('%-20s %6d %9.2f %12d %12d %12d %12d' % (
+            stats['key'], stats['cases'], stats['time'],
+            *[stats['counters'][key] for key in counterKeys]))
+    print('Most expensive cases:')
+    print('%-20s %5s %-14s %9s %5s %12s %12s %12s %5s' % (
+        'file', 'idx', 'technique', 'cpu (s)', 'evals', 'trajectories',
+        'steps', 'accel', 'atm %'))
+    for stats in sorted(caseStats, key=lambda stats: -stats['time'])[:count]:
+        counters = stats['counters']
+        lookups = counters.get('atmosphere_lookups')
+        print('%-20s %5d %-14s %9.3f %5d %12d %12d %12d %5s' % (
+            stats['key'], stats['idx'], stats['technique'] or '', stats['time'],
+            stats['evaluations'], counters.get('trajectories', 0),
+            counters.get('steps', 0), counters.get('accelerations', 0),
+            '%3.1f' % (100.0 * counters['atmosphere_cache_hits'] / lookups)
+            if lookups else ''))
+
+
 def read_and_process_file(srcfile, outputPath, all=False, verbose=0,
-                          pool=None, reverse=False, extraArgs=None):
+                          pool=None, reverse=False, extraArgs=None, guess=True,
+                          cache=True):
     """
     Load a yaml file and any companion files.  For each non-skipped data set,
     calculate the ballistics result.  Output the results as a json file with
@@ -315,22 +871,88 @@ def read_and_process_file(srcfile, outputPath, all=False, verbose=0,
            pool: if not None, use this multiprocessing pool.
            reverse: if True, calculate the cases in the file in reverse order.
            extraArgs: extra arguments to use in all calculations.
+           guess: if True, start each case from the answer of the closest case
+                  that has already been solved, either in this file or in the
+                  previous results.
+           cache: if True, use the result cache in the output directory so
+                  that only cases that have changed are calculated.
     """
-    srcdate = os.path.getmtime(srcfile)
-    info = yaml.load(open(srcfile), Loader=SafeLineLoader)
+    cache = ResultCache(os.path.join(outputPath, ResultCacheFile)) if cache else None
+    try:
+        job = read_file(srcfile, outputPath, all, verbose, reverse, extraArgs,
+                        guess, cache)
+        if job:
+            writer = ResultsWriter(job['destpath'], job['results'])
+            try:
+                if calculate_cases(job['results'], job['cases'], verbose, pool,
+                                   job['solved'], cache, writer):
+                    writer.close()
+            finally:
+                writer.abort()
+    finally:
+        if cache is not None:
+            cache.close()
+
+
+def read_cached_cases(cache, results, cases, verbose=0, solved=None):
+    """
+    Get any cases that are in the result cache, removing them from the cases
+    that need to be calculated.
+
+    Enter: cache: a ResultCache.
+           results: array to store results.
+           cases: cases to process.  Modified.
+           verbose: verbosity for the ballistics program.
+           solved: if not None, a list of (info, state) tuples of cases that
+                   have already been solved.  Cached cases are added to this.
+    """
+    for hashval in list(cases):
+        state, points = cache.get(hashval)
+        if state is not None:
+            calculate_cases_results(hashval, state, points, results)
+            if solved is not None:
+                solved.append((cases[hashval]['info'], state))
+            del cases[hashval]
+    if verbose >= 2:
+        print('%d cases to calculate' % len(cases))
+
+
+def read_file(srcfile, outputPath, all=False, verbose=0, reverse=False,
+              extraArgs=None, guess=True, cache=None, info=None):
+    """
+    Load a yaml file and any companion files and collect the cases that need
+    to be calculated.
+
+    Enter: srcfile: path of the yml file to load.
+           outputPath: directory where the results will be stored.
+           all: True to process regardless of results time.
+           verbose: verbosity for the ballistics program.
+           reverse: if True, calculate the cases in the file in reverse order.
+           extraArgs: extra arguments to use in all calculations.
+           guess: if True, collect solved cases from the previous results for
+                  starting guesses.
+           cache: if not None, a ResultCache to get already calculated cases
+                  from.
+           info: if not None, the already loaded yml file.
+    Exit:  job: None if the file doesn't need to be processed.  Otherwise, a
+                dictionary with destpath: the path for the results, results:
+                the results to output, cases: the cases that need to be
+                calculated, solved: the list of solved cases used for
+                guesses or None, and previous: the list of cases from the
+                previous results.
+    """
+    destpath = result_path(srcfile, outputPath, all)
+    if destpath is None:
+        return None
+    if info is None:
+        info = load_yaml(srcfile, lines=True)
     if info.get('skip'):
-        return
+        return None
     basename = os.path.splitext(os.path.basename(srcfile))[0]
     basepath = os.path.dirname(srcfile)
     companionFiles = [os.path.join(basepath, file)
                       for file in os.listdir(basepath)
                       if os.path.splitext(file)[0] == basename]
-    srcdate = max(srcdate, max([os.path.getmtime(file)
-                                for file in companionFiles]))
-    destpath = os.path.join(outputPath, basename + '.json')
-    if (os.path.exists(destpath) and not all and
-            os.path.getmtime(destpath) > srcdate):
-        return
     for file in companionFiles:
         ext = os.path.splitext(file)[1]
         if ext == '.md':
@@ -349,23 +971,142 @@ def read_and_process_file(srcfile, outputPath, all=False, verbose=0,
     if reverse:
         for hashval in cases:
             cases[hashval]['position'] *= -1
-    if calculate_cases(results, cases, verbose, pool):
-        json.dump(results, open(destpath, 'wt'), sort_keys=True, indent=1,
-                  separators=(',', ': '), cls=FloatEncoder)
+    previous = read_solved_cases(destpath)
+    solved = previous[:] if guess else None
+    if cache is not None:
+        read_cached_cases(cache, results, cases, verbose, solved)
+    return {
+        'srcfile': srcfile,
+        'destpath': destpath,
+        'results': results,
+        'cases': cases,
+        'solved': solved,
+        'previous': previous,
+    }
+
+
+def read_files(files, outputPath, all=False, verbose=0, extraArgs=None,
+               guess=True, cache=None, pool=None):
+    """
+    Load yml files and collect the cases that need to be calculated from all
+    of them.  Files that don't need any cases calculated are written
+    immediately.
+
+    Enter: files: a list of paths of yml files to load.
+           outputPath: directory where the results will be stored.
+           all: True to process regardless of results time.
+           verbose: verbosity for the ballistics program.
+           extraArgs: extra arguments to use in all calculations.
+           guess: if True, get starting guesses from the previous results.
+           cache: if not None, a ResultCache to get already calculated cases
+                  from.
+           pool: if not None, load the yml files in parallel with this
+                 multiprocessing pool.
+    Exit:  tasks: a dictionary keyed by case hash.  Each entry has hash, case:
+                  the case record, guess: the starting guess or None, cost:
+                  the expected computation time or None, and jobs: a list of
+                  the jobs from read_file that use the case.  Each job has a
+                  left value with the number of cases it still needs and a
+                  writer with a ResultsWriter for its results.
+    """
+    tasks = {}
+    files = [srcfile for srcfile in files if result_path(srcfile, outputPath, all)]
+    if pool is not None:
+        infos = pool.map(functools.partial(load_yaml, lines=True), files)
+    else:
+        infos = [None] * len(files)
+    for srcfile, info in zip(files, infos):
+        job = read_file(srcfile, outputPath, all, verbose, False, extraArgs,
+                        guess, cache, info)
+        if not job:
+            continue
+        if not len(job['cases']):
+            write_results(job)
+            continue
+        job['left'] = len(job['cases'])
+        job['writer'] = ResultsWriter(job['destpath'], job['results'])
+        for hashval, case in job['cases'].items():
+            if hashval not in tasks:
+                tasks[hashval] = {
+                    'hash': hashval,
+                    'case': case,
+                    'guess': case_guess(case['info'], job['solved']),
+                    'cost': case_cost(case['info'], job['previous']),
+                    'jobs': []}
+            tasks[hashval]['jobs'].append(job)
+    return tasks
+
+
+def read_solved_cases(path):
+    """
+    Get the solved cases from a results file.
+
+    Enter: path: the path of the results json file.
+    Exit:  solved: a list of (info, state) tuples.  This is empty if the file
+                   doesn't exist or can't be read.
+    """
+    try:
+        with open(path) as fptr:
+            previous = json.load(fptr)
+        return [(entry['conditions'], entry['results'])
+                for entry in previous['results'] if entry.get('results')]
+    except (OSError, ValueError, KeyError, TypeError, AttributeError):
+        return []
+
+
+def result_path(srcfile, outputPath, all=False):
+    """
+    Check if a yml file needs to be processed.  It does if there is no results
+    file newer than it and its companion files.
+
+    Enter: srcfile: path of the yml file.
+           outputPath: directory where the results will be stored.
+           all: True to process regardless of results time.
+    Exit:  destpath: the path for the results or None if the file doesn't
+                     need to be processed.
+    """
+    basename = os.path.splitext(os.path.basename(srcfile))[0]
+    basepath = os.path.dirname(srcfile)
+    srcdate = max([os.path.getmtime(os.path.join(basepath, file))
+                   for file in os.listdir(basepath)
+                   if os.path.splitext(file)[0] == basename] +
+                  [os.path.getmtime(srcfile)])
+    destpath = os.path.join(outputPath, basename + '.json')
+    if (os.path.exists(destpath) and not all and
+            os.path.getmtime(destpath) > srcdate):
+        return None
+    return destpath
 
 
 def worker_init():
-    """Supress the ctrl-c signal in the worker processes."""
+    """
+    Supress the ctrl-c signal in the worker processes.  Apply any global
+    settings from the ballistics config file, since cases that were parsed in
+    advance won't read it.
+    """
     signal.signal(signal.SIGINT, signal.SIG_IGN)
+    ballistics.parse_arguments([], allowUnknownParams=True)
+
+
+def write_results(job):
+    """
+    Write the results of a processed file.
+
+    Enter: job: a dictionary returned from read_file.
+    """
+    ResultsWriter(job['destpath'], job['results']).close()
 
 
 if __name__ == '__main__':  # noqa - mccabe
     files = []
     allFiles = False
+    cache = True
     extraArgs = []
+    guess = True
     multi = False
-    multiFile = False
+    multiMode = 'all'
     outputPath = 'results'
+    profile = None
     reverse = False
     timeLimit = None
     timeLimitFile = None
@@ -383,16 +1124,24 @@ if __name__ == '__main__':  # noqa - mccabe
                 if multi <= 1:
                     multi = False
             if 'multicase' in arg:
-                multiFile = False
+                multiMode = 'case'
             if 'multifile' in arg:
-                multiFile = True
+                multiMode = 'file'
         elif arg.startswith('--limit='):
             timeLimit = float(arg.split('=', 1)[1].split(',')[0])
             if ',' in arg:
                 timeLimitFile = arg.split(',', 1)[1]
+        elif arg == '--nocache':
+            cache = False
+        elif arg == '--noguess':
+            guess = False
         elif arg.startswith('--out='):
             outputPath = os.path.abspath(os.path.expanduser(
                 arg.split('=', 1)[1]))
+        elif arg == '--profile':
+            profile = 10
+        elif arg.startswith('--profile='):
+            profile = int(arg.split('=', 1)[1])
         elif arg == '--reverse':
             reverse = True
         elif arg == '-v':
@@ -409,7 +1158,8 @@ if __name__ == '__main__':  # noqa - mccabe
 
 Syntax: process.py --out=(path) --all --reverse -v --limit=(seconds)[,(path)]
         --multi|--multifile|--multicase[=(number of processes)]
-        --arg=(key)=(value) (input files ...)
+        --arg=(key)=(value) --nocache --noguess --profile[=(count)]
+        (input files ...)
 
 If the input files are a directory, all yml files in that path are processed.
 Only files newer than the matching results are processed unless the --all flag
@@ -422,11 +1172,26 @@ is used.  The default for input files is 'data'.
   will exit more promptly.  If a path is specified and the process runs out of
   time, an file is created at that path.
 --multi runs parallel processes.  This uses the number of processors available
-  unless a number is specified.  --multifile runs a process per input file,
-  --multicase runs a process per ballistics case.
+  unless a number is specified.  By default, the cases from all input files are
+  calculated in a single queue, starting with the cases that took longest in
+  the previous results, and each file is written when its cases are done.
+  --multifile runs a process per input file, --multicase runs a process per
+  ballistics case, one file at a time.
+--nocache calculates every case.  Otherwise, cases that have already been
+  calculated with the same ballistics code, drag tables, and global settings
+  are read from a cache in the output directory.
+--noguess solves each case from scratch.  Otherwise, each case starts from the
+  answer of the most similar case that has already been solved, either earlier
+  in the same file or in the existing results for that file.  This can change
+  answers slightly, within the precision of the solver.
 --out specifies an output directory, which must exist.  Default is 'results'.
+--profile reports the files and cases that took the most computation time,
+  along with the number of trajectories, integration steps, accelerations, and
+  drag lookups they needed and the fraction of atmosphere lookups that were
+  cached.  Each case's counts are stored in its results.  This lists 10 files
+  and cases unless a number is specified.
 --reverse calculates the last conditions in a file first.  The output is
-  identical to the forward calculation.
+  identical to the forward calculation to within the precision of the solver.
 -v increase verbosity.
 """)
         sys.exit(0)
@@ -437,21 +1202,33 @@ is used.  The default for input files is 'data'.
         pool = None
     reachedTimeLimit = False
     try:
-        if not multi or not multiFile:
+        if multi and multiMode == 'all':
+            if not calculate_files(
+                    files, outputPath, pool, allFiles, verbose, extraArgs,
+                    guess, cache, timeLimit, starttime):
+                reachedTimeLimit = True
+                print('Cancelled due to time limit')
+                pool.terminate()
+            pool.close()
+            pool.join()
+        elif not multi or multiMode == 'case':
             for file in files:
                 if timeLimit and time.time() - starttime > timeLimit:
                     reachedTimeLimit = True
                     print('Cancelled due to time limit')
                     break
                 read_and_process_file(file, outputPath, allFiles, verbose,
-                                      pool, reverse=reverse, extraArgs=extraArgs)
+                                      pool, reverse=reverse, extraArgs=extraArgs,
+                                      guess=guess, cache=cache)
         else:
             mapfunc = functools.partial(read_and_process_file, *[], **{
                 'outputPath': outputPath,
                 'all': allFiles,
                 'verbose': verbose,
                 'reverse': reverse,
-                extraArgs: extraArgs
+                'extraArgs': extraArgs,
+                'guess': guess,
+                'cache': cache,
             })
             task = pool.map_async(mapfunc, files, 1)
             while not task.ready():
@@ -474,5 +1251,7 @@ is used.  The default for input files is 'data'.
     if timeLimitFile and reachedTimeLimit:
         with open(timeLimitFile, 'a'):
             os.utime(timeLimitFile, None)
+    if profile:
+        profile_report(files, outputPath, profile)
     if verbose >= 1:
         print('Total computation time: %4.2f s' % (time.time() - starttime))
@@ -34,6 +34,7 @@ setup(
     ],
     extras_require={
         'matplotlib': ['matplotlib>=1.5.1'],
+        'numpy': ['numpy>=1.11'],
     },
     zip_safe=True,
 )
@@ -0,0 +1 @@
+from util.fixtures import compiledDirectory  # noqa: F401
@@ -5,8 +5,13 @@ try:
     import matplotlib
 except ImportError:
     matplotlib = None
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 import ballistics
+from ballistics import cod_miller
 
 
 def testFindUnknown():
@@ -24,6 +29,137 @@ def testFindUnknown():
     assert 414000 < result['power_factor'] < 416000
 
 
+def testFindUnknownAdaptive():
+    state = {
+        'final_height': 0,
+        'initial_angle': 45.0,
+        'charge': 0.0311034768,
+        'mass': 11.070488780312502,
+        'material': 'brass',
+        'range': 229.13035200000002,
+        'time_delta': 0.05,
+    }
+    unknown = 'power_factor'
+    result, points = ballistics.find_unknown(state, unknown)
+    try:
+        ballistics.UseAdaptive = True
+        adaptive, adaptive_points = ballistics.find_unknown(state, unknown)
+    finally:
+        ballistics.UseAdaptive = False
+    assert adaptive['power_factor'] == pytest.approx(result['power_factor'], rel=1e-3)
+    assert adaptive['x'] == pytest.approx(state['range'])
+    assert adaptive['max_height'] == pytest.approx(result['max_height'], rel=1e-3)
+    assert len(adaptive_points) < len(points)
+
+
+def testAdaptiveStepTooSmall():
+    state = {
+        'final_height': 0,
+        'initial_angle': 45.0,
+        'initial_velocity': 100,
+        'mass': 11.070488780312502,
+        'material': 'brass',
+        'final_time': 20,
+    }
+    saved = (ballistics.UseAdaptive, ballistics.AdaptiveMinTimeDelta,
+             ballistics.AdaptiveRelativeTolerance, ballistics.AdaptiveAbsoluteTolerance)
+    try:
+        ballistics.UseAdaptive = True
+        ballistics.AdaptiveMinTimeDelta = 0.01
+        ballistics.AdaptiveRelativeTolerance = 1e-15
+        ballistics.AdaptiveAbsoluteTolerance = 1e-15
+        result, points = ballistics.trajectory(state)
+    finally:
+        (ballistics.UseAdaptive, ballistics.AdaptiveMinTimeDelta,
+         ballistics.AdaptiveRelativeTolerance, ballistics.AdaptiveAbsoluteTolerance) = saved
+    assert result['error'] == 'Failed - adaptive step size too small'
+    assert points == []
+
+
+def testAtmosphere():
+    state = {'T': 300, 'rh': 0.5, 'pressure': 90000, 'pressure_y0': 100, 'y': 1234.5}
+    expected = state.copy()
+    density = ballistics.atmospheric_density(expected)
+    viscosity = ballistics.atmospheric_viscosity(expected)
+    sos = ballistics.speed_of_sound(expected)
+    for band in (0, 1):
+        state['atmosphere'] = ballistics.Atmosphere(state, band)
+        assert ballistics.atmospheric_density(state) == pytest.approx(
+            density, rel=(band / 8400.) ** 2 / 8)
+        assert ballistics.atmospheric_viscosity(state) == pytest.approx(viscosity, rel=1e-8)
+        assert ballistics.speed_of_sound(state) == pytest.approx(sos, rel=1e-8)
+        assert set(state['density_data']) == set(expected['density_data'])
+        assert set(state['viscosity_data']) == set(expected['viscosity_data'])
+    assert state['atmosphere'].cache
+    final_state, _ = ballistics.trajectory({
+        'initial_velocity': 100, 'diam': 0.1, 'material': 'iron',
+        'final_height': 0, 'initial_angle': 10})
+    assert 'atmosphere' not in final_state
+
+
+def testNextPoint():
+    state = {
+        'final_height': 0,
+        'initial_angle': 45.0,
+        'initial_velocity': 100,
+        'diam': 0.1,
+        'material': 'iron',
+        'time_delta': 0.01,
+    }
+    final_state, points = ballistics.trajectory(state)
+    initial_state, _ = ballistics.trajectory_setup(state)
+    newstate = ballistics.next_point(initial_state, 0.01)
+    assert 'ax' not in state
+    for key in ('x', 'y', 'vx', 'vy', 'ax', 'ay', 'time'):
+        assert newstate[key] == pytest.approx(points[1][key])
+    assert newstate['drag_data']['Re'] == pytest.approx(points[1]['Re'])
+    assert final_state['y'] == 0
+    assert final_state['max_height'] >= max(point['y'] for point in points)
+    assert final_state['max_height'] == pytest.approx(max(point['y'] for point in points))
+
+
+def testTrajectoryEvents():
+    state = {
+        'final_height': 0,
+        'initial_angle': 45.0,
+        'initial_velocity': 100,
+        'diam': 0.1,
+        'material': 'iron',
+        'time_delta': 0.0005,
+    }
+    fine, _ = ballistics.trajectory(state)
+    state['time_delta'] = 0.5
+    coarse, points = ballistics.trajectory(state)
+    assert coarse['y'] == 0
+    assert len(points) < 40
+    for key in ('x', 'vx', 'vy', 'time', 'max_height'):
+        assert coarse[key] == pytest.approx(fine[key], rel=1e-4)
+    del state['final_height']
+    state['rising_height'] = 100
+    rising, _ = ballistics.trajectory(state)
+    assert rising['y'] == 100
+    assert rising['vy'] > 0
+    assert rising['max_height'] == pytest.approx(100)
+
+
+@pytest.mark.skipif(numpy is None, reason='numpy is required')
+def testCoefficientOfDragArray():
+    Re = numpy.array([0, 5e2, 2e4, 3e5, 4e5, 1e6, 4e6, 3e7, 2e4, 3e5])
+    Mn = numpy.array([0.5, 0.05, 0.2, 0.4, 0.6, 0.95, 1.3, 2.2, 0.1, 4.6])
+    for method in ['adjusted', 'collins', 'henderson', 'miller', 'morrison']:
+        state = {'settings': {'drag_method': method}, 'T': 300, 'material': 'lead'}
+        cd, in_range = ballistics.coefficient_of_drag_array(Re, Mn, state)
+        oor_cd, _ = ballistics.coefficient_of_drag_array(Re, Mn, state, only_in_range=True)
+        for idx in range(len(Re)):
+            scalar_state = {'settings': {'drag_method': method}, 'T': 300, 'material': 'lead'}
+            expected = ballistics.coefficient_of_drag(
+                scalar_state, reynolds=Re[idx], mach=Mn[idx])
+            assert cd[idx] == pytest.approx(expected, rel=1e-10)
+            assert bool(in_range[idx]) == bool(scalar_state['drag_data'].get('in_range', True))
+            if not in_range[idx]:
+                assert numpy.isnan(oor_cd[idx])
+
+
 def testCombinations():
     testDir = os.path.dirname(os.path.realpath(__file__))
     combinations = json.load(open(os.path.join(testDir, 'combinations.json')))
@@ -82,3 +218,119 @@ def testCdGraph(capsysbinary):
         assert output[:4] == b'\x89PNG'
         assert output not in images
         images.add(output)
+
+
+def testCounters():
+    state = {
+        'final_height': 0,
+        'initial_angle': 45.0,
+        'charge': 0.0311034768,
+        'mass': 11.070488780312502,
+        'material': 'brass',
+        'power_factor': 415000,
+        'time_delta': 0.05,
+    }
+    ballistics.reset_counters()
+    newstate, points = ballistics.trajectory(state)
+    counters = dict(ballistics.Counters)
+    assert counters['trajectories'] == 1
+    assert counters['steps'] == len(points) - 1
+    # Runge-Kutta uses four accelerations per step plus one at the start
+    assert counters['accelerations'] >= counters['steps'] * 4 + 1
+    assert counters['drag_lookups'] == counters['accelerations']
+    assert 0 < counters['atmosphere_cache_hits'] < counters['atmosphere_lookups']
+    ballistics.reset_counters()
+    assert not any(ballistics.Counters.values())
+
+
+def testDragCache():
+    state = {
+        'final_height': 0,
+        'initial_angle': 45.0,
+        'charge': 0.0311034768,
+        'mass': 11.070488780312502,
+        'material': 'brass',
+        'power_factor': 415000,
+        'time_delta': 0.05,
+    }
+    settings = dict(ballistics.DragCacheSettings)
+    exact, _ = ballistics.trajectory(state)
+    try:
+        ballistics.parse_arguments(['--dragcache=strict'])
+        ballistics.reset_counters()
+        ballistics.trajectory(state)
+        strict, _ = ballistics.trajectory(state)
+        assert strict == exact
+        assert ballistics.Counters['drag_cache_hits'] == ballistics.Counters['drag_lookups'] / 2
+        ballistics.parse_arguments(['--dragcache=1e-3,1e-3'])
+        assert not len(ballistics.DragCache)
+        ballistics.DragCacheSettings['size'] = 100
+        ballistics.reset_counters()
+        rounded, _ = ballistics.trajectory(state)
+        assert rounded['x'] != exact['x']
+        assert rounded['x'] == pytest.approx(exact['x'], rel=1e-4)
+        assert ballistics.Counters['drag_cache_hits'] > ballistics.Counters['drag_cache_misses']
+        assert len(ballistics.DragCache) == 100
+    finally:
+        ballistics.use_drag_cache(False, **settings)
+    assert ballistics.DragCache is None
+
+
+def testDragCacheReparseArguments(monkeypatch):
+    state = {
+        'final_height': 0,
+        'initial_angle': 45.0,
+        'charge': 0.0311034768,
+        'mass': 11.070488780312502,
+        'material': 'brass',
+        'range': 229.13035200000002,
+        'time_delta': 0.05,
+    }
+    settings = dict(ballistics.DragCacheSettings)
+    monkeypatch.setenv('BALLISTICS_CONF', '--millergrid --dragcache')
+    try:
+        ballistics.parse_arguments([])
+        ballistics.find_unknown(state, 'power_factor')
+        size = len(ballistics.DragCache)
+        # Reparsing the configuration, as is done for each case, must not
+        # invalidate the cached values
+        ballistics.parse_arguments([])
+        ballistics.reset_counters()
+        ballistics.find_unknown(state, 'power_factor')
+        assert ballistics.Counters['drag_cache_hits'] > 0
+        assert not ballistics.Counters['drag_cache_misses']
+        assert len(ballistics.DragCache) == size
+    finally:
+        ballistics.use_drag_cache(False, **settings)
+        cod_miller.use_grid(False, 0.02, 0.01)
+
+
+def testTrajectoryErrorsStopEarly(monkeypatch):
+    state = {
+        'final_height': 0,
+        'charge': 0.0311034768,
+        'mass': 11.070488780312502,
+        'material': 'brass',
+        'range': 229.13035200000002,
+        'power_factor': 415000,
+        'time_delta': 0.05,
+    }
+    calls = []
+    trajectory = ballistics.trajectory
+
+    def countedTrajectory(*args, **kwargs):
+        calls.append(True)
+        return trajectory(*args, **kwargs)
+
+    monkeypatch.setattr(ballistics, 'trajectory', countedTrajectory)
+    monkeypatch.setattr(ballistics, 'numpy', False)
+    values = list(range(5, 90, 5))
+    errors = ballistics.trajectory_errors(state, 'initial_angle', values)
+    next(errors)
+    assert len(calls) == 1
+    # The scan stops at the first bracket
+    del calls[:]
+    result, _ = ballistics.find_unknown(state, 'initial_angle')
+    assert result['initial_angle'] == pytest.approx(41.7158, rel=1e-4)
+    assert len(calls) == result['solve_evaluations']
+    assert len(calls) < len(values) + 10
@@ -0,0 +1,101 @@
+import pytest
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+import ballistics
+
+
+States = [{
+    'final_height': 0,
+    'initial_angle': 45.0,
+    'charge': 0.0311034768,
+    'mass': 11.070488780312502,
+    'material': 'brass',
+    'power_factor': 415000,
+    'time_delta': 0.05,
+}, {
+    'final_height': 0,
+    'initial_angle': 2.5,
+    'initial_velocity': 450,
+    'diam': 0.1493,
+    'mass': 12.174,
+    'rh': 0.5,
+    'T': 300,
+    'time_delta': 0.01,
+}, {
+    'range': 200,
+    'initial_angle': 0,
+    'initial_height': 10,
+    'initial_velocity': 300,
+    'mass': 0.5,
+    'material': 'lead',
+    'pressure': 90000,
+    'pressure_y0': 100,
+    'time_delta': 0.005,
+    'settings': {'drag_method': 'morrison'},
+}, {
+    'final_velocity': 150,
+    'initial_angle': 10,
+    'initial_velocity': 400,
+    'mass': 2,
+    'material': 'iron',
+    'time_delta': 0.02,
+}, {
+    'final_height': 0,
+    'initial_angle': 30,
+    'initial_velocity': 100,
+    'mass': 1,
+    'material': 'iron',
+    'pressure': 0,
+}, {
+    'initial_angle': 30,
+    'mass': 1,
+}]
+
+
+@pytest.fixture(params=['banded', 'exact'])
+def atmosphereBand(request):
+    # Both the banded and exact atmosphere match the scalar computation
+    band = ballistics.AtmosphereBand
+    if request.param == 'exact':
+        ballistics.AtmosphereBand = 0
+    yield
+    ballistics.AtmosphereBand = band
+
+
+@pytest.mark.skipif(numpy is None, reason='numpy is required')
+def testTrajectories(atmosphereBand):
+    from ballistics import batch
+
+    results = batch.trajectories(States)
+    assert len(results) == len(States)
+    for state, (final_state, points) in zip(States, results):
+        expected_state, expected_points = ballistics.trajectory(state)
+        assert final_state.get('error') == expected_state.get('error')
+        assert len(points) == len(expected_points)
+        for key in ('x', 'y', 'vx', 'vy', 'time', 'max_height'):
+            if key in expected_state:
+                assert final_state[key] == pytest.approx(expected_state[key], rel=1e-8, abs=1e-9)
+        for point, expected_point in zip(points, expected_points):
+            assert set(point) == set(expected_point)
+            for key in point:
+                assert point[key] == pytest.approx(expected_point[key], rel=1e-8, abs=1e-9)
+        if 'drag_data' in expected_state:
+            assert final_state['drag_data']['Re'] == pytest.approx(
+                expected_state['drag_data']['Re'], rel=1e-8)
+
+
+@pytest.mark.skipif(numpy is None, reason='numpy is required')
+def testTrajectoryErrors(atmosphereBand):
+    from ballistics import batch
+
+    state = States[0].copy()
+    del state['power_factor']
+    state['range'] = 229.13
+    values = [1e5, 3e5, 5e5, 7e5]
+    errors = batch.trajectory_errors(state, 'power_factor', values)
+    for value, error in zip(values, errors):
+        assert error == pytest.approx(ballistics.trajectory_error(
+            state, 'power_factor', value), rel=1e-8)
@@ -0,0 +1,81 @@
+import os
+import time
+
+import pytest
+
+from ballistics import cod_adjusted
+
+# The last points are outside of the compiled table
+Points = [(2e4, 0.1), (3e5, 0.5), (5e5, 0.63), (1e6, 1.2), (3e6, 2.5), (0.5, 0.3),
+          (1e10, 1), (1e5, 6)]
+
+
+@pytest.fixture
+def compiledPath(tmp_path, monkeypatch):
+    monkeypatch.setattr(cod_adjusted, 'CompiledDirectory', str(tmp_path))
+    cod_adjusted.Compiled.clear()
+    yield cod_adjusted.compiled_path(cod_adjusted.compiled_key())
+    cod_adjusted.Compiled.clear()
+
+
+def drag(Re, Mn):
+    return cod_adjusted.coefficient_of_drag_adjusted({'drag_data': {'Re': Re, 'Mn': Mn}})
+
+
+def testCompiledTable(compiledPath, monkeypatch):
+    pytest.importorskip('numpy')
+    compiled = [drag(Re, Mn) for Re, Mn in Points]
+    assert os.path.exists(compiledPath)
+    # Without a compiled range, every value is computed from the base table
+    mnRange = cod_adjusted.CompiledMnRange
+    monkeypatch.setattr(cod_adjusted, 'CompiledMnRange', (0, -1))
+    assert [drag(Re, Mn) for Re, Mn in Points] == compiled
+    monkeypatch.setattr(cod_adjusted, 'CompiledMnRange', mnRange)
+    # The saved table is loaded rather than computed
+    cod_adjusted.Compiled.clear()
+    cod_adjusted.MnReBaseTable.clear()
+    assert [drag(Re, Mn) for Re, Mn in Points[:5]] == compiled[:5]
+    assert not len(cod_adjusted.MnReBaseTable)
+
+
+def testCompiledTableArray(compiledPath):
+    numpy = pytest.importorskip('numpy')
+    Cd, in_range = cod_adjusted.coefficient_of_drag_adjusted_array(
+        numpy.array([Re for Re, Mn in Points]), numpy.array([Mn for Re, Mn in Points]))
+    assert Cd.tolist() == pytest.approx([drag(Re, Mn) for Re, Mn in Points], rel=1e-12)
+    assert numpy.all(in_range)
+
+
+def testCompiledTableDamaged(compiledPath):
+    pytest.importorskip('numpy')
+    assert cod_adjusted.compiled_key() in os.path.basename(compiledPath)
+    with open(compiledPath, 'wb') as fptr:
+        fptr.write(b'damaged')
+    compiled = [drag(Re, Mn) for Re, Mn in Points[:5]]
+    assert os.path.getsize(compiledPath) > 1000
+    cod_adjusted.Compiled.clear()
+    cod_adjusted.MnReBaseTable.clear()
+    assert [drag(Re, Mn) for Re, Mn in Points[:5]] == compiled
+    assert not len(cod_adjusted.MnReBaseTable)
+
+
+def testCompiledTableRemovesOldKeys(compiledPath):
+    pytest.importorskip('numpy')
+    directory = os.path.dirname(compiledPath)
+    os.makedirs(directory, exist_ok=True)
+    oldPath = os.path.join(directory, 'cod_adjusted.old.npz')
+    recentPath = os.path.join(directory, 'cod_adjusted.recent.npz')
+    for path in (oldPath, recentPath):
+        with open(path, 'wb') as fptr:
+            fptr.write(b'old')
+    lastUsed = time.time() - cod_adjusted.CompiledMaxAge - 60
+    os.utime(oldPath, (lastUsed, lastUsed))
+    drag(*Points[0])
+    assert os.path.exists(compiledPath)
+    assert os.path.exists(recentPath)
+    assert not os.path.exists(oldPath)
+    # Loading a table marks it as used
+    os.utime(compiledPath, (lastUsed, lastUsed))
+    cod_adjusted.Compiled.clear()
+    drag(*Points[0])
+    assert os.path.getmtime(compiledPath) > lastUsed + 60
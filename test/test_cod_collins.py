@@ -0,0 +1,17 @@
+import pytest
+
+from ballistics import cod_collins
+
+
+@pytest.mark.parametrize('curve', [cod_collins.KCurve, cod_collins.TCurve])
+def testBezierLookup(curve):
+    values = [curve[0] - 0.1 + idx * 0.0013 for idx in range(1300)]
+    results = [cod_collins.bezier_lookup(x, curve) for x in values]
+    for x, y in zip(values, results):
+        # bezier4pt is only within 0.0005 in x, and the slope is below 4
+        assert y == pytest.approx(cod_collins.bezier4pt(x, *curve), abs=0.002)
+    assert results[0] == curve[1]
+    assert results[-1] == curve[7]
+    numpy = pytest.importorskip('numpy')
+    assert cod_collins.bezier_lookup_array(numpy.array(values), curve).tolist() == \
+        pytest.approx(results, abs=1e-12)
@@ -0,0 +1,75 @@
+import pytest
+
+import ballistics
+from ballistics import cod_miller
+
+
+@pytest.fixture
+def millerGrid():
+    cod_miller.use_grid(True, 0.05, 0.02)
+    yield
+    cod_miller.use_grid(False, 0.02, 0.01)
+
+
+def testGrid(millerGrid):
+    deviation = cod_miller.grid_deviation(500)
+    assert 0 < deviation['max_abs'] < 0.02
+    for Re, Mn in ((2e4, 0.1), (3e5, 0.5), (5e5, 0.63), (1e6, 1.2), (3e6, 2.5)):
+        state = {'drag_data': {'Re': Re, 'Mn': Mn}}
+        exact = {'drag_data': {'Re': Re, 'Mn': Mn}}
+        Cd = cod_miller.coefficient_of_drag_miller(state)
+        assert Cd == pytest.approx(cod_miller.coefficient_of_drag_miller_exact(
+            exact), abs=deviation['max_abs'] * 1.5)
+        assert state['drag_data']['critical_Re'] == pytest.approx(
+            exact['drag_data']['critical_Re'])
+        assert state['drag_data']['in_range'] == exact['drag_data']['in_range']
+    assert cod_miller.grid_lookup(1e9, 1) is None
+    Cd = cod_miller.coefficient_of_drag_miller({'drag_data': {'Re': 1e9, 'Mn': 1}})
+    assert Cd == cod_miller.coefficient_of_drag_miller_exact({'drag_data': {'Re': 1e9, 'Mn': 1}})
+
+
+def testGridArray(millerGrid):
+    numpy = pytest.importorskip('numpy')
+    Re = numpy.array([2e4, 3e5, 5e5, 1e6, 3e6, 1e9, 2.2e5])
+    Mn = numpy.array([0.1, 0.5, 0.63, 1.2, 2.5, 1, 0.51])
+    # The first lookup fills the grid and the second uses the filled grid
+    for _ in range(2):
+        Cd, in_range, critical_Re = cod_miller.grid_lookup_array(Re, Mn)
+        for idx in range(len(Re)):
+            result = cod_miller.grid_lookup(Re[idx], Mn[idx])
+            if result is None:
+                assert numpy.isnan(Cd[idx])
+            else:
+                assert Cd[idx] == pytest.approx(result[0], rel=1e-12)
+                assert in_range[idx] == result[1]
+                assert critical_Re[idx] == pytest.approx(result[2])
+
+
+def testGridReplaceTable(millerGrid):
+    table = cod_miller.table_as_array()
+    state = {'drag_data': {'Re': 1e4, 'Mn': 1}}
+    Cd = cod_miller.coefficient_of_drag_miller(state)
+    checksum = ballistics.drag_table_checksum()
+    try:
+        cod_miller.replace_table([
+            (entry[0], [(Re, cd * 2) for Re, cd in entry[1]], entry[2]) for entry in table])
+        assert cod_miller.coefficient_of_drag_miller(state) == pytest.approx(Cd * 2, rel=1e-3)
+        assert ballistics.drag_table_checksum() != checksum
+    finally:
+        cod_miller.replace_table(table)
+    assert cod_miller.coefficient_of_drag_miller(state) == pytest.approx(Cd)
+    assert ballistics.drag_table_checksum() == checksum
+
+
+def testGridReparseArguments(monkeypatch):
+    monkeypatch.setenv('BALLISTICS_CONF', '--millergrid=0.05,0.02')
+    try:
+        ballistics.parse_arguments([])
+        version = cod_miller.TableVersion
+        assert cod_miller.UseGrid
+        ballistics.parse_arguments([])
+        assert cod_miller.TableVersion == version
+        ballistics.parse_arguments(['--millergrid=0.04,0.02'])
+        assert cod_miller.TableVersion != version
+    finally:
+        cod_miller.use_grid(False, 0.02, 0.01)
@@ -1,6 +1,7 @@
 import pytest
 
 from ballistics import interpolate
+from ballistics.interpolate import Interpolator, rowreduce, tridiagonal_solve
 
 
 TestData = [
@@ -191,6 +192,63 @@ def test_interpolation():
             assert result[1] == bool(in_range)
 
 
+@pytest.mark.parametrize('method', [
+    'natural', 'binatural', 'cubic', 'parabolic', 'hermitic', 'tension',
+    'quadratic', 'linear'])
+@pytest.mark.parametrize('logx', [False, True])
+def test_interpolator(method, logx):
+    values = [x for data, x in Conditions] + [x for x, y in TestData] + [
+        1.5e4, 3e5, 3.6e5, 6e5, 1e6]
+    for data in {tuple(entry) for entry, x in Conditions}:
+        interpolator = Interpolator(data, logx, method)
+        for x in values:
+            assert interpolator(x) == interpolate(x, data, logx, method)
+
+
+@pytest.mark.parametrize('method', ['tension', 'hermitic', 'linear', 'cubic'])
+def test_interpolator_array(method):
+    numpy = pytest.importorskip('numpy')
+    values = numpy.array([x for data, x in Conditions] + [x for x, y in TestData])
+    for data in {tuple(entry) for entry, x in Conditions}:
+        interpolator = Interpolator(data, True, method)
+        yi, in_range = interpolator.array(values)
+        for idx, x in enumerate(values):
+            assert (yi[idx], in_range[idx]) == interpolate(x, data, True, method)
+
+
+@pytest.mark.parametrize('method', ['natural', 'binatural'])
+@pytest.mark.parametrize('logx', [False, True])
+def test_interpolator_array_natural(method, logx):
+    numpy = pytest.importorskip('numpy')
+    values = numpy.array([x for data, x in Conditions] + [x for x, y in TestData])
+    for data in {tuple(entry) for entry, x in Conditions}:
+        interpolator = Interpolator(data, logx, method)
+        yi, in_range = interpolator.array(values)
+        for idx, x in enumerate(values):
+            result = interpolate(x, data, logx, method)
+            assert yi[idx] == pytest.approx(result[0], abs=1e-12)
+            assert in_range[idx] == result[1]
+
+
+def test_tridiagonal_solve():
+    lower = [0, 1, 2, 1, 0.5]
+    diagonal = [4, 5, 6, 5, 3]
+    upper = [1, 2, 1, 0.5, 0]
+    rhs = [1, 2, 3, 4, 5]
+    w, h = 6, 5
+    matrix = [0] * w * h
+    for i in range(h):
+        if i:
+            matrix[i * w + i - 1] = lower[i]
+        matrix[i * w + i] = diagonal[i]
+        if i + 1 < h:
+            matrix[i * w + i + 1] = upper[i]
+        matrix[i * w + w - 1] = rhs[i]
+    expected = [rowreduce(w, h, matrix)[2][i * w + w - 1] for i in range(h)]
+    assert tridiagonal_solve(lower, diagonal, upper, rhs) == pytest.approx(expected, 1e-12)
+    assert tridiagonal_solve([0], [4], [0], [2]) == [0.5]
+
+
 def make_results_interpolation():
     Results = []
     for method in ['natural', 'binatural', 'cubic', 'parabolic', 'hermitic',
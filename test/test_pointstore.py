@@ -0,0 +1,48 @@
+import math
+
+import pytest
+
+from util import pointstore
+
+
+@pytest.mark.parametrize('usenumpy', [None, False])
+def testPointStore(tmpdir, usenumpy):
+    cases = [
+        ('first', 0, {'Re': [1.77463e+06, 1.5e6], 'Mn': [0.684823, 0.6]}),
+        ('first', 1, {'Re': [2e5, 1e5, 5e4], 'Mn': [0.2, None, 0.05]}),
+        ('second', 0, {'Re': [3e3]}),
+    ]
+    path = str(tmpdir.join('store'))
+    pointstore.write_store(path, cases)
+    try:
+        pointstore.numpy = usenumpy
+        store = pointstore.PointStore(path)
+        for key, idx, points in cases:
+            result = store.points(key, idx)
+            assert sorted(result) == sorted(points)
+            for name in points:
+                for value, stored in zip(points[name], result[name]):
+                    if value is None:
+                        assert math.isnan(stored)
+                    else:
+                        assert stored == pytest.approx(value, rel=1e-7)
+        assert store.points('second', 1) is None
+        assert len(store.series('Re')) == 6
+    finally:
+        pointstore.numpy = None
+
+
+def testPointStoreEmptyCase(tmpdir):
+    cases = [
+        ('first', 0, {'Re': [1e5, 2e5]}),
+        ('first', 1, {}),
+    ]
+    path = str(tmpdir.join('store'))
+    pointstore.write_store(path, cases)
+    store = pointstore.PointStore(path)
+    assert list(store.points('first', 0)['Re']) == [1e5, 2e5]
+    assert store.points('first', 1) == {}
+    pointstore.remove_store(path)
+    assert not tmpdir.join('store').exists()
+    # Removing a missing store does nothing
+    pointstore.remove_store(path)
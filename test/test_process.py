@@ -0,0 +1,38 @@
+import pytest
+
+import ballistics
+import process
+
+
+def testPoolTaskResult():
+    state = {
+        'initial_angle': 45.0,
+        'charge': 0.0311034768,
+        'mass': 11.070488780312502,
+        'material': 'brass',
+        'range': 229.13035200000002,
+        'time_delta': 0.05,
+    }
+    case = {
+        'hash': 'sample',
+        'args': ['--%s=%s' % (key, value) for key, value in state.items()] + [
+            '--power_factor=?', '--drag_method=miller'],
+        'info': {}}
+    task = process.pool_task(case, 0)
+    assert task[1] is None
+    hashval, record, points = process.calculate_case(*task)
+    assert hashval == 'sample'
+    changed, removed, counters = record
+    # Only the values that the calculation changed are returned
+    assert 'power_factor' in changed
+    for key in list(state) + ['settings']:
+        assert key not in changed
+    assert counters == tuple(ballistics.Counters.values())
+    _, full, fullPoints = process.calculate_case(*task[:-1])
+    assert 'counters' in full and 'settings' in full
+    expanded = process.expand_result(task[5][1], record)
+    del expanded['computation_time']
+    del full['computation_time']
+    assert expanded == full
+    assert points == fullPoints
+    assert full['power_factor'] == pytest.approx(414088.34, rel=1e-5)
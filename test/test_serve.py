@@ -0,0 +1,150 @@
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import pytest
+
+import ballistics
+from ballistics import cod_miller, serve
+
+Request = {
+    'id': 'sample',
+    'factors': {
+        'range': '?', 'mass': '6 lb', 'initialvelocity': '500 ft/s',
+        'diameter': '3.5 in', 'angle': 10},
+}
+
+
+def testServeStream():
+    lines = [
+        json.dumps(Request),
+        json.dumps(dict(Request, id=2, points=True, args=['--method=adaptive'])),
+        '',
+        'not json',
+        json.dumps({'id': 3, 'factors': {'unknownfactor': 1}}),
+        json.dumps({'id': 4, 'factors': {'mass': '6 lb'}}),
+        json.dumps(dict(Request, id=5, args=['--millergrid'])),
+        json.dumps({'id': 6, 'factors': dict(Request['factors'], mass='bogus')}),
+    ]
+    responses = []
+    serve.serve_stream(lines, lambda line: responses.append(json.loads(line)))
+    assert [response.get('id') for response in responses] == ['sample', 2, None, 3, 4, 5, 6]
+    assert responses[0]['state']['x'] == pytest.approx(696.4, rel=1e-3)
+    assert 'points' not in responses[0]
+    assert responses[1]['state']['x'] == pytest.approx(696.4, rel=1e-3)
+    assert responses[1]['points']['x'][-1] == pytest.approx(696.4, rel=1e-3)
+    assert 'Invalid' in responses[2]['error']
+    assert 'unknownfactor' in responses[3]['error']
+    assert 'unknown' in responses[4]['error']
+    assert 'starting the server' in responses[5]['error']
+    assert responses[6]['error'] == 'Invalid value for mass'
+    # Arguments of one request don't change the settings of later requests
+    assert ballistics.UseAdaptive is False
+
+
+def testServeWarmUp():
+    response = json.loads(serve.solve_request(serve.WarmUpRequest))
+    assert response['state']['power_factor'] > 0
+
+
+def testServeConfigReadOnce(monkeypatch):
+    monkeypatch.setenv('BALLISTICS_CONF', '--millergrid=0.05,0.02 --solver=illinois')
+    monkeypatch.setattr(serve, 'ConfigArgs', None)
+    monkeypatch.setattr(sys, 'stdout', sys.stdout)
+    try:
+        serve.worker_init([], pooled=False)
+        assert serve.ConfigArgs == ['--solver=illinois']
+        version = cod_miller.TableVersion
+        reads = []
+        monkeypatch.setattr(ballistics, 'read_config_env', lambda: reads.append(True) or [])
+        response = json.loads(serve.solve_request(dict(Request, args=['--solver=brent'])))
+        assert response['state']['x'] == pytest.approx(696.4, rel=1e-3)
+        assert not reads
+        assert cod_miller.TableVersion == version
+        assert ballistics.Solver == 'illinois'
+    finally:
+        cod_miller.use_grid(False, 0.02, 0.01)
+        ballistics.Solver = 'brent'
+
+
+@pytest.mark.parametrize('processes', [0, 2])
+def testServeStdin(processes):
+    lines = ''.join(json.dumps(dict(Request, id=idx)) + '\n' for idx in range(4))
+    # This request prints a message, which must not be mixed with the responses
+    lines += json.dumps({'id': 4, 'factors': {
+        'power': '?', 'mass': '6 lb', 'charge': '1 lb', 'diameter': '3.5 in'}}) + '\n'
+    output = subprocess.check_output(
+        [sys.executable, '-m', 'ballistics', 'serve', '--processes=%d' % processes],
+        input=lines.encode('utf8'), stderr=subprocess.DEVNULL,
+        cwd=os.path.dirname(os.path.dirname(ballistics.__file__)))
+    responses = [json.loads(line) for line in output.decode('utf8').strip().split('\n')]
+    assert sorted(response['id'] for response in responses) == [0, 1, 2, 3, 4]
+    for response in responses:
+        if response['id'] != 4:
+            assert response['state']['x'] == pytest.approx(696.4, rel=1e-3)
+
+
+@pytest.mark.skipif(not hasattr(socket, 'AF_UNIX'), reason='Requires UNIX sockets')
+def testServeSocket(tmpdir):
+    path = str(tmpdir.join('ballistics.sock'))
+    proc = subprocess.Popen(
+        [sys.executable, '-m', 'ballistics', 'serve', '--processes=1', '--socket=' + path],
+        cwd=os.path.dirname(os.path.dirname(ballistics.__file__)))
+    try:
+        for _ in range(100):
+            if os.path.exists(path):
+                break
+            time.sleep(0.1)
+        conn = socket.socket(socket.AF_UNIX)
+        conn.connect(path)
+        stream = conn.makefile('rwb')
+        stream.write((json.dumps(Request) + '\n').encode('utf8'))
+        stream.flush()
+        response = json.loads(stream.readline().decode('utf8'))
+        conn.close()
+        assert response['id'] == 'sample'
+        assert response['state']['x'] == pytest.approx(696.4, rel=1e-3)
+    finally:
+        proc.terminate()
+        proc.wait()
+    assert not os.path.exists(path)
+
+
+@pytest.mark.skipif(not hasattr(socket, 'AF_UNIX'), reason='Requires UNIX sockets')
+def testServeSocketDisconnect(tmpdir):
+    path = str(tmpdir.join('ballistics.sock'))
+    proc = subprocess.Popen(
+        [sys.executable, '-m', 'ballistics', 'serve', '--processes=1', '--socket=' + path],
+        cwd=os.path.dirname(os.path.dirname(ballistics.__file__)))
+    try:
+        for _ in range(100):
+            if os.path.exists(path):
+                break
+            time.sleep(0.1)
+        # These clients disconnect before their responses are sent
+        for idx in range(3):
+            conn = socket.socket(socket.AF_UNIX)
+            conn.connect(path)
+            conn.sendall((json.dumps(dict(Request, id=idx)) + '\n').encode('utf8'))
+            conn.close()
+        conn = socket.socket(socket.AF_UNIX)
+        conn.settimeout(60)
+        conn.connect(path)
+        stream = conn.makefile('rwb')
+        stream.write((json.dumps(Request) + '\n').encode('utf8'))
+        stream.flush()
+        response = json.loads(stream.readline().decode('utf8'))
+        conn.close()
+        assert response['id'] == 'sample'
+        assert response['state']['x'] == pytest.approx(696.4, rel=1e-3)
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(60)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            raise
+    assert not os.path.exists(path)
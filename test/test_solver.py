@@ -0,0 +1,127 @@
+import math
+
+import pytest
+
+import ballistics
+from ballistics import solver
+
+
+Functions = [
+    (lambda x: x**3 - 2*x - 5, 2, 3, 2.0945514815423265),
+    (lambda x: math.cos(x) - x, 0, 1, 0.7390851332151607),
+    (lambda x: math.exp(x) - 1e6, 0, 30, math.log(1e6)),
+    (lambda x: (x - 1e5) / 1e5 + 0.01 * math.sin(x / 1e4), 1e3, 1e6, 100592.77449),
+]
+
+
+class Counter(object):
+    def __init__(self, func):
+        self.func = func
+        self.count = 0
+
+    def __call__(self, x):
+        self.count += 1
+        return self.func(x)
+
+
+@pytest.mark.parametrize('func,lo,hi,root', Functions)
+def testBracketed(func, lo, hi, root):
+    counts = {}
+    for method in (solver.brent, solver.illinois):
+        counter = Counter(func)
+        result = method(counter, lo, hi, rtol=1e-10)
+        assert result == pytest.approx(root, rel=1e-9)
+        counts[method.__name__] = counter.count
+    assert counts['brent'] <= 15
+    assert solver.brent(func, root, hi) == pytest.approx(root, rel=1e-9)
+    assert solver.brent(lambda x: None, lo, hi) is None
+
+
+@pytest.mark.parametrize('func,lo,hi,root', Functions)
+def testWarmStart(func, lo, hi, root):
+    bracket = solver.expand_bracket(func, root * 0.9, lo=lo, hi=hi)
+    assert bracket[0] <= root <= bracket[1]
+    assert bracket[2] * bracket[3] <= 0
+    counter = Counter(func)
+    result = solver.secant(counter, root * 0.999, root * 0.998, rtol=1e-10, lo=lo, hi=hi)
+    assert result == pytest.approx(root, rel=1e-9)
+    assert counter.count <= 10
+
+
+def testFindUnknownSolvers():
+    state = {
+        'final_height': 0,
+        'initial_angle': 45.0,
+        'charge': 0.0311034768,
+        'mass': 11.070488780312502,
+        'material': 'brass',
+        'range': 229.13035200000002,
+        'time_delta': 0.05,
+    }
+    results = {}
+    try:
+        for method in ('legacy', 'illinois', 'brent'):
+            ballistics.Solver = method
+            results[method], _ = ballistics.find_unknown(state, 'power_factor')
+    finally:
+        ballistics.Solver = 'brent'
+    for method in ('illinois', 'brent'):
+        assert results[method]['power_factor'] == pytest.approx(
+            results['legacy']['power_factor'], rel=1e-5)
+    assert results['brent']['solve_evaluations'] < results['legacy']['solve_evaluations']
+
+
+def testFindUnknownGuess():
+    state = {
+        'final_height': 0,
+        'initial_angle': 45.0,
+        'charge': 0.0311034768,
+        'mass': 11.070488780312502,
+        'material': 'brass',
+        'range': 229.13035200000002,
+        'time_delta': 0.05,
+    }
+    result, _ = ballistics.find_unknown(state, 'power_factor')
+    for kwargs, faster in (
+            ({'guess': 415000}, True), ({'bracket': (410000, 420000)}, True),
+            ({'guess': 1e6}, False), ({'bracket': (1e5, 2e5)}, False)):
+        guessed, _ = ballistics.find_unknown(state, 'power_factor', **kwargs)
+        assert guessed['power_factor'] == pytest.approx(result['power_factor'], rel=1e-5)
+        if faster:
+            assert guessed['solve_evaluations'] < result['solve_evaluations']
+
+
+def testFindUnknownSecant():
+    state = {
+        'final_height': 0,
+        'initial_angle': 45.0,
+        'charge': 0.0311034768,
+        'mass': 11.070488780312502,
+        'material': 'brass',
+        'range': 229.13035200000002,
+        'time_delta': 0.05,
+    }
+    result, _ = ballistics.find_unknown(state, 'power_factor', guess=415000)
+    try:
+        ballistics.Solver = 'secant'
+        guessed, _ = ballistics.find_unknown(state, 'power_factor', guess=415000)
+        unguessed, _ = ballistics.find_unknown(state, 'power_factor')
+    finally:
+        ballistics.Solver = 'brent'
+    assert guessed['power_factor'] == pytest.approx(result['power_factor'], rel=1e-5)
+    assert guessed['solve_evaluations'] <= result['solve_evaluations']
+    assert unguessed['power_factor'] == pytest.approx(result['power_factor'], rel=1e-5)
+
+
+def testFindUnknownBadGuess():
+    state = {
+        'final_height': 0,
+        'initial_angle': 45.0,
+        'charge': 0.0311034768,
+        'mass': 11.070488780312502,
+        'material': 'brass',
+        'range': 229.13035200000002,
+        'time_delta': 0.05,
+    }
+    with pytest.raises(TypeError):
+        ballistics.find_unknown(state, 'power_factor', guess='415000')
@@ -0,0 +1,23 @@
+import json
+import subprocess
+import sys
+
+from util import startup_time
+
+
+def testLazyImports():
+    output = subprocess.check_output([sys.executable, '-c', (
+        'import json, sys, ballistics; '
+        'before = sorted(sys.modules); '
+        'ballistics.coefficient_of_drag({"settings": {"drag_method": "henderson"}}, '
+        'reynolds=1e5, mach=0.5); '
+        'middle = sorted(sys.modules); '
+        'ballistics.coefficient_of_drag_collins({"drag_data": {"Re": 1e5, "Mn": 0.5}}); '
+        'print(json.dumps([before, middle, sorted(sys.modules)]))')], cwd=startup_time.RootPath)
+    before, middle, after = json.loads(output.decode('utf8'))
+    for module in ('ballistics.cod_miller', 'ballistics.cod_henderson', 'pprint', 'psutil'):
+        assert module not in before
+    assert 'ballistics.cod_henderson' in middle
+    assert 'ballistics.cod_collins' not in middle
+    assert 'ballistics.cod_collins' in after
+    assert 'ballistics.cod_miller' not in after
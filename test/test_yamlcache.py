@@ -0,0 +1,40 @@
+import os
+
+import yaml
+
+from util import yamlcache
+
+
+def testLoadYaml(tmpdir):
+    path = str(tmpdir.join('sample.yml'))
+    with open(path, 'wt') as fptr:
+        fptr.write('key: sample\ndata:\n  - range: 100 m\n    charge: 1 oz\n  - range: 200 m\n')
+    plain = yamlcache.load_yaml(path)
+    assert plain == yaml.safe_load(open(path))
+    lines = yamlcache.load_yaml(path, lines=True)
+    assert lines['__line__'] == 1
+    assert [entry['__line__'] for entry in lines['data']] == [3, 5]
+    cachedir = str(tmpdir.join('.yamlcache'))
+    assert len(os.listdir(cachedir)) == 2
+    # The cached values are used until the file changes
+    assert yamlcache.load_yaml(path, lines=True) == lines
+    with open(path, 'at') as fptr:
+        fptr.write('ref: changed\n')
+    assert yamlcache.load_yaml(path)['ref'] == 'changed'
+    assert len(os.listdir(cachedir)) == 2
+
+
+def testLoadYamlDamagedCache(tmpdir):
+    path = str(tmpdir.join('sample.yml'))
+    with open(path, 'wt') as fptr:
+        fptr.write('key: sample\n')
+    yamlcache.load_yaml(path)
+    cachedir = str(tmpdir.join('.yamlcache'))
+    for name in os.listdir(cachedir):
+        with open(os.path.join(cachedir, name), 'wb') as fptr:
+            fptr.write(b'not a pickle')
+    assert yamlcache.load_yaml(path) == {'key': 'sample'}
+    # A truncated file is also replaced
+    for name in os.listdir(cachedir):
+        open(os.path.join(cachedir, name), 'wb').close()
+    assert yamlcache.load_yaml(path) == {'key': 'sample'}
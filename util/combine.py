@@ -3,17 +3,20 @@ This compares all of the results files and collapses them into a simple array.
 """
 
 import csv
+import hashlib
 import json
 import math
 import os
+import pickle
 import sys
 import traceback
-import yaml
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__),
                                              os.pardir)))
 
 from ballistics import cod_adjusted  # noqa
+from util import pointstore  # noqa
+from util.yamlcache import load_yaml  # noqa
 
 
 Groups = {}
@@ -21,6 +24,44 @@ Groups = {}
 GivenCombinations = {}
 
 
+def cached_piece(path, cache, func, *args):
+    """
+    Get the contribution of one input file to the combined output, using the
+    incremental cache if possible.  A cached contribution is used if the
+    file's modification time and size or its content hash are unchanged.
+
+    Enter: path: the path of the input file.
+           cache: None to not use a cache, or a cache dictionary from
+                  load_cache.
+           func: a function that computes the contribution from the path and
+                 any additional arguments.
+           args: additional arguments to pass to the function.
+    Exit:  piece: the contribution of the file.
+    """
+    if cache is None:
+        return func(path, *args)
+    stat = os.stat(path)
+    cache['seen'].add(path)
+    record = cache['manifest'].get(path)
+    piecepath = os.path.join(cache['path'], '%s.%s.pickle' % (
+        os.path.basename(path), func.__name__))
+    if record and os.path.exists(piecepath):
+        if record['mtime'] == stat.st_mtime and record['size'] == stat.st_size:
+            return pickle.load(open(piecepath, 'rb'))
+        hashval = file_hash(path)
+        if record['hash'] == hashval:
+            record.update({'mtime': stat.st_mtime, 'size': stat.st_size})
+            return pickle.load(open(piecepath, 'rb'))
+    else:
+        hashval = file_hash(path)
+    piece = func(path, *args)
+    pickle.dump(piece, open(piecepath, 'wb'), pickle.HIGHEST_PROTOCOL)
+    cache['manifest'][path] = {
+        'mtime': stat.st_mtime, 'size': stat.st_size, 'hash': hashval}
+    cache['changed'] += 1
+    return piece
+
+
 def combine(opts):  # noqa
     """
     Combine all of the results and references, output one file with all the
@@ -33,8 +74,9 @@ def combine(opts):  # noqa
     """
     total = []
     trajectories = []
+    cache = load_cache(opts) if opts.get('incremental') else None
 
-    references = yaml.safe_load(open('data/references.yml'))['references']
+    references = load_yaml('data/references.yml')['references']
     references = {item['key']: item for item in references}
 
     basedir = 'data'
@@ -43,116 +85,49 @@ def combine(opts):  # noqa
                 'template.yml', 'references.yml'):
             continue
         path = os.path.join(basedir, file)
-        try:
-            data = yaml.safe_load(open(path))
-        except Exception:
-            print('Failed to parse file %s' % path)
-            raise
-        references.setdefault(data['key'], {})
-        for key in ('key', 'ref', 'cms', 'summary', 'link', 'details'):
-            if key in data:
-                references[data['key']][key] = data[key]
+        key, fields = cached_piece(path, cache, combine_data_file)
+        references.setdefault(key, {})
+        references[key].update(fields)
 
     ReMnGrid = {}
 
     basedir = opts.get('results', 'results')
     sources = 0
     for file in sorted(os.listdir(basedir)):  # noqa
-        used = False
+        if not file.endswith('.json'):
+            continue
         path = os.path.join(basedir, file)
-        try:
-            data = json.load(open(path))
-        except Exception:
-            print('Failed to parse file %s' % path)
-            raise
-        references.setdefault(data['key'], {})
-        for key in ('key', 'ref', 'cms', 'summary', 'link', 'details'):
-            if key in data:
-                references[data['key']][key] = data[key]
-        for entry in data['results']:
-            try:
-                item = {}
-                for key in data:
-                    if (key not in ('data', 'results', 'summary', 'details',
-                                    'cms', 'link') and
-                            not key.endswith('_note') and not key.startswith('__')):
-                        item[key] = data[key]
-                for key in entry:
-                    if key not in ('conditions', 'points', 'results'):
-                        item[key] = entry[key]
-                GivenCombinations.setdefault(tuple(sorted([
-                    key for key in entry['conditions']
-                    if not key.startswith('desc') and
-                    not key.startswith('ref') and
-                    not key.endswith('_note') and
-                    key not in ('date', 'technique', 'group')])), entry)
-                for key in entry['conditions']:
-                    item['given_' + key] = entry['conditions'][key]
-                for key in entry['results']:
-                    if key == 'settings':
-                        item.update(entry['results']['settings'])
-                    elif not key.endswith('_data'):
-                        item[key] = entry['results'][key]
-                    else:
-                        for subkey in entry['results'][key]:
-                            item['final_%s_%s' % (key.rsplit(
-                                '_data', 1)[0], subkey)] = entry[
-                                    'results'][key][subkey]
-                item['date'] = str(item.get('given_date', item['date']))
-                item['year'] = int(item['date'].split('-')[0])
-                item['date_filled'] = '-'.join((item['date'].split('-') +
-                                                ['01', '01'])[:3])
-                for basekey in ('ref', 'desc'):
-                    for i in range(0, 10):
-                        for prefix in ('', 'given_'):
-                            if i:
-                                key = '%s%s%d' % (prefix, basekey, i)
-                            else:
-                                key = '%s%s' % (prefix, basekey)
-                            if item.get(key):
-                                if item[key] not in item.get(basekey, ''):
-                                    if item.get(basekey):
-                                        item[basekey] += (
-                                            '  ' if item[basekey].endswith('.')
-                                            else ', ')
-                                    else:
-                                        item[basekey] = ''
-                                    item[basekey] += item[key]
-                                del item[key]
-                if entry.get('points'):
-                    traj = {'key': item['key'], 'idx': item['idx']}
-                    for key in entry['points']:
-                        traj['trajectory_' + key] = entry['points'][key]
-                        if opts.get('points', False):
-                            item['trajectory_' + key] = entry['points'][key]
-                    trajectories.append(traj)
-                if 'given_technique' in item:
-                    item['technique'] = item['given_technique']
-                for key in ('date', 'technique', 'ref'):
-                    if item.get(key) is None:
-                        raise Exception('Missing parameter %s' % key)
-                skip = False
-                for key in ('power_factor', ):
-                    if item.get(key) is None:
-                        print('Missing parameter %s for %s:%d.  Entry excluded.' % (
-                            key, item['key'], item['idx']))
-                        skip = True
-                if opts.get('fields'):
-                    item = {key: item[key] for key in item
-                            if key in opts['fields']}
-                if not skip:
-                    total.append(item)
-                    used = True
-                if opts.get('grid') or opts.get('adjust'):
-                    compile_grid(ReMnGrid, entry, opts, item)
-            except Exception:
-                print('Failed on %s: %d\n%r' % (file, entry.get('idx', 0),
-                                                entry.get('conditions')))
-                print(traceback.format_exc().strip())
-        if used:
+        piece = cached_piece(path, cache, combine_results_file, opts)
+        key, fields = piece['reference']
+        references.setdefault(key, {})
+        references[key].update(fields)
+        total.extend(piece['total'])
+        trajectories.extend(piece['trajectories'])
+        for combokey, combo in piece['combinations']:
+            GivenCombinations.setdefault(combokey, combo)
+        for mn in piece['grid']:
+            ReMnGrid.setdefault(mn, {})
+            for re, count in piece['grid'][mn].items():
+                ReMnGrid[mn][re] = ReMnGrid[mn].get(re, 0) + count
+        for group, entries in piece['groups'].items():
+            Groups.setdefault(group, []).extend(entries)
+        if piece['used']:
             sources += 1
+    if cache is not None:
+        save_cache(cache)
+        print('%d changed input files' % cache['changed'])
     output_files(total, 'totallist', opts)
-    output_files(trajectories, 'trajectories', opts)
+    # The client prefers the point store, so only leave the format that is
+    # written
+    storepath = os.path.join(opts.get('out', 'client/static'), 'trajectories')
+    if opts.get('pointstore'):
+        pointstore.write_store(storepath, trajectories)
+        for ext in ('.json', '.csv'):
+            if os.path.exists(storepath + ext):
+                os.unlink(storepath + ext)
+    else:
+        pointstore.remove_store(storepath)
+        output_files(trajectories, 'trajectories', opts)
     print('%d samples from %d sources' % (len(total), sources))
     output_files(references, 'references', opts)
     print('%d references' % len(references))
@@ -169,7 +144,140 @@ def combine(opts):  # noqa
     return ReMnGrid
 
 
-def compile_grid(grid, entry, opts, item):
+def combine_data_file(path):
+    """
+    Get the reference information from a data file.
+
+    Enter: path: the path of the yml file.
+    Exit:  key: the reference key.
+           fields: a dictionary of reference fields from the file.
+    """
+    try:
+        data = load_yaml(path)
+    except Exception:
+        print('Failed to parse file %s' % path)
+        raise
+    return data['key'], {key: data[key] for key in (
+        'key', 'ref', 'cms', 'summary', 'link', 'details') if key in data}
+
+
+def combine_results_file(path, opts):  # noqa
+    """
+    Get the contribution of a results file to the combined output.
+
+    Enter: path: the path of the json results file.
+           opts: a dictionary of options for processing.
+    Exit:  piece: a dictionary with reference: a (key, fields) tuple of
+                  reference information, total: a list of flattened items,
+                  trajectories: a list of trajectories, combinations: a list
+                  of (key, entry) tuples of the combinations of given
+                  parameters, grid: the Re/Mn grid of this file, groups: a
+                  dictionary of group entries, and used: True if any items
+                  were included.
+    """
+    piece = {'total': [], 'trajectories': [], 'combinations': [], 'grid': {},
+             'groups': {}, 'used': False}
+    try:
+        data = json.load(open(path))
+    except Exception:
+        print('Failed to parse file %s' % path)
+        raise
+    piece['reference'] = (data['key'], {key: data[key] for key in (
+        'key', 'ref', 'cms', 'summary', 'link', 'details') if key in data})
+    for entry in data['results']:
+        try:
+            item = {}
+            for key in data:
+                if (key not in ('data', 'results', 'summary', 'details',
+                                'cms', 'link') and
+                        not key.endswith('_note') and not key.startswith('__')):
+                    item[key] = data[key]
+            for key in entry:
+                if key not in ('conditions', 'points', 'results'):
+                    item[key] = entry[key]
+            piece['combinations'].append((tuple(sorted([
+                key for key in entry['conditions']
+                if not key.startswith('desc') and
+                not key.startswith('ref') and
+                not key.endswith('_note') and
+                key not in ('date', 'technique', 'group')])), {
+                    'conditions': entry['conditions'],
+                    'results': {key: entry['results'].get(key)
+                                for key in ('power_factor', 'time')}}))
+            for key in entry['conditions']:
+                item['given_' + key] = entry['conditions'][key]
+            for key in entry['results']:
+                if key == 'settings':
+                    item.update(entry['results']['settings'])
+                elif key == 'counters':
+                    # The work counters are only used for profiling
+                    continue
+                elif not key.endswith('_data'):
+                    item[key] = entry['results'][key]
+                else:
+                    for subkey in entry['results'][key]:
+                        item['final_%s_%s' % (key.rsplit(
+                            '_data', 1)[0], subkey)] = entry[
+                                'results'][key][subkey]
+            item['date'] = str(item.get('given_date', item['date']))
+            item['year'] = int(item['date'].split('-')[0])
+            item['date_filled'] = '-'.join((item['date'].split('-') +
+                                            ['01', '01'])[:3])
+            for basekey in ('ref', 'desc'):
+                for i in range(0, 10):
+                    for prefix in ('', 'given_'):
+                        if i:
+                            key = '%s%s%d' % (prefix, basekey, i)
+                        else:
+                            key = '%s%s' % (prefix, basekey)
+                        if item.get(key):
+                            if item[key] not in item.get(basekey, ''):
+                                if item.get(basekey):
+                                    item[basekey] += (
+                                        '  ' if item[basekey].endswith('.')
+                                        else ', ')
+                                else:
+                                    item[basekey] = ''
+                                item[basekey] += item[key]
+                            del item[key]
+            if entry.get('points') and opts.get('pointstore'):
+                piece['trajectories'].append((item['key'], item['idx'], {
+                    key: points_as_list(entry['points'][key])
+                    for key in entry['points']}))
+            if entry.get('points') and not opts.get('pointstore'):
+                traj = {'key': item['key'], 'idx': item['idx']}
+                for key in entry['points']:
+                    traj['trajectory_' + key] = points_as_text(entry['points'][key])
+                    if opts.get('points', False):
+                        item['trajectory_' + key] = traj['trajectory_' + key]
+                piece['trajectories'].append(traj)
+            if 'given_technique' in item:
+                item['technique'] = item['given_technique']
+            for key in ('date', 'technique', 'ref'):
+                if item.get(key) is None:
+                    raise Exception('Missing parameter %s' % key)
+            skip = False
+            for key in ('power_factor', ):
+                if item.get(key) is None:
+                    print('Missing parameter %s for %s:%d.  Entry excluded.' % (
+                        key, item['key'], item['idx']))
+                    skip = True
+            if opts.get('fields'):
+                item = {key: item[key] for key in item
+                        if key in opts['fields']}
+            if not skip:
+                piece['total'].append(item)
+                piece['used'] = True
+            if opts.get('grid') or opts.get('adjust'):
+                compile_grid(piece['grid'], entry, opts, item, piece['groups'])
+        except Exception:
+            print('Failed on %s: %d\n%r' % (path, entry.get('idx', 0),
+                                            entry.get('conditions')))
+            print(traceback.format_exc().strip())
+    return piece
+
+
+def compile_grid(grid, entry, opts, item, groups=None):
     """
     Compile the usage of grid and reynolds numbers from a grid, always
     excluding theoretical values and possibly non-group values.
@@ -178,7 +286,11 @@ def compile_grid(grid, entry, opts, item):
            entry: the individual entry to add to the grid.
            opts: program options for how to collate the grid.
            item: the individual item that is being processed.
+           groups: a dictionary to collect group entries in.  Modified.  None
+                   to use the global Groups.
     """
+    if groups is None:
+        groups = Groups
     if item['technique'] == 'theory':
         return
     group = entry['conditions'].get('group')
@@ -192,8 +304,8 @@ def compile_grid(grid, entry, opts, item):
         return
     if opts.get('group') and not group:
         return
-    ReList = json.loads(entry['points']['Re'])
-    MnList = json.loads(entry['points']['Mn'])
+    ReList = points_as_list(entry['points']['Re'])
+    MnList = points_as_list(entry['points']['Mn'])
     if len(ReList) != len(MnList):
         return
     res = int(opts.get('gridres', 10))
@@ -209,9 +321,9 @@ def compile_grid(grid, entry, opts, item):
             grid[mn][re] = grid[mn].get(re, 0) + 1
         last_re, last_mn = re, mn
     if group is not None:
-        if group not in Groups:
-            Groups[group] = []
-        Groups[group].append({
+        if group not in groups:
+            groups[group] = []
+        groups[group].append({
             'group': group,
             'power_factor': item['power_factor'],
             're': ReList,
@@ -248,6 +360,50 @@ def csv_dump(data, path):
             writer.writerow(row)
 
 
+def file_hash(path):
+    """
+    Compute a hash of the contents of a file.
+
+    Enter: path: the path of the file.
+    Exit:  hashval: a hexadecimal string.
+    """
+    return hashlib.md5(open(path, 'rb').read()).hexdigest()
+
+
+def load_cache(opts):
+    """
+    Load the manifest of the incremental cache.  If the options that affect
+    the contribution of each file or this program have changed, the cache is
+    emptied.
+
+    Enter: opts: a dictionary of options for processing.
+    Exit:  cache: a dictionary with path: the cache directory, manifest: a
+                  dictionary of the modification time, size, and hash of each
+                  input file, changed: the number of input files that have
+                  been recomputed, seen: the set of input files that have
+                  been used, and signature: the options and program hash
+                  that the cache is valid for.
+    """
+    path = opts.get('cache', os.path.join(opts.get('results', 'results'), '.combine'))
+    if not os.path.isdir(path):
+        os.makedirs(path)
+    signature = json.dumps({
+        'program': file_hash(os.path.abspath(__file__)),
+        'opts': {key: opts.get(key) for key in (
+            'adjust', 'fields', 'grid', 'gridres', 'group', 'points', 'pointstore')},
+    }, sort_keys=True)
+    cache = {'path': path, 'manifest': {}, 'changed': 0, 'seen': set(),
+             'signature': signature}
+    try:
+        with open(os.path.join(path, 'manifest.json')) as fptr:
+            manifest = json.load(fptr)
+        if manifest['signature'] == signature:
+            cache['manifest'] = manifest['files']
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    return cache
+
+
 def make_groups_grid(opts):
     """
     Using the group values, make the groups grid.
@@ -339,6 +495,50 @@ def parameter_summary(data):
     return params
 
 
+def points_as_list(points):
+    """
+    Get a trajectory series from a results file as a list.  Older results
+    files store each series as a JSON string.
+
+    Enter: points: a list or a JSON string of a list.
+    Exit:  points: a list.
+    """
+    if isinstance(points, str):
+        return json.loads(points)
+    return points
+
+
+def points_as_text(points):
+    """
+    Get a trajectory series from a results file as a compact JSON string.
+    Floats use the same precision as the results files.
+
+    Enter: points: a list or a JSON string of a list.
+    Exit:  points: a JSON string.
+    """
+    if isinstance(points, str):
+        return points
+    return '[' + ','.join([
+        '%.6g' % val if isinstance(val, float) else json.dumps(val)
+        for val in points]) + ']'
+
+
+def save_cache(cache):
+    """
+    Save the manifest of the incremental cache.  Files that weren't used are
+    removed from the manifest.
+
+    Enter: cache: a cache dictionary from load_cache.
+    """
+    manifest = {
+        'signature': cache['signature'],
+        'files': {path: record for path, record in cache['manifest'].items()
+                  if path in cache['seen']},
+    }
+    json.dump(manifest, open(os.path.join(cache['path'], 'manifest.json'), 'wt'),
+              sort_keys=True, indent=1)
+
+
 def show_grid(grid, opts, usemin=True):
     """
     Output a collected grid to stdout.
@@ -451,6 +651,11 @@ if __name__ == '__main__':  # noqa - mccabe
             opts['grid'] = True
         elif arg == '--group':
             opts['group'] = True
+        elif arg == '--incremental':
+            opts['incremental'] = True
+        elif arg.startswith('--incremental='):
+            opts['incremental'] = True
+            opts['cache'] = arg.split('=', 1)[1]
         elif arg == '--json':
             opts['json'] = True
         elif arg == '--limit':
@@ -471,6 +676,8 @@ if __name__ == '__main__':  # noqa - mccabe
             opts['out'] = arg.split('=', 1)[1]
         elif arg in ('--points', '--traj', '--trajectory'):
             opts['points'] = True
+        elif arg == '--pointstore':
+            opts['pointstore'] = True
         elif arg.startswith('--res='):
             opts['gridres'] = float(arg.split('=', 1)[1])
         elif arg.startswith('--results='):
@@ -483,10 +690,14 @@ if __name__ == '__main__':  # noqa - mccabe
 Syntax:  combine.py --grid --points|--nopoints --res=(grid resolution)
     --min=(grid min) --group --csv|--nocsv --json|--nojson --adjust
     --limit[=(fields)] --results=(results directory) --out=(output directory)
+    --pointstore --incremental[=(cache directory)]
 --adjust adjusts the json file used with cod_adjusted.
 --csv outputs csv files in the output directory.
 --grid outputs a grid of used Re/Mn values to stdout.
 --group outputs only the grid for groups that are present.
+--incremental keeps the contribution of each input file in a cache directory,
+  and only recomputes the contributions of files that have changed.  The
+  default cache directory is '.combine' in the results directory.
 --json outputs json files to the output directory (default).
 --limit reduces the fields output to the comma-separated list of fields.  If no
   fields are given, a common subset of fields is used instead.
@@ -495,6 +706,11 @@ Syntax:  combine.py --grid --points|--nopoints --res=(grid resolution)
 --out is the directory where json and csv files are stored.  Default is
   'client/static'.
 --points includes trajectory information in the main output.
+--pointstore writes the trajectories as a binary point store in the
+  trajectories directory of the output directory rather than as
+  trajectories.json.  The client uses a point store if there is one, so
+  whichever of the two formats isn't written is removed.  See
+  util/pointstore.py.
 --res indicates the group resolution (default 10).  This is the inverse of the
   increment between Mach values and between base-10 powers of the Reynolds
   number.
@@ -6,6 +6,8 @@ velocities using a variety of formulas.
 import math
 import sys
 
+import numpy
+
 import ballistics
 
 Hutton = {  # Hutton, 1812, Vol. III, p. 318
@@ -44,26 +46,38 @@ methods = ['hutton', 'miller', 'collins', 'henderson', 'morrison',
 results = {}
 for vel in Hutton:
     results[vel] = {'hutton': Hutton[vel]}
+# The Reynolds and Mach numbers don't depend on the drag method, so compute
+# them once and then compute the drag for all velocities at once.
+velocities = sorted(Hutton)
+states = []
+for vel in velocities:
+    state = {
+        'vy': 0,
+        'vx': ballistics.convert_units('%d ft/s' % vel),
+        'diam': ballistics.convert_units('2 in'),
+        'material': 'iron',
+    }
+    ballistics.determine_material(state)
+    state['density'] = ballistics.atmospheric_density(state)
+    ballistics.coefficient_of_drag(state, state['density'])
+    results[vel]['Mn'] = state['drag_data']['Mn']
+    results[vel]['Re'] = state['drag_data']['Re']
+    states.append(state)
+Re = numpy.array([results[vel]['Re'] for vel in velocities])
+Mn = numpy.array([results[vel]['Mn'] for vel in velocities])
 for method in methods[1:]:
-    for vel in sorted(Hutton):
-        state = {
-            'vy': 0,
-            'vx': ballistics.convert_units('%d ft/s' % vel),
-            'diam': ballistics.convert_units('2 in'),
-            'material': 'iron',
-            'settings': {'drag_method': method},
-        }
-
-        ballistics.determine_material(state)
-        acc = ballistics.acceleration_from_drag(state)[0]
+    cd, _ = ballistics.coefficient_of_drag_array(Re, Mn, {
+        'settings': {'drag_method': method}, 'material': 'iron'})
+    for vel, state, vcd in zip(velocities, states, cd):
+        # Force of drag is 1/2*density*cd*velocity^2*area
+        area = 0.25 * math.pi * state['diam'] ** 2
+        acc = 0.5 * vcd * state['density'] * state['vx'] ** 2 * area / state['mass']
 
         accgrav = -ballistics.acceleration_from_gravity(state)
         kgforce = state['mass'] * acc / accgrav
 
         ozforce = ballistics.convert_units(kgforce, to='oz')
         results[vel][method] = ozforce
-        results[vel]['Mn'] = state['drag_data']['Mn']
-        results[vel]['Re'] = state['drag_data']['Re']
 sys.stdout.write('Velocity ')
 for method in methods:
     sys.stdout.write(' %9s' % method.capitalize()[:9])
@@ -0,0 +1,26 @@
+"""
+Pytest fixtures shared by the tests and the benchmarks.  Each conftest.py
+imports the fixtures it uses from here.
+"""
+
+import os
+
+import pytest
+
+from ballistics import cod_adjusted
+
+
+@pytest.fixture(scope='session', autouse=True)
+def compiledDirectory(tmp_path_factory):
+    # Keep compiled drag tables out of the user's cache directory, including
+    # those saved by subprocesses.
+    path = str(tmp_path_factory.mktemp('cache'))
+    saved = cod_adjusted.CompiledDirectory, os.environ.get('XDG_CACHE_HOME')
+    cod_adjusted.CompiledDirectory = os.path.join(path, 'ballistics')
+    os.environ['XDG_CACHE_HOME'] = path
+    yield cod_adjusted.CompiledDirectory
+    cod_adjusted.CompiledDirectory = saved[0]
+    if saved[1] is None:
+        del os.environ['XDG_CACHE_HOME']
+    else:
+        os.environ['XDG_CACHE_HOME'] = saved[1]
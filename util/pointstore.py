@@ -0,0 +1,182 @@
+"""
+Store trajectory points in a compact binary form.
+
+A point store is a directory with an index.json file and one NumPy .npy file
+per trajectory series (e.g., Re.npy, Mn.npy, time.npy).  Each series file is
+a single flat array with the points of every case concatenated in the same
+order.  The index lists each case's key, idx, offset, and count, so the
+points of a case are values[offset:offset + count] of every series.  Series
+that a case doesn't have are filled with NaN and listed in that case's
+missing entry.
+
+The .npy files are written and read without NumPy.  If NumPy is available,
+the files are memory-mapped when read.
+"""
+
+import array
+import ast
+import json
+import os
+import struct
+import sys
+
+# Modules that will get loaded if needed.
+numpy = None
+
+NpyMagic = b'\x93NUMPY\x01\x00'
+# The typecodes of array.array for the supported .npy dtypes
+NpyTypes = {'<f4': 'f', '<f8': 'd', '<i4': 'i'}
+
+
+class PointStore(object):
+    """
+    Read a point store.
+    """
+    def __init__(self, path):
+        """
+        Open a point store.  Series are only read when they are first used.
+
+        Enter: path: the directory of the point store.
+        """
+        self.path = path
+        with open(os.path.join(path, 'index.json')) as fptr:
+            self.index = json.load(fptr)
+        self.cases = {(case['key'], case['idx']): case for case in self.index['cases']}
+        self.values = {}
+
+    def points(self, key, idx):
+        """
+        Get the points of a case.
+
+        Enter: key: the key of the case's source.
+               idx: the index of the case within its source.
+        Exit:  points: a dictionary of series, each of which is a sequence of
+                       values, or None if the case isn't in the store.
+        """
+        case = self.cases.get((key, idx))
+        if case is None:
+            return None
+        return {name: self.series(name)[case['offset']:case['offset'] + case['count']]
+                for name in self.index['series'] if name not in case.get('missing', ())}
+
+    def series(self, name):
+        """
+        Get all of the values of one series.
+
+        Enter: name: the name of the series.
+        Exit:  values: a numpy memmap if numpy is available, otherwise an
+                       array.array.
+        """
+        if name not in self.values:
+            self.values[name] = read_npy(os.path.join(self.path, name + '.npy'))
+        return self.values[name]
+
+
+def read_npy(path, mmap=True):
+    """
+    Read a one-dimensional .npy file.
+
+    Enter: path: the path of the file.
+           mmap: if True and numpy is available, memory-map the file.
+    Exit:  values: a numpy array if numpy is available, otherwise an
+                   array.array.
+    """
+    global numpy
+
+    if numpy is None:
+        try:
+            import numpy
+        except ImportError:
+            numpy = False
+    if numpy:
+        return numpy.load(path, mmap_mode='r' if mmap else None)
+    with open(path, 'rb') as fptr:
+        magic = fptr.read(len(NpyMagic))
+        if magic[:6] != NpyMagic[:6]:
+            raise Exception('%s is not an npy file' % path)
+        headerlen = struct.unpack('<H', fptr.read(2))[0]
+        header = ast.literal_eval(fptr.read(headerlen).decode('latin1'))
+        if header['descr'] not in NpyTypes or len(header['shape']) != 1:
+            raise Exception('Unsupported npy file %s' % path)
+        values = array.array(NpyTypes[header['descr']])
+        values.frombytes(fptr.read(header['shape'][0] * values.itemsize))
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return values
+
+
+def remove_store(path):
+    """
+    Remove a point store.  Only the files of the store are removed; the
+    directory is removed if it is then empty.
+
+    Enter: path: the directory of the point store.
+    """
+    indexpath = os.path.join(path, 'index.json')
+    if not os.path.exists(indexpath):
+        return
+    with open(indexpath) as fptr:
+        index = json.load(fptr)
+    for name in index.get('series', []):
+        if os.path.exists(os.path.join(path, name + '.npy')):
+            os.unlink(os.path.join(path, name + '.npy'))
+    os.unlink(indexpath)
+    if not os.listdir(path):
+        os.rmdir(path)
+
+
+def write_npy(path, values, dtype='<f4'):
+    """
+    Write a one-dimensional .npy file.
+
+    Enter: path: the path of the file.
+           values: a sequence of numbers.  None is stored as NaN.
+           dtype: one of the dtypes in NpyTypes.
+    """
+    data = array.array(NpyTypes[dtype], [
+        float('nan') if value is None else value for value in values])
+    if sys.byteorder != 'little':
+        data.byteswap()
+    header = "{'descr': '%s', 'fortran_order': False, 'shape': (%d,), }" % (
+        dtype, len(data))
+    # The data starts on a 64-byte boundary
+    header += ' ' * (63 - (len(NpyMagic) + 2 + len(header)) % 64) + '\n'
+    with open(path, 'wb') as fptr:
+        fptr.write(NpyMagic)
+        fptr.write(struct.pack('<H', len(header)))
+        fptr.write(header.encode('latin1'))
+        fptr.write(data.tobytes())
+
+
+def write_store(path, cases, dtype='<f4'):
+    """
+    Write a point store.
+
+    Enter: path: the directory for the point store.  This is created if
+                 needed.
+           cases: a list of (key, idx, points) tuples, where points is a
+                  dictionary of series, each of which is a list of values.
+           dtype: the dtype of the series files.  '<f4' holds the six
+                  significant digits used in the results files.
+    """
+    if not os.path.isdir(path):
+        os.makedirs(path)
+    names = sorted({name for key, idx, points in cases for name in points})
+    series = {name: [] for name in names}
+    index = {'series': names, 'dtype': dtype, 'cases': []}
+    offset = 0
+    for key, idx, points in cases:
+        count = max([len(values) for values in points.values()] or [0])
+        entry = {'key': key, 'idx': idx, 'offset': offset, 'count': count}
+        for name in names:
+            values = points.get(name)
+            if values is None or len(values) != count:
+                entry.setdefault('missing', []).append(name)
+                values = [None] * count
+            series[name].extend(values)
+        index['cases'].append(entry)
+        offset += count
+    for name in names:
+        write_npy(os.path.join(path, name + '.npy'), series[name], dtype)
+    with open(os.path.join(path, 'index.json'), 'wt') as fptr:
+        json.dump(index, fptr, sort_keys=True, separators=(',', ':'))
@@ -0,0 +1,82 @@
+"""
+Measure how long it takes to start the ballistics program.  This compares
+python -m ballistics, which imports drag methods as they are used and doesn't
+check the program signature, to a full start that imports every drag method
+and psutil and checks the program signature, as the program used to do.
+"""
+
+import os
+import subprocess
+import sys
+import time
+
+RootPath = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+
+Commands = {
+    'python': ['-c', 'pass'],
+    'import': ['-c', 'import ballistics'],
+    'fast': ['-m', 'ballistics', '--version'],
+    'full': ['-c', (
+        'import sys, pprint, psutil, ballistics; '
+        '[ballistics.drag_function(method) for method in ballistics.DragMethods]; '
+        'ballistics.main(sys.argv[1:])'), '--version'],
+}
+
+
+def time_command(args, repeat=10):
+    """
+    Time running python with a set of arguments.
+
+    Enter: args: a list of arguments to pass to python.
+           repeat: the number of times to run the command.
+    Exit:  best: the shortest time in seconds.
+           median: the median time in seconds.
+    """
+    times = []
+    for _ in range(repeat):
+        starttime = time.perf_counter()
+        subprocess.check_call(
+            [sys.executable] + args, cwd=RootPath, stdout=subprocess.DEVNULL)
+        times.append(time.perf_counter() - starttime)
+    times.sort()
+    return times[0], times[len(times) // 2]
+
+
+def time_startup(repeat=10, commands=None):
+    """
+    Time starting python and the ballistics program in several ways.
+
+    Enter: repeat: the number of times to run each command.
+           commands: a list of keys in Commands to time.  None for all.
+    Exit:  results: a dictionary keyed by command with (best, median) times
+                    in seconds.
+    """
+    return {key: time_command(Commands[key], repeat)
+            for key in (commands or sorted(Commands))}
+
+
+if __name__ == '__main__':
+    help = False
+    opts = {'repeat': 10}
+    for arg in sys.argv[1:]:
+        if arg == '--check':
+            opts['check'] = True
+        elif arg.startswith('--repeat='):
+            opts['repeat'] = int(arg.split('=', 1)[1])
+        else:
+            help = True
+    if help:
+        print("""Measure the startup time of the ballistics program.
+
+Syntax:  startup_time.py --repeat=(count) --check
+--check exits with an error if the fast start isn't faster than the full start.
+--repeat is the number of times each command is run (default 10).""")
+        sys.exit(0)
+    results = time_startup(opts['repeat'])
+    for key in sorted(results, key=lambda key: results[key][0]):
+        print('%-6s best %6.1f ms  median %6.1f ms' % (
+            key, results[key][0] * 1000, results[key][1] * 1000))
+    print('fast start saves %3.1f ms' % (
+        (results['full'][0] - results['fast'][0]) * 1000))
+    if opts.get('check') and results['fast'][0] >= results['full'][0]:
+        sys.exit(1)
@@ -0,0 +1,68 @@
+"""
+Load yaml files using the libyaml C loader when it is available, keeping a
+cache of the parsed files keyed by the hash of their contents.
+"""
+
+import hashlib
+import os
+import pickle
+import yaml
+
+# If None, the cache is in a .yamlcache directory next to each yaml file.
+# If False, the cache is not used.
+CacheDirectory = None
+# Increment this if the format of the parsed files changes.
+CacheVersion = 1
+
+SafeLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+
+class SafeLineLoader(SafeLoader):
+    """
+    Record the line number of any dictionary parsed from yaml.  See
+    https://stackoverflow.com/questions/13319067
+    """
+    def construct_mapping(self, node, deep=False):
+        mapping = super(SafeLineLoader, self).construct_mapping(node, deep=deep)
+        mapping['__line__'] = node.start_mark.line + 1
+        return mapping
+
+
+def load_yaml(path, lines=False):
+    """
+    Load a yaml file.  If the file has been loaded before and hasn't changed,
+    the parsed result is read from the cache.
+
+    Enter: path: the path of the yaml file.
+           lines: if True, record the line number of each dictionary in a
+                  __line__ key.
+    Exit:  data: the parsed yaml.
+    """
+    with open(path, 'rb') as fptr:
+        source = fptr.read()
+    if CacheDirectory is False:
+        return yaml.load(source, Loader=SafeLineLoader if lines else SafeLoader)
+    cachedir = CacheDirectory or os.path.join(os.path.dirname(os.path.abspath(path)), '.yamlcache')
+    basename = '%s.%s' % (os.path.basename(path), 'lines' if lines else 'plain')
+    hashval = hashlib.md5(('%s %s %d %s ' % (
+        yaml.__version__, SafeLoader.__name__, CacheVersion, basename)).encode('utf8') +
+        source).hexdigest()
+    cachepath = os.path.join(cachedir, '%s.%s.pickle' % (basename, hashval))
+    try:
+        with open(cachepath, 'rb') as fptr:
+            return pickle.load(fptr)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        pass
+    data = yaml.load(source, Loader=SafeLineLoader if lines else SafeLoader)
+    try:
+        if not os.path.isdir(cachedir):
+            os.makedirs(cachedir)
+        for name in os.listdir(cachedir):
+            if name.startswith(basename + '.'):
+                os.unlink(os.path.join(cachedir, name))
+        with open(cachepath + '.tmp', 'wb') as fptr:
+            pickle.dump(data, fptr, pickle.HIGHEST_PROTOCOL)
+        os.replace(cachepath + '.tmp', cachepath)
+    except OSError:
+        pass
+    return data